@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_storage():
+    '''Кеш и очередь комментариев тестов - во временном каталоге.'''
+    from core.testing import isolated_storage
+
+    with isolated_storage():
+        yield
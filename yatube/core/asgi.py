@@ -0,0 +1,137 @@
+'''
+ASGI-вход для Django 2.2.
+
+Своего ASGI-обработчика в Django 2.2 ещё нет, поэтому ASGIHandler
+оборачивает обычное WSGI-приложение. Тело запроса принимается и ответ
+отдаётся в цикле событий, а в пул из ASGI_THREADS потоков уходит
+только сама обработка (виды, ORM, шаблоны). Медленный клиент, который
+долго шлёт запрос или долго принимает ответ, не держит поток, как
+под WSGI, - держит лишь сокет в цикле событий.
+
+Ответ собирается в потоке целиком и отправляется одним сообщением:
+потоковых ответов на сайте нет.
+'''
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+
+
+def wsgi_environ(scope, body):
+    '''WSGI environ для HTTP-соединения ASGI; body - файл с телом.'''
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        # WSGI передаёт путь байтами в latin-1, ASGI - строкой
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_LENGTH', 'CONTENT_TYPE'):
+            name = 'HTTP_' + name
+        value = value.decode('latin-1')
+        if name in environ:
+            # Повторённые заголовки склеиваются, Cookie - через ';'
+            separator = '; ' if name == 'HTTP_COOKIE' else ','
+            value = environ[name] + separator + value
+        environ[name] = value
+    return environ
+
+
+def run_wsgi(application, environ):
+    '''(статус, заголовки ASGI, тело) ответа WSGI-приложения.'''
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [
+            (name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in headers
+        ]
+
+    result = application(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        # close() шлёт request_finished: соединения с базой
+        # закрываются в том же потоке, где открывались
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], body
+
+
+class ASGIHandler:
+    def __init__(self, wsgi_application, executor=None):
+        self.wsgi_application = wsgi_application
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=settings.ASGI_THREADS, thread_name_prefix='asgi',
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f'Неподдерживаемое соединение: {scope["type"]}')
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        try:
+            status, headers, content = await (
+                asyncio.get_running_loop().run_in_executor(
+                    self.executor,
+                    run_wsgi,
+                    self.wsgi_application,
+                    wsgi_environ(scope, body),
+                )
+            )
+        finally:
+            body.close()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers,
+        })
+        await send({'type': 'http.response.body', 'body': content})
+
+    @staticmethod
+    async def read_body(receive):
+        '''Тело запроса в файле; None, если клиент отключился.'''
+        body = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE, mode='w+b',
+        )
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        body.seek(0)
+        return body
+
+    @staticmethod
+    async def lifespan(receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,243 @@
+'''
+Общий для всех процессов кеш в файле SQLite.
+
+LocMemCache живёт внутри процесса, и каждый воркер gunicorn прогревает
+свою копию. SQLiteCache хранит данные в одном файле, который видят все
+воркеры на машине, и не требует внешнего сервиса. Настройки (OPTIONS):
+
+    COMPRESS_MIN_LENGTH - значения длиннее стольких байт сжимаются zlib
+                          (0 - не сжимать);
+    HASH_KEYS           - хранить sha1 ключа вместо самого ключа;
+    MAX_ENTRIES, CULL_FREQUENCY - как у встроенных бэкендов Django;
+    CULL_EVERY          - проверять MAX_ENTRIES раз в столько записей.
+
+Счётчики попаданий, промахов и вытеснений ведутся в процессе
+и доступны через cache.stats(); попадания и промахи текущего потока -
+через cache.thread_stats() (по ним core.middleware считает запрос).
+'''
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    compressed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires);
+'''
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._compress_min_length = int(
+            options.get('COMPRESS_MIN_LENGTH', 1024),
+        )
+        self._hash_keys = bool(options.get('HASH_KEYS', True))
+        self._cull_every = int(options.get('CULL_EVERY', 100))
+        self._local = threading.local()
+        self._writes = 0
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'sets': 0,
+            'deletes': 0,
+            'evictions': 0,
+        }
+
+    @property
+    def _db(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=5, isolation_level=None,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def make_key(self, key, version=None):
+        key = super().make_key(key, version)
+        if self._hash_keys:
+            return hashlib.sha1(key.encode()).hexdigest()
+        return key
+
+    def validate_key(self, key):
+        if not self._hash_keys:
+            super().validate_key(key)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        return key
+
+    def _dump(self, value):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if self._compress_min_length and len(data) > self._compress_min_length:
+            return zlib.compress(data), 1
+        return data, 0
+
+    @staticmethod
+    def _load(data, compressed):
+        if compressed:
+            data = zlib.decompress(data)
+        return pickle.loads(data)
+
+    def _row_expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def _fetch(self, keys):
+        '''{ключ в базе: значение} для неистёкших записей.'''
+        if not keys:
+            return {}
+        rows = self._db.execute(
+            'SELECT key, value, expires, compressed FROM cache '
+            f'WHERE key IN ({",".join("?" * len(keys))})',
+            list(keys),
+        ).fetchall()
+        now = time.time()
+        found, expired = {}, []
+        for key, value, expires, compressed in rows:
+            if expires is not None and expires <= now:
+                expired.append(key)
+            else:
+                found[key] = self._load(value, compressed)
+        if expired:
+            self._delete_keys(expired)
+            self._stats['evictions'] += len(expired)
+        self._stats['hits'] += len(found)
+        self._stats['misses'] += len(keys) - len(found)
+        thread_stats = self.thread_stats()
+        thread_stats['hits'] += len(found)
+        thread_stats['misses'] += len(keys) - len(found)
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        db_keys = {self._key(key, version): key for key in keys}
+        return {
+            db_keys[db_key]: value
+            for db_key, value in self._fetch(list(db_keys)).items()
+        }
+
+    def _store(self, items, timeout, mode='REPLACE'):
+        expires = self._row_expires(timeout)
+        rows = [(key, *self._dump(value), expires) for key, value in items]
+        cursor = self._db.executemany(
+            f'INSERT OR {mode} INTO cache (key, value, compressed, expires) '
+            'VALUES (?, ?, ?, ?)',
+            rows,
+        )
+        self._stats['sets'] += len(rows)
+        self._writes += len(rows)
+        if self._writes >= self._cull_every:
+            self._writes = 0
+            self._cull()
+        return cursor.rowcount
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._store([(self._key(key, version), value)], timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self._store(
+            [(self._key(key, version), value) for key, value in data.items()],
+            timeout,
+        )
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        # Истёкшая запись не должна мешать add()
+        self._db.execute(
+            'DELETE FROM cache WHERE key = ? AND expires <= ?',
+            (key, time.time()),
+        )
+        return self._store([(key, value)], timeout, mode='IGNORE') > 0
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._db.execute(
+            'UPDATE cache SET expires = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self._row_expires(timeout), self._key(key, version), time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def _delete_keys(self, keys):
+        cursor = self._db.execute(
+            f'DELETE FROM cache WHERE key IN ({",".join("?" * len(keys))})',
+            list(keys),
+        )
+        return cursor.rowcount
+
+    def delete(self, key, version=None):
+        deleted = self._delete_keys([self._key(key, version)])
+        self._stats['deletes'] += deleted
+        return deleted > 0
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._stats['deletes'] += self._delete_keys(keys)
+
+    def has_key(self, key, version=None):
+        return self._db.execute(
+            'SELECT 1 FROM cache '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self._key(key, version), time.time()),
+        ).fetchone() is not None
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def _cull(self):
+        db = self._db
+        evicted = db.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),),
+        ).rowcount
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            # Вытесняем долю записей с ближайшим сроком жизни
+            evicted += db.execute(
+                'DELETE FROM cache WHERE key IN ('
+                # "Навсегда" хранится как NULL и вытесняется последним
+                'SELECT key FROM cache ORDER BY COALESCE(expires, 1e18) '
+                'LIMIT ?)',
+                (max(count // self._cull_frequency, 1),),
+            ).rowcount
+        self._stats['evictions'] += evicted
+
+    def stats(self):
+        '''Счётчики процесса и число записей в общем файле.'''
+        entries = self._db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        return {**self._stats, 'entries': entries}
+
+    def thread_stats(self):
+        '''Попадания и промахи в текущем потоке.'''
+        stats = getattr(self._local, 'stats', None)
+        if stats is None:
+            stats = self._local.stats = {'hits': 0, 'misses': 0}
+        return stats
+
+    def close(self, **kwargs):
+        # Соединение живёт весь поток: переоткрывать его на каждый
+        # запрос дороже, чем держать.
+        pass
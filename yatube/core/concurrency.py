@@ -0,0 +1,63 @@
+'''
+Независимые запросы одного вида - параллельно.
+
+В Django 2.2 нет асинхронных видов и асинхронного ORM, поэтому
+независимые запросы (в profile - страница постов найденного автора
+и статус подписки) выполняются в общем пуле из CONCURRENT_LOOKUP_THREADS
+потоков. Вид ждёт самый долгий запрос, а не сумму всех. У каждого
+потока своё соединение с базой, живущее CONN_MAX_AGE: процесс держит
+до CONCURRENT_LOOKUP_THREADS соединений сверх обработчиков запросов.
+Решение о реплике (core.replicas) и замеры запроса (core.middleware,
+по всем базам) переходят в поток вместе с задачей.
+
+Внутри транзакции всё выполняется по очереди в текущем потоке:
+другие соединения не видят её незафиксированных изменений. Поэтому
+в тестах на TestCase запросы идут как раньше, а пул проверяет
+TransactionTestCase.
+'''
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from . import middleware, replicas
+
+_executor = ThreadPoolExecutor(
+    max_workers=max(settings.CONCURRENT_LOOKUP_THREADS, 1),
+    thread_name_prefix='lookup',
+)
+
+
+def _run(call, routing, metrics):
+    # Соединения потоков пула живут по тем же правилам CONN_MAX_AGE,
+    # что и соединения обработчиков запросов
+    close_old_connections()
+    with ExitStack() as stack:
+        stack.enter_context(replicas.routing(routing))
+        if metrics is not None:
+            for db in connections.all():
+                stack.enter_context(
+                    db.execute_wrapper(metrics.record_query),
+                )
+        return call()
+
+
+def gather(*calls):
+    '''
+    Вызывает функции без аргументов и возвращает их результаты
+    в том же порядке. Первая выполняется в текущем потоке, остальные -
+    в пуле; исключение первой пробрасывается сразу.
+    '''
+    if (
+        len(calls) < 2
+        or settings.CONCURRENT_LOOKUP_THREADS < 1
+        or any(db.in_atomic_block for db in connections.all())
+    ):
+        return [call() for call in calls]
+    routing, metrics = replicas.routing_state(), middleware.current()
+    futures = [
+        _executor.submit(_run, call, routing, metrics) for call in calls[1:]
+    ]
+    first = calls[0]()
+    return [first] + [future.result() for future in futures]
@@ -0,0 +1,132 @@
+'''
+Замеры каждого запроса: число SQL-запросов и время в базе, время
+отрисовки шаблонов, попадания и промахи кеша.
+
+Итог уходит в заголовок Server-Timing (его показывают инструменты
+разработчика браузера; по умолчанию только при DEBUG, см.
+SERVER_TIMING), а запросы дольше SLOW_REQUEST_THRESHOLD
+секунд пишутся в лог yatube.slow_requests вместе с повторяющимися
+SQL-запросами - обычно это признак N+1.
+
+Замер дешёвый, чтобы держать его включённым всегда: на каждый
+SQL-запрос - вызов обёртки execute_wrapper и счётчик по тексту
+запроса (параметры в текст не входят, поэтому одинаковые запросы
+с разными id совпадают), на шаблоны - два вызова perf_counter.
+'''
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger('yatube.slow_requests')
+
+_local = threading.local()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = Counter()
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    def duplicates(self, limit=5):
+        '''[(SQL, сколько раз)] для запросов, выполненных больше раза.'''
+        return [
+            (sql, count) for sql, count in self.queries.most_common(limit)
+            if count > 1
+        ]
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries[sql] += 1
+
+
+def current():
+    '''Замеры текущего запроса или None вне запроса.'''
+    return getattr(_local, 'metrics', None)
+
+
+def _cache_stats():
+    # Счётчики потока есть у core.cache.SQLiteCache
+    thread_stats = getattr(cache, 'thread_stats', None)
+    return dict(thread_stats()) if thread_stats else None
+
+
+class RequestMetricsMiddleware:
+    '''Должен стоять первым в MIDDLEWARE, чтобы замер охватил всё.'''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = _local.metrics = RequestMetrics()
+        cache_before = _cache_stats()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.record_query),
+                    )
+                response = self.get_response(request)
+        finally:
+            _local.metrics = None
+        total = time.perf_counter() - started
+        cache_after = _cache_stats()
+        hits = misses = None
+        if cache_before is not None:
+            hits = cache_after['hits'] - cache_before['hits']
+            misses = cache_after['misses'] - cache_before['misses']
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = self.server_timing(
+                metrics, total, hits, misses,
+            )
+        if total >= settings.SLOW_REQUEST_THRESHOLD:
+            self.log_slow(request, metrics, total, hits, misses)
+        return response
+
+    @staticmethod
+    def server_timing(metrics, total, hits, misses):
+        parts = [
+            f'db;dur={metrics.db_time * 1000:.1f};'
+            f'desc="{metrics.query_count} queries"',
+            f'tpl;dur={metrics.template_time * 1000:.1f}',
+        ]
+        if hits is not None:
+            parts.append(f'cache;desc="{hits} hits / {misses} misses"')
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+    @staticmethod
+    def log_slow(request, metrics, total, hits, misses):
+        duplicates = ''.join(
+            f'\n  {count} x {sql[:300]}'
+            for sql, count in metrics.duplicates()
+        )
+        logger.warning(
+            'Медленный запрос %s %s: %.0f мс, SQL %d за %.0f мс, '
+            'шаблоны %.0f мс, кеш %s/%s%s',
+            request.method,
+            request.get_full_path(),
+            total * 1000,
+            metrics.query_count,
+            metrics.db_time * 1000,
+            metrics.template_time * 1000,
+            hits,
+            misses,
+            duplicates and '; повторы:' + duplicates,
+        )
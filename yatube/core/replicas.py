@@ -0,0 +1,142 @@
+'''
+Чтение лент с реплик базы.
+
+Виды, помеченные @read_from_replica, читают с одной из баз
+DATABASE_REPLICAS; всё остальное, включая любую запись, идёт
+в default. Реплика может отставать, поэтому после POST, PUT или
+DELETE пользователь REPLICA_STICKY_SECONDS секунд читает с default
+и сразу видит свои изменения (read-your-writes). Окно хранится
+в cookie, а не в сессии: сессию саму пришлось бы читать с default.
+
+Отстающая реплика может отдать старые данные уже после сброса
+поколения (posts.generations). Поэтому прочитанное с реплики не должно
+попадать в общий кеш и в валидаторы ETag/Last-Modified: used()
+говорит, читал ли текущий запрос с реплики: такие страницы cache_feed
+отдаёт без кеша и валидаторов, а в кеш кладёт только отрисованные
+с default (реплик нет или пользователь закреплён за default).
+
+Пример с двумя файлами SQLite - см. DATABASES в настройках.
+'''
+import random
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'use_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_local = threading.local()
+
+
+def _replica_allowed():
+    return getattr(_local, 'allowed', False) and not getattr(
+        _local, 'pinned', False,
+    )
+
+
+def routing_state():
+    '''
+    Решение о реплике текущего потока - для передачи в другой поток.
+    Множество прочитанных реплик общее: чтения потока попадут в used().
+    '''
+    return (
+        getattr(_local, 'allowed', False),
+        getattr(_local, 'pinned', False),
+        getattr(_local, 'reads', None),
+    )
+
+
+@contextmanager
+def routing(state):
+    '''Выполняет блок с решением о реплике из routing_state().'''
+    previous = routing_state()
+    _local.allowed, _local.pinned, _local.reads = state
+    try:
+        yield
+    finally:
+        _local.allowed, _local.pinned, _local.reads = previous
+
+
+@contextmanager
+def primary():
+    '''Выполняет блок с чтением только с default.'''
+    allowed = getattr(_local, 'allowed', False)
+    _local.allowed = False
+    try:
+        yield
+    finally:
+        _local.allowed = allowed
+
+
+def used():
+    '''Читал ли текущий запрос с реплики.'''
+    return bool(getattr(_local, 'reads', None))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or not _replica_allowed():
+            return None
+        alias = random.choice(replicas)
+        reads = getattr(_local, 'reads', None)
+        if reads is not None:
+            reads.add(alias)
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии default: объекты с разных баз связаны
+        return True
+
+
+def read_from_replica(view):
+    '''
+    Разрешает виду читать с реплики. Вид не должен ничего писать
+    и открывать транзакции: чтение в них тоже ушло бы на реплику.
+    '''
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return view(request, *args, **kwargs)
+        # Пользователь и сессия загружаются лениво, при первом
+        # обращении: пусть это случится до реплики, с default
+        if hasattr(request, 'user'):
+            request.user.is_authenticated
+        _local.allowed, _local.reads = True, set()
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _local.allowed, _local.reads = False, None
+    return wrapper
+
+
+class ReplicaStickinessMiddleware:
+    '''
+    Закрепляет за пользователем default на REPLICA_STICKY_SECONDS
+    после запроса, который мог что-то записать.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.pinned = PIN_COOKIE in request.COOKIES
+        try:
+            response = self.get_response(request)
+        finally:
+            _local.pinned = False
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -0,0 +1,28 @@
+'''
+Рабочий режим SQLite.
+
+При каждом новом соединении с базой SQLite выполняются PRAGMA
+из SQLITE_PRAGMAS:
+
+    journal_mode=WAL     - читатели не ждут писателя и наоборот;
+    synchronous=NORMAL   - в WAL fsync только при checkpoint, при сбое
+                           питания теряются лишь последние транзакции,
+                           целостность базы сохраняется;
+    mmap_size            - чтение страниц через отображение в память
+                           без копирования в кеш SQLite;
+    cache_size           - кеш страниц соединения (минус - в КиБ);
+    busy_timeout         - сколько мс ждать блокировку вместо
+                           немедленной ошибки "database is locked".
+
+Соединения живут CONN_MAX_AGE секунд, так что PRAGMA выполняются
+не на каждый запрос.
+'''
+from django.conf import settings
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,61 @@
+'''
+Шаблонный движок Django с замером времени отрисовки
+для core.middleware.RequestMetricsMiddleware и прогрев шаблонов.
+'''
+import os
+import time
+
+from django.template import TemplateDoesNotExist, engines
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from .middleware import current
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = current()
+        # Вложенные render_to_string (карточки постов) уже входят
+        # во время внешнего шаблона
+        if metrics is None or metrics.rendering:
+            return super().render(context, request)
+        metrics.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+            metrics.rendering = False
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(
+                self.engine.get_template(template_name), self,
+            )
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def warm_up():
+    '''
+    Разбирает все шаблоны из DIRS движков Django. С кешированным
+    загрузчиком (TEMPLATE_CACHE) первые запросы воркера после этого
+    не тратят время на поиск и разбор. Возвращает число шаблонов.
+    '''
+    count = 0
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        for directory in backend.engine.dirs:
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    if not name.endswith(('.html', '.txt')):
+                        continue
+                    path = os.path.relpath(os.path.join(root, name), directory)
+                    backend.engine.get_template(path.replace(os.sep, '/'))
+                    count += 1
+    return count
@@ -0,0 +1,51 @@
+'''
+Отдельные от сайта хранилища для прогона тестов.
+
+Кеш (CACHES) и очередь комментариев (COMMENT_QUEUE_PATH) лежат
+в файлах рядом с проектом и общие для всех процессов машины. Тесты
+чистят кеш и пишут в очередь, поэтому на время прогона оба переносятся
+во временный каталог: и для manage.py test (TestRunner), и для pytest
+(conftest.py в корне репозитория).
+'''
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+@contextmanager
+def isolated_storage():
+    '''Выполняет блок с кешем и очередью во временном каталоге.'''
+    directory = tempfile.mkdtemp(prefix='yatube-tests-')
+    cache = settings.CACHES['default']
+    try:
+        with override_settings(
+            CACHES={
+                **settings.CACHES,
+                'default': {
+                    **cache,
+                    'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+                },
+            },
+            COMMENT_QUEUE_PATH=os.path.join(
+                directory, 'comment_queue.sqlite3',
+            ),
+        ):
+            yield directory
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._storage = ExitStack()
+        self._storage.enter_context(isolated_storage())
+
+    def teardown_test_environment(self, **kwargs):
+        self._storage.close()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,158 @@
+import asyncio
+from concurrent.futures import Executor, Future
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.wsgi import get_wsgi_application
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from core.asgi import ASGIHandler, wsgi_environ
+from posts.models import Post
+
+User = get_user_model()
+
+
+class InlineExecutor(Executor):
+    '''
+    Выполняет задачу сразу в текущем потоке: иначе вид не увидит
+    данные незафиксированной транзакции TestCase.
+    '''
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+def request(handler, scope, chunks=(b'',)):
+    messages = [
+        {'type': 'http.request', 'body': chunk, 'more_body': True}
+        for chunk in chunks
+    ]
+    messages[-1]['more_body'] = False
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(handler(scope, receive, send))
+    return sent
+
+
+def http_scope(path, method='GET', query_string=b'', headers=()):
+    return {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': query_string,
+        'headers': [(b'host', b'localhost'), *headers],
+    }
+
+
+class ASGIHandlerTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='asgi_author')
+        Post.objects.create(text='Пост через ASGI', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.handler = ASGIHandler(get_wsgi_application(), InlineExecutor())
+
+    def test_page(self):
+        '''Страница отдаётся как через WSGI'''
+        start, body = request(self.handler, http_scope(reverse(
+            'posts:profile', kwargs={'username': self.user.username},
+        )))
+        self.assertEqual(start['type'], 'http.response.start')
+        self.assertEqual(start['status'], 200)
+        self.assertIn(
+            (b'content-type', b'text/html; charset=utf-8'), start['headers'],
+        )
+        self.assertIn('Пост через ASGI', body['body'].decode())
+
+    def test_not_found(self):
+        start, _ = request(self.handler, http_scope(reverse(
+            'posts:profile', kwargs={'username': 'nobody'},
+        )))
+        self.assertEqual(start['status'], 404)
+
+    def test_disconnect_before_body(self):
+        '''Клиент ушёл, не дослав тело: ответа нет'''
+        sent = []
+
+        async def receive():
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(self.handler(http_scope('/', 'POST'), receive, send))
+        self.assertEqual(sent, [])
+
+
+class WSGIEnvironTest(SimpleTestCase):
+    def test_headers_and_body(self):
+        '''Заголовки, путь и тело по частям переходят в environ'''
+        handler = ASGIHandler(get_wsgi_application(), InlineExecutor())
+        captured = {}
+
+        def application(environ, start_response):
+            captured.update(environ, body=environ['wsgi.input'].read())
+            start_response('204 No Content', [('X-Test', '1')])
+            return []
+
+        handler.wsgi_application = application
+        start, body = request(
+            handler,
+            http_scope(
+                '/группа/', 'POST', b'a=1',
+                [
+                    (b'content-type', b'text/plain'),
+                    (b'content-length', b'6'),
+                    (b'cookie', b'a=1'),
+                    (b'cookie', b'b=2'),
+                ],
+            ),
+            chunks=(b'abc', b'def'),
+        )
+        self.assertEqual(start['status'], 204)
+        self.assertEqual(start['headers'], [(b'x-test', b'1')])
+        self.assertEqual(body['body'], b'')
+        self.assertEqual(captured['body'], b'abcdef')
+        self.assertEqual(captured['REQUEST_METHOD'], 'POST')
+        self.assertEqual(
+            captured['PATH_INFO'].encode('latin-1').decode(), '/группа/',
+        )
+        self.assertEqual(captured['QUERY_STRING'], 'a=1')
+        self.assertEqual(captured['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(captured['CONTENT_LENGTH'], '6')
+        self.assertEqual(captured['HTTP_COOKIE'], 'a=1; b=2')
+        self.assertEqual(captured['HTTP_HOST'], 'localhost')
+
+    def test_environ_defaults(self):
+        environ = wsgi_environ(http_scope('/'), None)
+        self.assertEqual(environ['SERVER_NAME'], 'localhost')
+        self.assertEqual(environ['wsgi.url_scheme'], 'http')
+
+    def test_lifespan(self):
+        handler = ASGIHandler(get_wsgi_application(), InlineExecutor())
+        messages = [
+            {'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'},
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(handler({'type': 'lifespan'}, receive, send))
+        self.assertEqual(
+            sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'],
+        )
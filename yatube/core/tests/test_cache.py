@@ -0,0 +1,67 @@
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from core.cache import SQLiteCache
+
+TEMP_CACHE_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+
+    def make_cache(self, name, **options):
+        return SQLiteCache(
+            f'{TEMP_CACHE_DIR}/{name}.sqlite3', {'OPTIONS': options},
+        )
+
+    def test_shared_between_instances(self):
+        '''Записи одного экземпляра видны другому (другому процессу)'''
+        writer = self.make_cache('shared')
+        reader = self.make_cache('shared')
+        writer.set('key', {'value': 1})
+        self.assertEqual(reader.get('key'), {'value': 1})
+        writer.delete('key')
+        self.assertIsNone(reader.get('key'))
+
+    def test_many_add_and_expiry(self):
+        '''get_many/set_many, add и истечение срока'''
+        cache = self.make_cache('many')
+        cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        self.assertFalse(cache.add('a', 3))
+        self.assertTrue(cache.add('c', 3))
+        cache.set('short', 1, timeout=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('short'))
+        self.assertTrue(cache.add('short', 2))
+        self.assertEqual(cache.get('short'), 2)
+
+    def test_compression_and_long_keys(self):
+        '''Большие значения сжимаются, длинные ключи хешируются'''
+        cache = self.make_cache('compress', COMPRESS_MIN_LENGTH=10)
+        value = 'x' * 10000
+        cache.set('k' * 500, value)
+        self.assertEqual(cache.get('k' * 500), value)
+        size = cache._db.execute('SELECT length(value) FROM cache').fetchone()
+        self.assertLess(size[0], 1000)
+
+    def test_stats_and_cull(self):
+        '''Счётчики попаданий, промахов и вытеснений'''
+        cache = self.make_cache('cull', MAX_ENTRIES=10, CULL_EVERY=1)
+        cache.set('hit', 1)
+        cache.get('hit')
+        cache.get('miss')
+        for i in range(20):
+            cache.set(f'key_{i}', i)
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertGreater(stats['evictions'], 0)
+        self.assertLessEqual(stats['entries'], 11)
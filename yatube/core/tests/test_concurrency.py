@@ -0,0 +1,187 @@
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings,
+)
+from django.urls import reverse
+
+from core import concurrency, middleware, replicas
+from core.concurrency import gather
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+REPLICA = 'replica'
+
+
+def thread_name():
+    return threading.current_thread().name
+
+
+class GatherTest(TransactionTestCase):
+    # Потоки пула проверяют свои соединения с базой (close_old_connections)
+    def test_results_in_order(self):
+        '''Результаты в порядке вызовов, остальные - в пуле'''
+        names = gather(thread_name, thread_name, thread_name)
+        self.assertEqual(names[0], threading.current_thread().name)
+        self.assertTrue(all(name.startswith('lookup') for name in names[1:]))
+        self.assertEqual(gather(lambda: 1, lambda: 2, lambda: 3), [1, 2, 3])
+
+    def test_routing_state_follows_task(self):
+        '''В потоке пула действует то же решение о реплике'''
+        with replicas.routing((True, False, None)):
+            states = gather(replicas.routing_state, replicas.routing_state)
+        self.assertEqual(states, [(True, False, None)] * 2)
+        self.assertEqual(replicas.routing_state(), (False, False, None))
+
+    def test_errors_propagate(self):
+        def fail():
+            raise LookupError
+
+        with self.assertRaises(LookupError):
+            gather(lambda: None, fail)
+
+    @override_settings(CONCURRENT_LOOKUP_THREADS=0)
+    def test_disabled(self):
+        self.assertEqual(
+            gather(thread_name, thread_name),
+            [threading.current_thread().name] * 2,
+        )
+
+
+class GatherInTransactionTest(TestCase):
+    def test_sequential_inside_transaction(self):
+        '''Внутри транзакции - по очереди в текущем потоке'''
+        self.assertEqual(
+            gather(thread_name, thread_name),
+            [threading.current_thread().name] * 2,
+        )
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class GatherThreadsTest(TransactionTestCase):
+    '''
+    Вне транзакции задачи идут в пул и читают базу своими соединениями.
+    Реплика - отдельный файл SQLite: по данным видно, откуда чтение.
+    '''
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        connections.databases[REPLICA] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(TEMP_DIR, 'replica.sqlite3'),
+        }
+        call_command('migrate', database=REPLICA, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        # Реплику открывали и потоки пула: барьер раздаёт задачу
+        # закрытия каждому потоку
+        workers = concurrency._executor._max_workers
+        barrier = threading.Barrier(workers)
+
+        def close():
+            barrier.wait(timeout=10)
+            if hasattr(connections._connections, REPLICA):
+                connections[REPLICA].close()
+                delattr(connections._connections, REPLICA)
+
+        for future in [
+            concurrency._executor.submit(close) for _ in range(workers)
+        ]:
+            future.result()
+        connections[REPLICA].close()
+        del connections.databases[REPLICA]
+        delattr(connections._connections, REPLICA)
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def setUp(self):
+        author = User.objects.create_user(username='author')
+        Post.objects.create(text='Primary post', author=author)
+        # Без сигналов: они записали бы счётчики строк реплики в default
+        User.objects.using(REPLICA).bulk_create([User(pk=1, username='lag')])
+        Post.objects.using(REPLICA).bulk_create(
+            [Post(pk=1, text='Replica post', author_id=1)],
+        )
+
+    @staticmethod
+    def texts():
+        return thread_name(), list(Post.objects.values_list('text', flat=True))
+
+    def test_queries_run_in_pool(self):
+        '''Задачи пула читают базу своим соединением'''
+        results = gather(
+            lambda: (thread_name(), connection.connection),
+            lambda: (thread_name(), connection.connection),
+        )
+        (first, first_connection), (second, second_connection) = results
+        self.assertEqual(first, threading.current_thread().name)
+        self.assertTrue(second.startswith('lookup'))
+        self.assertIsNot(first_connection, second_connection)
+        self.assertEqual(
+            [texts for _, texts in gather(self.texts, self.texts)],
+            [['Primary post']] * 2,
+        )
+
+    def test_routing_follows_task(self):
+        '''Задача в пуле читает с той же базы, что и вид'''
+        reads = set()
+        with replicas.routing((True, False, reads)):
+            results = gather(lambda: None, self.texts)
+            # Чтение в пуле видно запросу
+            self.assertTrue(replicas.used())
+        self.assertTrue(results[1][0].startswith('lookup'))
+        self.assertEqual(results[1][1], ['Replica post'])
+        self.assertEqual(reads, {REPLICA})
+        # Закреплённый за default пользователь читает с default и в пуле
+        with replicas.routing((True, True, None)):
+            results = gather(self.texts, self.texts)
+        self.assertEqual(
+            [texts for _, texts in results], [['Primary post']] * 2,
+        )
+
+    def test_metrics_follow_task(self):
+        '''Запросы потоков пула попадают в замеры запроса'''
+        metrics = middleware._local.metrics = middleware.RequestMetrics()
+        try:
+            # Как RequestMetricsMiddleware в потоке запроса
+            with ExitStack() as stack:
+                for db in connections.all():
+                    stack.enter_context(
+                        db.execute_wrapper(metrics.record_query),
+                    )
+                with replicas.routing((True, False, None)):
+                    gather(self.texts, self.texts, self.texts)
+        finally:
+            middleware._local.metrics = None
+        # Кроме PRAGMA новых соединений (core.sqlite)
+        self.assertEqual(
+            sum(
+                count for sql, count in metrics.queries.items()
+                if 'posts_post' in sql
+            ),
+            3,
+        )
+
+    def test_profile_in_pool(self):
+        '''Профиль собирается запросами в пуле с реплики'''
+        response = Client().get(
+            reverse('posts:profile', kwargs={'username': 'lag'}),
+        )
+        self.assertContains(response, 'Replica post')
+        response = Client().get(
+            reverse('posts:profile', kwargs={'username': 'nobody'}),
+        )
+        self.assertEqual(response.status_code, 404)
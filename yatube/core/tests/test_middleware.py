@@ -0,0 +1,73 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.middleware import RequestMetrics
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class RequestMetricsMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.post = Post.objects.create(text='Test text', author=cls.user)
+        Comment.objects.create(post=cls.post, author=cls.user, text='Hi')
+        cls.URL = reverse('posts:post_detail', kwargs={'post_id': cls.post.id})
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def timing(self, response):
+        return dict(
+            re.match(r'(\w+);(.*)', part).groups()
+            for part in response['Server-Timing'].split(', ')
+        )
+
+    @override_settings(SERVER_TIMING=True)
+    def test_server_timing(self):
+        '''Заголовок Server-Timing: SQL, шаблоны, кеш и общее время'''
+        timing = self.timing(self.client.get(self.URL))
+        self.assertIn('desc="4 queries"', timing['db'])
+        self.assertNotEqual(timing['tpl'], 'dur=0.0')
+        self.assertIn('0 hits', timing['cache'])
+        self.assertIn('total', timing)
+        # Повторный запрос отдаётся из кеша без шаблонов; SQL - только
+        # автор и сообщество поста для ключа кеша
+        timing = self.timing(self.client.get(self.URL))
+        self.assertIn('desc="1 queries"', timing['db'])
+        self.assertEqual(timing['tpl'], 'dur=0.0')
+        self.assertNotIn(' 0 hits', ' ' + timing['cache'])
+
+    @override_settings(SERVER_TIMING=False)
+    def test_server_timing_disabled(self):
+        self.assertFalse(self.client.get(self.URL).has_header('Server-Timing'))
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0)
+    def test_slow_request_log(self):
+        '''Медленные запросы попадают в лог'''
+        with self.assertLogs('yatube.slow_requests', 'WARNING') as logs:
+            self.client.get(self.URL)
+        self.assertIn(f'GET {self.URL}', logs.output[0])
+
+    def test_duplicate_queries(self):
+        '''Одинаковые запросы с разными параметрами считаются повторами'''
+        metrics = RequestMetrics()
+
+        def execute(sql, params, many, context):
+            return None
+
+        for pk in range(3):
+            metrics.record_query(
+                execute, 'SELECT * FROM t WHERE id = %s', [pk], False, {},
+            )
+        metrics.record_query(execute, 'SELECT 1', [], False, {})
+        self.assertEqual(metrics.query_count, 4)
+        self.assertEqual(
+            metrics.duplicates(), [('SELECT * FROM t WHERE id = %s', 3)],
+        )
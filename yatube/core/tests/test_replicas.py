@@ -0,0 +1,145 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core.replicas import PIN_COOKIE, read_from_replica
+from posts import cards
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+REPLICA = 'replica'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingTest(TestCase):
+    '''
+    Реплика - отдельный файл SQLite со своими данными: по ним видно,
+    с какой базы прочитана страница.
+    '''
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        connections.databases[REPLICA] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(TEMP_DIR, 'replica.sqlite3'),
+        }
+        call_command('migrate', database=REPLICA, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections.databases[REPLICA]
+        delattr(connections._connections, REPLICA)
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.post = Post.objects.create(text='Primary post', author=cls.user)
+        replica_author = User.objects.using(REPLICA).create(username='lag')
+        cls.replica_post = Post.objects.using(REPLICA).create(
+            text='Replica post', author=replica_author,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_feeds_read_from_replica(self):
+        '''Ленты без общего кеша читаются с реплики, без ETag'''
+        response = self.client.get(reverse('posts:api_index'))
+        self.assertContains(response, 'Replica post')
+        self.assertNotContains(response, 'Primary post')
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_cached_feeds_render_from_replica(self):
+        '''Кешируемая лента читается с реплики, но не кешируется'''
+        for _ in range(2):
+            response = self.client.get(reverse('posts:index'))
+            self.assertContains(response, 'Replica post')
+            self.assertNotContains(response, 'Primary post')
+            self.assertFalse(response.has_header('ETag'))
+        # Страница с default кешируется, и метка у неё есть
+        self.client.cookies[PIN_COOKIE] = '1'
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Primary post')
+        self.assertTrue(response.has_header('ETag'))
+        del self.client.cookies[PIN_COOKIE]
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Primary post')
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_user_and_session_from_default(self):
+        '''Сессия и пользователь загружаются с default'''
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse(
+                'posts:post_detail',
+                kwargs={'post_id': self.replica_post.id},
+            ),
+        )
+        self.assertContains(response, 'Replica post')
+        self.assertContains(response, f'Пользователь: {self.user.username}')
+
+    def test_replica_cards_not_cached(self):
+        '''Карточки постов с реплики не попадают в кеш'''
+        def view(request):
+            post = Post.objects.select_related('author', 'group').get()
+            cards.prefetch([post])
+            return post
+
+        for decorate, text, cached in (
+            (read_from_replica, 'Replica post', False),
+            (lambda view: view, 'Primary post', True),
+        ):
+            with self.subTest(text=text):
+                post = decorate(view)(RequestFactory().get('/'))
+                self.assertEqual(post.text, text)
+                key = cards.CARD_KEY.format(
+                    post.pk, cards.version(post), False, False,
+                )
+                self.assertEqual(cache.get(key) is not None, cached)
+
+    def test_writes_go_to_default(self):
+        '''Запись и виды без @read_from_replica работают с default'''
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse('posts:post_create'), {'text': 'New post'},
+        )
+        self.assertTrue(Post.objects.filter(text='New post').exists())
+        self.assertFalse(
+            Post.objects.using(REPLICA).filter(text='New post').exists(),
+        )
+
+    def test_read_your_writes(self):
+        '''После POST пользователь какое-то время читает с default'''
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': 'Comment'},
+        )
+        self.assertEqual(
+            response.cookies[PIN_COOKIE]['max-age'],
+            settings.REPLICA_STICKY_SECONDS,
+        )
+        response = self.client.get(reverse('posts:api_index'))
+        self.assertContains(response, 'Primary post')
+        self.assertNotContains(response, 'Replica post')
+        # Окно истекло - снова реплика
+        del self.client.cookies[PIN_COOKIE]
+        self.assertContains(
+            self.client.get(reverse('posts:api_index')), 'Replica post',
+        )
@@ -0,0 +1,63 @@
+import os
+import sqlite3
+import tempfile
+
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import TestCase
+
+from posts import benchmark
+
+
+class SQLitePragmasTest(TestCase):
+    # Соединение с отдельным файлом открывается по-настоящему
+    databases = {'default'}
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'db.sqlite3')
+
+    def test_new_connection_tuned(self):
+        '''Новое соединение сразу получает PRAGMA из SQLITE_PRAGMAS'''
+        wrapper = DatabaseWrapper(
+            {**connection.settings_dict, 'NAME': self.path},
+        )
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            # 1 - NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    def test_concurrency_benchmark(self):
+        '''Замер сравнивает оба режима на копии базы без ошибок'''
+        with sqlite3.connect(self.path) as source:
+            source.executescript('''
+                CREATE TABLE auth_user (id INTEGER PRIMARY KEY);
+                CREATE TABLE posts_userstats (
+                    user_id INTEGER PRIMARY KEY, post_count INTEGER);
+                CREATE TABLE posts_post (
+                    id INTEGER PRIMARY KEY, text TEXT, created TEXT,
+                    author_id INTEGER, group_id INTEGER, image TEXT,
+                    image_card TEXT, comment_count INTEGER);
+                INSERT INTO auth_user VALUES (1);
+                INSERT INTO posts_userstats VALUES (1, 0);
+            ''')
+        results = benchmark.run_sqlite_concurrency(
+            self.path, readers=2, writers=1, duration=0.2,
+        )
+        self.assertEqual(set(results), {'baseline', 'tuned'})
+        for result in results.values():
+            self.assertEqual(result['errors'], 0)
+            self.assertGreater(result['reads']['requests'], 0)
+            self.assertGreater(result['writes']['requests'], 0)
+        # Замер идёт на копиях: исходная база не изменилась
+        with sqlite3.connect(self.path) as source:
+            self.assertEqual(
+                source.execute('SELECT COUNT(*) FROM posts_post').fetchone(),
+                (0,),
+            )
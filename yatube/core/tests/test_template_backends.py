@@ -0,0 +1,32 @@
+import os
+
+from django.conf import settings
+from django.template import engines
+from django.test import SimpleTestCase, override_settings
+
+from core.template_backends import warm_up
+
+CACHED_TEMPLATES = [{
+    **settings.TEMPLATES[0],
+    'OPTIONS': {
+        **settings.TEMPLATES[0]['OPTIONS'],
+        'loaders': [(
+            'django.template.loaders.cached.Loader',
+            settings.TEMPLATE_LOADERS,
+        )],
+    },
+}]
+
+
+@override_settings(TEMPLATES=CACHED_TEMPLATES)
+class WarmUpTest(SimpleTestCase):
+    def test_all_templates_compiled(self):
+        '''После прогрева все шаблоны проекта лежат в кеше загрузчика'''
+        names = {
+            os.path.relpath(os.path.join(root, name), settings.TEMPLATES_DIR)
+            for root, _, files in os.walk(settings.TEMPLATES_DIR)
+            for name in files if name.endswith('.html')
+        }
+        self.assertEqual(warm_up(), len(names))
+        loader = engines.all()[0].engine.template_loaders[0]
+        self.assertTrue(names <= set(loader.get_template_cache))
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Group, Post
 
 
@@ -16,6 +17,15 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('created',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # LIKE '%слово%' проходит всю таблицу постов, поэтому в SQLite
+        # ищем по полнотекстовому индексу
+        if not search_term or not search.available():
+            return super().get_search_results(
+                request, queryset, search_term,
+            )
+        return search.matching(queryset, search_term), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
@@ -0,0 +1,113 @@
+'''
+JSON-версии лент для мобильного клиента: лента, сообщество, автор.
+
+Ответ - минимальные поля постов и курсоры соседних страниц (см.
+posts.utils.CursorPaginator). Страница выбирается в два шага:
+сначала только ключи (created, id) по индексу ленты и счётчики
+комментариев, из них и метки поколения (posts.generations) считается
+сильный ETag. Если он совпал
+с If-None-Match, клиент сразу получает 304 - без выборки постов
+и сериализации. Иначе посты страницы догружаются по id.
+
+Метка поколения меняется при правке и удалении постов, поэтому ETag
+устаревает и тогда, когда ключи страницы остались прежними. По той же
+причине нет Last-Modified: дата создания не меняется при правке.
+
+Страница, прочитанная с реплики (core.replicas), уходит без ETag:
+отстающая реплика дала бы старым данным новую метку поколения.
+'''
+import hashlib
+
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from core import replicas
+from core.replicas import read_from_replica
+
+from . import generations
+from .models import Group, Post, User
+from .utils import CURSOR_PARAM, CursorPaginator
+
+API_FIELDS = (
+    'text', 'created', 'comment_count', 'image_card',
+    'author__username', 'group__slug',
+)
+
+
+def page_etag(page, generation):
+    '''Сильный ETag страницы: её ключи, соседи и метка поколения.'''
+    keys = ','.join(
+        f'{post.created.isoformat()}/{post.pk}/{post.comment_count}'
+        for post in page
+    )
+    state = f'{keys}:{page.has_next()}:{page.has_previous()}:{generation}'
+    return quote_etag(hashlib.md5(state.encode()).hexdigest())
+
+
+def serialize(post):
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'created': post.created.isoformat(),
+        'author': post.author.username,
+        'group': post.group.slug if post.group else None,
+        'comment_count': post.comment_count,
+        'image': post.image_card.url if post.image_card else None,
+    }
+
+
+def feed_response(request, posts, namespaces, exists):
+    '''
+    Страница ленты posts в JSON. exists() проверяет, что владелец
+    ленты есть, если страница пуста.
+    '''
+    page = CursorPaginator(
+        posts.only('created', 'comment_count'), settings.POSTS_PER_PAGE,
+    ).get_page(request.GET.get(CURSOR_PARAM))
+    if not page and not exists():
+        raise Http404
+    etag = None
+    if not replicas.used():
+        etag = page_etag(page, generations.current(*namespaces))
+    response = etag and get_conditional_response(request, etag=etag)
+    if response is None:
+        loaded = Post.objects.select_related('author', 'group').only(
+            *API_FIELDS,
+        ).in_bulk([post.pk for post in page])
+        response = JsonResponse({
+            'results': [serialize(loaded[post.pk]) for post in page],
+            'next_cursor': page.next_cursor,
+            'previous_cursor': page.previous_cursor,
+        })
+    if etag:
+        response['ETag'] = etag
+    # Хранить можно, но перед показом - проверить по ETag
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+@read_from_replica
+def index(request):
+    return feed_response(request, Post.objects.all(), ['index'], lambda: True)
+
+
+@read_from_replica
+def group_posts(request, slug):
+    return feed_response(
+        request,
+        Post.objects.filter(group__slug=slug),
+        [f'group:{slug}'],
+        Group.objects.filter(slug=slug).exists,
+    )
+
+
+@read_from_replica
+def profile(request, username):
+    return feed_response(
+        request,
+        Post.objects.filter(author__username=username),
+        [f'author:{username}'],
+        User.objects.filter(username=username).exists,
+    )
@@ -1,5 +1,19 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
+
+
+def install_search(using, **kwargs):
+    # SQLite-бэкенд пересоздаёт posts_post при изменении схемы,
+    # и триггеры полнотекстового индекса пропадают вместе со старой
+    # таблицей: после миграций восстанавливаем их.
+    from . import search
+    search.install(connections[using])
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(install_search, sender=self)
@@ -0,0 +1,471 @@
+'''
+Нагрузочные замеры видов posts.
+
+Сценарий - адрес страницы и, при необходимости, пользователь, от имени
+которого она открывается. default_scenarios() подбирает самые тяжёлые
+случаи из текущей базы (см. команду seed_bench): ленту и вторую
+страницу ленты, крупнейшее сообщество, самого плодовитого автора,
+самый обсуждаемый пост и ленту подписок самого активного читателя.
+
+Замер идёт через тестовый клиент Django (без сети, с подсчётом
+SQL-запросов) или через HTTP к запущенному серверу с несколькими
+потоками. Результат - словарь, который команда bench пишет в JSON:
+одинаковые сценарии и ключи позволяют сравнивать прогоны между
+коммитами.
+
+run_sqlite_concurrency() отдельно замеряет саму базу SQLite: потоки
+читателей ленты и писателей постов работают с копией базы сначала
+как раньше (журнал DELETE, новое соединение на каждую операцию),
+затем в рабочем режиме из core.sqlite (команда bench_sqlite).
+
+run_slow_clients() сравнивает WSGI и ASGI (core.asgi) при медленных
+клиентах, которые долго принимают ответ (команда bench_asgi).
+
+run_render() замеряет только отрисовку страницы ленты с загрузчиком
+шаблонов без кеша и с кешированным (команда bench_templates).
+'''
+import asyncio
+import io
+import math
+import os
+import platform
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from statistics import mean
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import django
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import Count
+from django.template.loader import render_to_string
+from django.test import Client, RequestFactory
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core.asgi import ASGIHandler, run_wsgi, wsgi_environ
+
+from .models import Comment, Follow, Group, Post, User
+from .utils import CURSOR_PARAM, CursorPaginator, create_pages
+
+
+@dataclass
+class Scenario:
+    name: str
+    url: str
+    user: User = None
+
+
+def default_scenarios():
+    '''Сценарии по текущим данным; пропускает те, для которых их нет.'''
+    scenarios = [Scenario('index', reverse('posts:index'))]
+    page = CursorPaginator(
+        Post.objects.all(), settings.POSTS_PER_PAGE,
+    ).page(None)
+    if page.has_next():
+        scenarios.append(Scenario(
+            'index_page_2',
+            f'{reverse("posts:index")}?{CURSOR_PARAM}={page.next_cursor}',
+        ))
+    group = Group.objects.annotate(
+        total=Count('posts'),
+    ).order_by('-total').first()
+    if group is not None:
+        scenarios.append(Scenario(
+            'group_posts',
+            reverse('posts:group_list', kwargs={'slug': group.slug}),
+        ))
+    author = User.objects.filter(
+        stats__isnull=False,
+    ).order_by('-stats__post_count').first()
+    if author is not None:
+        scenarios.append(Scenario(
+            'profile',
+            reverse('posts:profile', kwargs={'username': author.username}),
+        ))
+    post = Post.objects.order_by('-comment_count').first()
+    if post is not None:
+        scenarios.append(Scenario(
+            'post_detail',
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        ))
+    reader = User.objects.filter(
+        stats__isnull=False,
+    ).order_by('-stats__following_count').first()
+    if reader is not None and Follow.objects.filter(user=reader).exists():
+        scenarios.append(Scenario(
+            'follow_index', reverse('posts:follow_index'), reader,
+        ))
+    return scenarios
+
+
+def percentile(values, percent):
+    '''Перцентиль методом ближайшего ранга.'''
+    ordered = sorted(values)
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+def summarize(latencies, queries, elapsed):
+    '''Сводка по замеру; время - в миллисекундах.'''
+    milliseconds = [latency * 1000 for latency in latencies]
+    summary = {
+        'requests': len(latencies),
+        'mean_ms': round(mean(milliseconds), 3),
+        'p50_ms': round(percentile(milliseconds, 50), 3),
+        'p95_ms': round(percentile(milliseconds, 95), 3),
+        'p99_ms': round(percentile(milliseconds, 99), 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+    }
+    if queries:
+        summary['queries_per_request'] = round(mean(queries), 2)
+    return summary
+
+
+def run_client(scenario, requests, warmup=0):
+    '''
+    Замер через тестовый клиент в текущем потоке.
+    Запросы к базе считаются обёрткой execute_wrapper.
+    '''
+    client = Client(SERVER_NAME='localhost')
+    if scenario.user is not None:
+        client.force_login(scenario.user)
+    for _ in range(warmup):
+        client.get(scenario.url)
+    counter = []
+
+    def count(execute, sql, params, many, context):
+        counter.append(1)
+        return execute(sql, params, many, context)
+
+    latencies, queries = [], []
+    started = time.perf_counter()
+    with connection.execute_wrapper(count):
+        for _ in range(requests):
+            counter.clear()
+            begin = time.perf_counter()
+            response = client.get(scenario.url)
+            latencies.append(time.perf_counter() - begin)
+            queries.append(len(counter))
+            if response.status_code != 200:
+                raise RuntimeError(
+                    f'{scenario.url}: ответ {response.status_code}',
+                )
+    return summarize(latencies, queries, time.perf_counter() - started)
+
+
+def run_http(scenario, requests, base_url, concurrency=1, warmup=0,
+             cookies=None):
+    '''
+    Замер запущенного сервера по HTTP в concurrency потоков.
+    cookies - заголовок Cookie для сценариев с пользователем.
+    '''
+    headers = {'Cookie': cookies} if cookies else {}
+    url = base_url.rstrip('/') + scenario.url
+
+    def fetch(_):
+        begin = time.perf_counter()
+        try:
+            with urlopen(Request(url, headers=headers)) as response:
+                response.read()
+        except HTTPError as error:
+            raise RuntimeError(f'{url}: ответ {error.code}') from error
+        return time.perf_counter() - begin
+
+    for _ in range(warmup):
+        fetch(None)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        latencies = list(executor.map(fetch, range(requests)))
+    return summarize(latencies, None, time.perf_counter() - started)
+
+
+def session_cookie(user):
+    '''Cookie сессии пользователя для HTTP-замеров.'''
+    client = Client(SERVER_NAME='localhost')
+    client.force_login(user)
+    cookie = client.cookies[settings.SESSION_COOKIE_NAME]
+    return f'{settings.SESSION_COOKIE_NAME}={cookie.value}'
+
+
+def environment():
+    '''Что нужно знать, чтобы сравнивать прогоны между собой.'''
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, cwd=settings.BASE_DIR,
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'cache': settings.CACHES['default']['BACKEND'],
+        'debug': settings.DEBUG,
+        'dataset': {
+            'users': User.objects.count(),
+            'groups': Group.objects.count(),
+            'posts': Post.objects.count(),
+            'comments': Comment.objects.count(),
+            'follows': Follow.objects.count(),
+        },
+    }
+
+
+FEED_SQL = (
+    'SELECT id, text, created, author_id, group_id, comment_count '
+    'FROM posts_post ORDER BY created DESC, id DESC LIMIT 11'
+)
+INSERT_SQL = (
+    "INSERT INTO posts_post (text, created, author_id, image, image_card, "
+    "comment_count) VALUES (?, datetime('now'), ?, '', '', 0)"
+)
+STATS_SQL = (
+    'UPDATE posts_userstats SET post_count = post_count + 1 '
+    'WHERE user_id = ?'
+)
+# Как было до рабочего режима: настройки SQLite по умолчанию
+BASELINE_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+
+def _connect(path, pragmas):
+    connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+    for name, value in pragmas.items():
+        connection.execute(f'PRAGMA {name} = {value}')
+    return connection
+
+
+def _copy_database(source, target):
+    with sqlite3.connect(source) as src, sqlite3.connect(target) as dst:
+        src.backup(dst)
+
+
+def _worker(path, pragmas, persistent, deadline, operation, latencies,
+            errors):
+    connection = _connect(path, pragmas) if persistent else None
+    while time.perf_counter() < deadline:
+        begin = time.perf_counter()
+        current = connection or _connect(path, pragmas)
+        try:
+            operation(current)
+        except sqlite3.OperationalError:
+            errors.append(1)
+        else:
+            latencies.append(time.perf_counter() - begin)
+        finally:
+            if connection is None:
+                current.close()
+    if connection is not None:
+        connection.close()
+
+
+def _read(connection):
+    connection.execute(FEED_SQL).fetchall()
+
+
+def _writer(author_id):
+    def write(connection):
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(INSERT_SQL, ('Замер записи', author_id))
+            connection.execute(STATS_SQL, (author_id,))
+        except sqlite3.Error:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+    return write
+
+
+def _run_mode(path, pragmas, persistent, readers, writers, duration,
+              author_id):
+    reads, writes, errors = [], [], []
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=_worker, args=(
+            path, pragmas, persistent, deadline, _read, reads, errors,
+        ))
+        for _ in range(readers)
+    ] + [
+        threading.Thread(target=_worker, args=(
+            path, pragmas, persistent, deadline, _writer(author_id),
+            writes, errors,
+        ))
+        for _ in range(writers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        'reads': summarize(reads, None, duration) if reads else None,
+        'writes': summarize(writes, None, duration) if writes else None,
+        'errors': len(errors),
+    }
+
+
+def run_sqlite_concurrency(source, readers=4, writers=1, duration=5.0):
+    '''
+    Читатели и писатели одновременно работают с копией базы source:
+    в режиме по умолчанию с новым соединением на операцию и в рабочем
+    режиме (SQLITE_PRAGMAS и постоянные соединения).
+    '''
+    with sqlite3.connect(source) as connection:
+        row = connection.execute('SELECT MIN(id) FROM auth_user').fetchone()
+    if row[0] is None:
+        raise RuntimeError('В базе нет пользователей: запустите seed_bench')
+    results = {}
+    modes = {
+        'baseline': (BASELINE_PRAGMAS, False),
+        'tuned': (settings.SQLITE_PRAGMAS, True),
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for name, (pragmas, persistent) in modes.items():
+            path = os.path.join(directory, f'{name}.sqlite3')
+            _copy_database(source, path)
+            results[name] = _run_mode(
+                path, pragmas, persistent, readers, writers, duration,
+                row[0],
+            )
+    return results
+
+
+def _scope(url):
+    path, _, query = url.partition('?')
+    return {
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'query_string': query.encode(),
+        'headers': [(b'host', b'localhost')],
+    }
+
+
+def _wsgi_slow_clients(application, url, slow, fast, delay, threads):
+    # Как у многопоточного WSGI-сервера: поток занят, пока клиент
+    # не примет ответ. Задержка считается с момента подключения,
+    # вместе с ожиданием свободного потока.
+    def serve(connected, is_slow):
+        status, _, _ = run_wsgi(
+            application, wsgi_environ(_scope(url), io.BytesIO()),
+        )
+        if status != 200:
+            raise RuntimeError(f'{url}: ответ {status}')
+        if is_slow:
+            time.sleep(delay)
+        return time.perf_counter() - connected
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        for _ in range(slow):
+            executor.submit(serve, time.perf_counter(), True)
+        futures = [
+            executor.submit(serve, time.perf_counter(), False)
+            for _ in range(fast)
+        ]
+        latencies = [future.result() for future in futures]
+    return latencies, time.perf_counter() - started
+
+
+async def _asgi_slow_clients(application, url, slow, fast, delay, threads):
+    handler = ASGIHandler(application, ThreadPoolExecutor(threads))
+
+    async def serve(is_slow):
+        begin = time.perf_counter()
+        response = {}
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif is_slow:
+                await asyncio.sleep(delay)
+
+        await handler(_scope(url), receive, send)
+        if response['status'] != 200:
+            raise RuntimeError(f'{url}: ответ {response["status"]}')
+        return time.perf_counter() - begin
+
+    started = time.perf_counter()
+    slow_tasks = [asyncio.create_task(serve(True)) for _ in range(slow)]
+    latencies = await asyncio.gather(*(serve(False) for _ in range(fast)))
+    await asyncio.gather(*slow_tasks)
+    handler.executor.shutdown()
+    return list(latencies), time.perf_counter() - started
+
+
+def run_slow_clients(url, slow=50, fast=50, delay=0.5, threads=8):
+    '''
+    Задержка обычных запросов к url, когда одновременно с ними
+    slow медленных клиентов по delay секунд принимают ответ.
+    В обоих случаях обработку ведут threads потоков.
+    '''
+    application = get_wsgi_application()
+    results = {}
+    latencies, elapsed = _wsgi_slow_clients(
+        application, url, slow, fast, delay, threads,
+    )
+    results['wsgi'] = summarize(latencies, None, elapsed)
+    latencies, elapsed = asyncio.run(_asgi_slow_clients(
+        application, url, slow, fast, delay, threads,
+    ))
+    results['asgi'] = summarize(latencies, None, elapsed)
+    return results
+
+
+def run_render(requests, warmup=1):
+    '''
+    Отрисовка первой страницы ленты без кеша шаблонов и с кешированным
+    загрузчиком. Посты выбираются один раз заранее, кеш карточек
+    выключен: каждая отрисовка разбирает или берёт из кеша все шаблоны.
+    '''
+    request = RequestFactory().get(reverse('posts:index'))
+    request.user = AnonymousUser()
+    page = create_pages(request, Post.objects.for_feed())
+    list(page)
+    base = settings.TEMPLATES[0]
+    variants = {
+        'uncached': settings.TEMPLATE_LOADERS,
+        'cached': [(
+            'django.template.loaders.cached.Loader',
+            settings.TEMPLATE_LOADERS,
+        )],
+    }
+    results = {}
+    for name, loaders in variants.items():
+        templates = [{
+            **base, 'OPTIONS': {**base['OPTIONS'], 'loaders': loaders},
+        }]
+        dummy_cache = {
+            'default': {
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+            },
+        }
+        with override_settings(TEMPLATES=templates, CACHES=dummy_cache):
+            for _ in range(warmup):
+                render_to_string(
+                    'posts/index.html', {'page_obj': page}, request,
+                )
+            latencies = []
+            started = time.perf_counter()
+            for _ in range(requests):
+                begin = time.perf_counter()
+                render_to_string(
+                    'posts/index.html', {'page_obj': page}, request,
+                )
+                latencies.append(time.perf_counter() - begin)
+            results[name] = summarize(
+                latencies, None, time.perf_counter() - started,
+            )
+    return results
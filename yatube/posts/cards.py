@@ -0,0 +1,88 @@
+'''
+Кеш отрисованных карточек постов (posts/includes/post_list.html).
+
+Ключ карточки содержит поколения (см. posts.generations) поста,
+его автора и сообщества. Сигналы сбрасывают поколение при сохранении
+или удалении объекта, поэтому правка сразу даёт новый ключ, а старая
+карточка просто дожидается вытеснения из кеша.
+
+Ленты вызывают prefetch() (тег prefetch_cards) до цикла по странице:
+поколения и карточки всей страницы берутся двумя get_many, а не парой
+запросов к кешу на каждую карточку.
+
+Карточки постов, прочитанных с реплики (core.replicas), в кеш
+не пишутся: отстающая реплика сохранила бы старый текст под новым
+поколением.
+'''
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from core import replicas
+
+from . import generations
+
+CARD_TEMPLATE = 'posts/includes/post_list.html'
+CARD_KEY = 'post_card:{}:{}:{:d}{:d}'
+
+
+def bump(kind, pk):
+    '''Сбрасывает карточки объекта: kind - 'post', 'user' или 'group'.'''
+    generations.bump(f'card_{kind}:{pk}')
+
+
+def _namespaces(post):
+    return (
+        f'card_post:{post.pk}',
+        f'card_user:{post.author_id}',
+        f'card_group:{post.group_id}',
+    )
+
+
+def version(post):
+    return generations.current(*_namespaces(post))
+
+
+def _render(post, without_profile_link, without_group_link):
+    return render_to_string(CARD_TEMPLATE, {
+        'post': post,
+        'without_profile_link': without_profile_link,
+        'without_group_link': without_group_link,
+    })
+
+
+def prefetch(posts, without_profile_link=False, without_group_link=False):
+    '''
+    Готовит карточки страницы: поколения одним get_many, карточки
+    другим, недостающие отрисовываются и пишутся одним set_many.
+    Карточка запоминается в посте, render_card берёт её оттуда.
+    '''
+    posts = list(posts)
+    flags = (without_profile_link, without_group_link)
+    versions = generations.current_many([_namespaces(post) for post in posts])
+    keys = [
+        CARD_KEY.format(post.pk, post_version, *flags)
+        for post, post_version in zip(posts, versions)
+    ]
+    found = cache.get_many(keys)
+    missing = {}
+    for post, key in zip(posts, keys):
+        if key not in found:
+            found[key] = missing[key] = _render(post, *flags)
+        post._prefetched_cards = {flags: found[key]}
+    if missing and not replicas.used():
+        cache.set_many(missing, settings.POST_CARD_TIMEOUT)
+
+
+def render_card(post, without_profile_link=False, without_group_link=False):
+    flags = (without_profile_link, without_group_link)
+    prefetched = getattr(post, '_prefetched_cards', {})
+    if flags in prefetched:
+        return prefetched[flags]
+    key = CARD_KEY.format(post.pk, version(post), *flags)
+    card = cache.get(key)
+    if card is None:
+        card = _render(post, *flags)
+        if not replicas.used():
+            cache.set(key, card, settings.POST_CARD_TIMEOUT)
+    return card
@@ -0,0 +1,264 @@
+'''
+Отложенная запись комментариев (write-behind).
+
+Во время "штормов" комментариев каждый запрос add_comment ждал бы
+блокировку записи основной базы SQLite. Вместо этого комментарий
+сразу ложится в очередь - отдельный файл SQLite на машине
+(COMMENT_QUEUE_PATH), общий для всех воркеров, - а фоновый поток
+процесса через COMMENT_QUEUE_INTERVAL секунд переносит накопившееся
+в базу пачками по COMMENT_QUEUE_BATCH штук: один executemany INSERT
+в одной транзакции на пачку. Счётчики, оценки популярного и поколения
+страниц (см. posts.counters, posts.trending, posts.generations)
+обновляются один раз на пачку.
+
+Доставка "хотя бы один раз": строка удаляется из очереди после
+фиксации пачки. Если процесс упал между этими шагами или два процесса
+сбросили одну строку, повтор отсеивается по (post, author, created):
+время создания назначается при постановке в очередь. Оставшееся после
+перезапуска сбрасывает следующий комментарий или команда
+flush_comments.
+
+Пока комментарий в очереди, автор видит его под постом: pending()
+читает очередь (read-your-own-write). Перед очередью стоят корзины
+токенов на пользователя и на пост (COMMENT_THROTTLE_USER и
+COMMENT_THROTTLE_POST). Состояние корзин лежит в общем кеше, поэтому
+при одновременных запросах лимит соблюдается приблизительно.
+
+Внутри уже открытой транзакции комментарий пишется сразу, как
+раньше: отложенная запись ничего не даёт тому, кто и так держит
+транзакцию, а фоновый поток не увидел бы её данных.
+'''
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, generations, trending
+from .models import Comment, Post, User
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS comments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    post_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    created TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS comments_post_author
+    ON comments (post_id, author_id);
+'''
+BUCKET_KEY = 'comment_throttle:{}:{}'
+
+_local = threading.local()
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='comments')
+_lock = threading.Lock()
+_scheduled = False
+
+
+class Throttled(Exception):
+    '''Корзина пуста; retry_after - через сколько секунд появится токен.'''
+
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+def _db():
+    # Соединение на поток и путь: путь меняют тесты
+    path = settings.COMMENT_QUEUE_PATH
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    if path not in connections:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(path, timeout=5, isolation_level=None)
+        db.execute('PRAGMA journal_mode=WAL')
+        # Очередь - единственная копия комментария до сброса
+        db.execute('PRAGMA synchronous=FULL')
+        db.executescript(SCHEMA)
+        connections[path] = db
+    return connections[path]
+
+
+def _take_tokens(user_id, post_id):
+    '''
+    Забирает по токену из корзин пользователя и поста или, если одна
+    из них пуста, не трогает ни одну и бросает Throttled.
+    '''
+    buckets = {
+        BUCKET_KEY.format('user', user_id): settings.COMMENT_THROTTLE_USER,
+        BUCKET_KEY.format('post', post_id): settings.COMMENT_THROTTLE_POST,
+    }
+    now = time.time()
+    states = cache.get_many(buckets)
+    tokens = {}
+    for key, (capacity, rate) in buckets.items():
+        left, updated = states.get(key, (capacity, now))
+        left = min(capacity, left + (now - updated) * rate)
+        if left < 1:
+            raise Throttled((1 - left) / rate)
+        tokens[key] = left - 1
+    for key, (capacity, rate) in buckets.items():
+        # Полная корзина - то же, что отсутствующая
+        cache.set(key, (tokens[key], now), (capacity - tokens[key]) / rate)
+
+
+def submit(post_id, author, text):
+    '''
+    Принимает комментарий или бросает Throttled.
+    Возвращает True, если комментарий ждёт в очереди, и False, если
+    он уже записан в базу (вызов внутри транзакции).
+    '''
+    _take_tokens(author.pk, post_id)
+    if connection.in_atomic_block:
+        Comment.objects.create(post_id=post_id, author=author, text=text)
+        return False
+    enqueue(post_id, author, text)
+    schedule_flush()
+    return True
+
+
+def enqueue(post_id, author, text):
+    _db().execute(
+        'INSERT INTO comments (post_id, author_id, text, created) '
+        'VALUES (?, ?, ?, ?)',
+        (post_id, author.pk, text, timezone.now().isoformat()),
+    )
+
+
+def pending(post_id, author):
+    '''Комментарии автора к посту, ещё не сброшенные в базу, новые первыми.'''
+    rows = _db().execute(
+        'SELECT text, created FROM comments '
+        'WHERE post_id = ? AND author_id = ? ORDER BY id DESC',
+        (post_id, author.pk),
+    ).fetchall()
+    return [
+        Comment(
+            post_id=post_id,
+            author=author,
+            text=text,
+            created=parse_datetime(created),
+        )
+        for text, created in rows
+    ]
+
+
+def size():
+    return _db().execute('SELECT COUNT(*) FROM comments').fetchone()[0]
+
+
+def schedule_flush():
+    '''Сброс через COMMENT_QUEUE_INTERVAL: за это время копится пачка.'''
+    global _scheduled
+    with _lock:
+        if _scheduled:
+            return
+        _scheduled = True
+    _executor.submit(_run)
+
+
+def _run():
+    global _scheduled
+    time.sleep(settings.COMMENT_QUEUE_INTERVAL)
+    with _lock:
+        _scheduled = False
+    try:
+        flush()
+    except Exception:
+        logger.exception('Не удалось сбросить очередь комментариев')
+    finally:
+        close_old_connections()
+
+
+def flush():
+    '''Переносит всю очередь в базу; возвращает число новых комментариев.'''
+    created = 0
+    while True:
+        rows = _db().execute(
+            'SELECT id, post_id, author_id, text, created FROM comments '
+            'ORDER BY id LIMIT ?',
+            (settings.COMMENT_QUEUE_BATCH,),
+        ).fetchall()
+        if not rows:
+            return created
+        created += _write(rows)
+        _db().execute('DELETE FROM comments WHERE id <= ?', (rows[-1][0],))
+
+
+def _insert_sql():
+    meta, quote = Comment._meta, connection.ops.quote_name
+    columns = ', '.join(
+        quote(meta.get_field(name).column)
+        for name in ('post', 'author', 'text', 'created')
+    )
+    return (
+        f'INSERT INTO {quote(meta.db_table)} ({columns}) '
+        'VALUES (%s, %s, %s, %s)'
+    )
+
+
+def _write(rows):
+    comments = [
+        Comment(
+            post_id=post_id,
+            author_id=author_id,
+            text=text,
+            created=parse_datetime(stamp),
+        )
+        for _, post_id, author_id, text, stamp in rows
+    ]
+    with transaction.atomic():
+        posts = set(Post.objects.filter(
+            pk__in={comment.post_id for comment in comments},
+        ).values_list('pk', flat=True))
+        authors = set(User.objects.filter(
+            pk__in={comment.author_id for comment in comments},
+        ).values_list('pk', flat=True))
+        # Повторная доставка: такие комментарии уже записаны
+        written = set(Comment.objects.filter(
+            post_id__in=posts,
+            created__in={comment.created for comment in comments},
+        ).values_list('post_id', 'author_id', 'created'))
+        comments = [
+            comment for comment in comments
+            if comment.post_id in posts
+            and comment.author_id in authors
+            and (comment.post_id, comment.author_id, comment.created)
+            not in written
+        ]
+        # bulk_create поставил бы в created время сброса (auto_now_add),
+        # а для отсева повторов нужно время из очереди
+        with connection.cursor() as cursor:
+            cursor.executemany(_insert_sql(), [
+                (
+                    comment.post_id,
+                    comment.author_id,
+                    comment.text,
+                    connection.ops.adapt_datetimefield_value(comment.created),
+                )
+                for comment in comments
+            ])
+        per_post = Counter(comment.post_id for comment in comments)
+        for post_id, count in per_post.items():
+            counters.bump_post(post_id, count)
+        weight = settings.HOT_WEIGHTS['comment']
+        trending.add_many(
+            (comment.post_id, comment.created, weight)
+            for comment in comments
+        )
+    generations.bump(*(f'post:{post_id}' for post_id in per_post))
+    return len(comments)
@@ -0,0 +1,95 @@
+'''
+Денормализованные счётчики: Post.comment_count и UserStats
+(timeline_length ведёт posts.timeline).
+
+Сигналы меняют их F()-выражениями сразу после записи поста,
+комментария или подписки - отдельным запросом, не в её транзакции.
+Записи bulk_create (импорт, seed_bench) сигналов не шлют, поэтому
+счётчик может оказаться меньше настоящего; уменьшение не опускает его
+ниже нуля. recount() пересчитывает всё несколькими UPDATE, если
+счётчики разошлись с данными.
+'''
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, TimelineEntry, User, UserStats
+
+
+def _bump(queryset, **deltas):
+    # Поля беззнаковые: уход ниже нуля нарушил бы CHECK
+    return queryset.update(**{
+        field: F(field) + delta if delta >= 0
+        else Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    })
+
+
+def bump_user(user_id, **deltas):
+    '''
+    Сдвигает счётчики пользователя на deltas.
+    Строка создаётся только при росте счётчика: при каскадном удалении
+    пользователя её уже может не быть.
+    '''
+    if _bump(UserStats.objects.filter(user_id=user_id), **deltas):
+        return
+    if all(delta > 0 for delta in deltas.values()):
+        UserStats.objects.get_or_create(user_id=user_id, defaults=deltas)
+
+
+def bump_post(post_id, delta):
+    _bump(Post.objects.filter(pk=post_id), comment_count=delta)
+
+
+def _count(queryset, field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).order_by()
+            .values(field).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def recount_timelines(users):
+    '''Пересчитывает длину лент пользователей users (id или подзапрос).'''
+    UserStats.objects.filter(pk__in=users).update(
+        timeline_length=_count(TimelineEntry.objects, 'user'),
+    )
+
+
+def recount():
+    '''
+    Пересчитывает все счётчики.
+    Возвращает {имя счётчика: число исправленных строк}.
+    '''
+    UserStats.objects.bulk_create(
+        (
+            UserStats(user_id=user_id)
+            for user_id in User.objects.filter(
+                stats__isnull=True,
+            ).values_list('pk', flat=True)
+        ),
+        ignore_conflicts=True,
+    )
+    actual = {
+        'post_count': _count(Post.objects, 'author'),
+        'follower_count': _count(Follow.objects, 'author'),
+        'following_count': _count(Follow.objects, 'user'),
+        'timeline_length': _count(TimelineEntry.objects, 'user'),
+    }
+    fixed = {}
+    for field, expression in actual.items():
+        fixed[field] = UserStats.objects.annotate(
+            actual=expression,
+        ).exclude(**{field: F('actual')}).count()
+    fixed['comment_count'] = Post.objects.annotate(
+        actual=_count(Comment.objects, 'post'),
+    ).exclude(comment_count=F('actual')).count()
+    if any(fixed[field] for field in actual):
+        UserStats.objects.update(**actual)
+    if fixed['comment_count']:
+        Post.objects.update(
+            comment_count=_count(Comment.objects, 'post'),
+        )
+    return fixed
@@ -0,0 +1,97 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+)
+from django.utils.http import http_date
+
+from core import replicas
+
+from . import generations
+
+PAGE_KEY = 'feed_response:{}'
+
+
+def _patch_freshness(response, user, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified.timestamp())
+    if user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=settings.FEED_BROWSER_MAX_AGE,
+        )
+    # Вошедшим пользователям та же страница показывается иначе
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def cache_feed(namespaces, anonymous_only=False):
+    '''
+    Кеширует страницу ленты на FEED_CACHE_TIMEOUT секунд.
+    namespaces(request, **kwargs) возвращает пространства имён
+    (см. posts.generations), сброс которых делает страницу устаревшей.
+    Страница кешируется отдельно для каждого пользователя, потому что
+    шапка и кнопки подписки зависят от него.
+
+    Та же метка даёт браузеру и прокси ETag и Last-Modified: если
+    страница не менялась, ответ 304 отдаётся до кеша и отрисовки.
+    Гостям страницу можно хранить FEED_BROWSER_MAX_AGE секунд
+    (public), вошедшим - только с проверкой (private, no-cache).
+    ETag слабый: токен CSRF в разметке разный при каждой отрисовке.
+
+    С @read_from_replica страница отрисовывается с реплики, но в кеш
+    и в валидаторы попадает, только если её прочитали с default
+    (core.replicas.used()): отстающая реплика сохранила бы старую
+    страницу под новой меткой. Страница с реплики отдаётся как есть,
+    без ETag и Last-Modified и с no-cache. Пространства имён читаются
+    с default - по ним выбирается метка.
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            user = request.user
+            if request.method != 'GET' or (
+                anonymous_only and user.is_authenticated
+            ):
+                return view(request, *args, **kwargs)
+            with replicas.primary():
+                names = namespaces(request, **kwargs)
+            generation = generations.current(*names)
+            digest = hashlib.md5(
+                f'{user.pk}:{request.get_full_path()}:{generation}'.encode(),
+            ).hexdigest()
+            etag = f'W/"{digest}"'
+            last_modified = generations.changed(generation)
+            not_modified = get_conditional_response(
+                request, etag=etag, last_modified=last_modified.timestamp(),
+            )
+            if not_modified is not None:
+                return _patch_freshness(
+                    not_modified, user, etag, last_modified,
+                )
+            key = PAGE_KEY.format(digest)
+            cached = cache.get(key)
+            if cached is not None:
+                content_type, content = cached
+                return _patch_freshness(
+                    HttpResponse(content, content_type=content_type),
+                    user, etag, last_modified,
+                )
+            response = view(request, *args, **kwargs)
+            if replicas.used():
+                patch_cache_control(response, no_cache=True)
+            elif response.status_code == 200:
+                cache.set(
+                    key,
+                    (response['Content-Type'], response.content),
+                    settings.FEED_CACHE_TIMEOUT,
+                )
+                _patch_freshness(response, user, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
@@ -17,6 +17,15 @@ class PostForm(forms.ModelForm):
             'image': 'Изображение к посту',
         }
 
+    def save(self, commit=True):
+        post = super().save(commit=False)
+        # Старая миниатюра не подходит к новой картинке
+        if 'image' in self.changed_data:
+            post.image_card = None
+        if commit:
+            post.save()
+        return post
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,66 @@
+'''
+Поколения кеша: метка на каждое пространство имён ("index",
+"group:<slug>", "author:<username>", ...), которая входит в ключи
+закешированных данных. Смена метки делает все старые ключи
+недостижимыми без обхода кеша.
+
+Метка - время смены и случайная строка, а не счётчик: если кеш
+вытеснил метку, новая не совпадёт ни с одной прежней, и устаревшие
+данные не всплывут. По времени в метке changed() отдаёт момент
+последнего изменения - для заголовка Last-Modified.
+'''
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from django.core.cache import cache
+
+KEY = 'generation:{}'
+# Секунды в восьми шестнадцатеричных цифрах - до 2106 года
+STAMP_LENGTH = 8
+
+
+def _new():
+    return f'{int(time.time()):0{STAMP_LENGTH}x}{uuid4().hex[:8]}'
+
+
+def current(*namespaces):
+    '''Общая метка для набора пространств имён.'''
+    return current_many([namespaces])[0]
+
+
+def current_many(groups):
+    '''
+    Метки для нескольких наборов пространств имён одним обращением
+    к кешу - например, для всех карточек страницы.
+    '''
+    keys = {
+        namespace: KEY.format(namespace)
+        for namespaces in groups for namespace in namespaces
+    }
+    found = cache.get_many(keys.values())
+    missing = {key: _new() for key in keys.values() if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [
+        '.'.join(found[keys[namespace]] for namespace in namespaces)
+        for namespaces in groups
+    ]
+
+
+def bump(*namespaces):
+    '''Сбрасывает всё, что закешировано в этих пространствах имён.'''
+    if namespaces:
+        cache.set_many(
+            {KEY.format(namespace): _new() for namespace in namespaces},
+            None,
+        )
+
+
+def changed(generation):
+    '''Время последней смены в метке из current() (UTC, до секунды).'''
+    return datetime.fromtimestamp(
+        max(int(label[:STAMP_LENGTH], 16) for label in generation.split('.')),
+        timezone.utc,
+    )
@@ -0,0 +1,92 @@
+'''
+Сводки сообществ для каталога (GroupStats).
+
+Число постов в сообществе и по каждому автору (GroupAuthor) сигналы
+сдвигают F()-выражениями при публикации, удалении и переносе поста
+между сообществами. После этого refresh() заново выбирает время
+последнего поста и GROUP_TOP_AUTHORS самых активных авторов - два
+запроса по индексам одного сообщества, без агрегатов по всем постам.
+Поэтому каталог - один запрос по GroupStats, сколько бы ни было постов.
+
+rebuild() пересчитывает все сводки по постам: после импорта и если
+сводки разошлись с данными (команда rebuild_group_stats).
+'''
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from . import generations
+from .models import Group, GroupAuthor, GroupStats, Post
+
+NAMESPACE = 'groups'
+
+
+def bump(group_id, author_id, delta):
+    '''
+    Сдвигает счётчики сообщества и автора в нём на delta постов.
+    Посты из bulk_create не учтены, поэтому ниже нуля счётчик
+    не опускается (поле беззнаковое).
+    '''
+    if not group_id:
+        return
+    post_count = Greatest(F('post_count') + delta, 0)
+    updated = GroupAuthor.objects.filter(
+        group_id=group_id, author_id=author_id,
+    ).update(post_count=post_count)
+    if not updated and delta > 0:
+        GroupAuthor.objects.get_or_create(
+            group_id=group_id,
+            author_id=author_id,
+            defaults={'post_count': delta},
+        )
+    GroupStats.objects.filter(group_id=group_id).update(
+        post_count=post_count,
+    )
+    refresh(group_id)
+
+
+def refresh(*group_ids):
+    '''Обновляет последний пост и активных авторов сообществ.'''
+    for group_id in group_ids:
+        top = GroupAuthor.objects.filter(
+            group_id=group_id, post_count__gt=0,
+        ).order_by('-post_count', 'author_id').values_list(
+            'author__username', 'post_count',
+        )[:settings.GROUP_TOP_AUTHORS]
+        last_post = Post.objects.filter(group_id=group_id).order_by(
+            '-created', '-id',
+        ).values_list('created', flat=True).first()
+        GroupStats.objects.filter(group_id=group_id).update(
+            last_post=last_post, top_authors=json.dumps(list(top)),
+        )
+    if group_ids:
+        generations.bump(NAMESPACE)
+
+
+def rebuild():
+    '''Пересчитывает все сводки. Возвращает число сообществ.'''
+    rows = Post.objects.filter(group__isnull=False).order_by().values_list(
+        'group_id', 'author_id',
+    ).annotate(count=Count('pk'))
+    totals = Counter()
+    with transaction.atomic():
+        GroupAuthor.objects.all().delete()
+        authors = []
+        for group_id, author_id, count in rows.iterator():
+            totals[group_id] += count
+            authors.append(GroupAuthor(
+                group_id=group_id, author_id=author_id, post_count=count,
+            ))
+        GroupAuthor.objects.bulk_create(authors, batch_size=1000)
+        GroupStats.objects.all().delete()
+        group_ids = list(Group.objects.values_list('pk', flat=True))
+        GroupStats.objects.bulk_create(
+            GroupStats(group_id=group_id, post_count=totals[group_id])
+            for group_id in group_ids
+        )
+        refresh(*group_ids)
+    return len(group_ids)
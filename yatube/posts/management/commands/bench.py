@@ -0,0 +1,92 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from posts import benchmark
+
+DUMMY_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку (p50/p95/p99), число запросов к базе '
+        'и пропускную способность страниц постов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Только эти сценарии; можно указать несколько раз',
+        )
+        parser.add_argument(
+            '--http', metavar='URL',
+            help='Замерять запущенный сервер, например http://127.0.0.1:8000',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Число потоков для замера по HTTP',
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Без кеша страниц (только для тестового клиента)',
+        )
+        parser.add_argument('--output', help='Файл для JSON с результатами')
+
+    def measure(self, scenario, options):
+        if options['http']:
+            cookies = scenario.user and benchmark.session_cookie(
+                scenario.user,
+            )
+            return benchmark.run_http(
+                scenario,
+                options['requests'],
+                options['http'],
+                options['concurrency'],
+                options['warmup'],
+                cookies,
+            )
+        return benchmark.run_client(
+            scenario, options['requests'], options['warmup'],
+        )
+
+    def handle(self, *args, **options):
+        if options['cold'] and options['http']:
+            raise CommandError('--cold работает только без --http')
+        scenarios = benchmark.default_scenarios()
+        if options['scenarios']:
+            scenarios = [
+                scenario for scenario in scenarios
+                if scenario.name in options['scenarios']
+            ]
+        report = {
+            'environment': benchmark.environment(),
+            'options': {
+                key: options[key]
+                for key in ('requests', 'warmup', 'http', 'concurrency',
+                            'cold')
+            },
+            'results': {},
+        }
+        for scenario in scenarios:
+            if options['cold']:
+                with override_settings(CACHES=DUMMY_CACHE):
+                    result = self.measure(scenario, options)
+            else:
+                result = self.measure(scenario, options)
+            report['results'][scenario.name] = result
+            self.stderr.write(
+                f'{scenario.name}: p50 {result["p50_ms"]} мс, '
+                f'p99 {result["p99_ms"]} мс, '
+                f'{result["throughput_rps"]} запросов/с',
+            )
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                stream.write(output + '\n')
+        else:
+            self.stdout.write(output)
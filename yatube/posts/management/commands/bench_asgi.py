@@ -0,0 +1,57 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает задержку запросов под WSGI и ASGI, когда часть '
+        'клиентов медленно принимает ответы'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Адрес страницы, по умолчанию лента')
+        parser.add_argument(
+            '--slow', type=int, default=50, help='Число медленных клиентов',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Число обычных запросов',
+        )
+        parser.add_argument(
+            '--delay', type=float, default=0.5,
+            help='Секунд на приём ответа медленным клиентом',
+        )
+        parser.add_argument(
+            '--threads', type=int, default=8, help='Потоков обработки',
+        )
+        parser.add_argument('--output', help='Файл для JSON с результатами')
+
+    def handle(self, *args, url, slow, requests, delay, threads, output,
+               **options):
+        url = url or reverse('posts:index')
+        results = benchmark.run_slow_clients(
+            url, slow, requests, delay, threads,
+        )
+        for server, result in results.items():
+            self.stderr.write(
+                f'{server}: p50 {result["p50_ms"]} мс, '
+                f'p99 {result["p99_ms"]} мс, '
+                f'{result["throughput_rps"]} запросов/с',
+            )
+        report = json.dumps({
+            'environment': benchmark.environment(),
+            'options': {
+                'url': url, 'slow': slow, 'requests': requests,
+                'delay': delay, 'threads': threads,
+            },
+            'results': results,
+        }, ensure_ascii=False, indent=2)
+        if output:
+            with open(output, 'w', encoding='utf-8') as stream:
+                stream.write(report + '\n')
+        else:
+            self.stdout.write(report)
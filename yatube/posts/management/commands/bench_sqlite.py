@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает одновременные чтение и запись SQLite в режиме '
+        'по умолчанию и в рабочем режиме (SQLITE_PRAGMAS)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=1)
+        parser.add_argument(
+            '--duration', type=float, default=5.0,
+            help='Секунд на каждый режим',
+        )
+        parser.add_argument('--output', help='Файл для JSON с результатами')
+
+    def handle(self, *args, readers, writers, duration, output, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Замер только для базы SQLite')
+        results = benchmark.run_sqlite_concurrency(
+            connection.settings_dict['NAME'], readers, writers, duration,
+        )
+        for mode, result in results.items():
+            reads, writes = result['reads'] or {}, result['writes'] or {}
+            self.stderr.write(
+                f'{mode}: чтение {reads.get("throughput_rps")}/с '
+                f'(p99 {reads.get("p99_ms")} мс), '
+                f'запись {writes.get("throughput_rps")}/с '
+                f'(p99 {writes.get("p99_ms")} мс), '
+                f'ошибок {result["errors"]}',
+            )
+        report = json.dumps({
+            'environment': benchmark.environment(),
+            'options': {
+                'readers': readers, 'writers': writers, 'duration': duration,
+            },
+            'results': results,
+        }, ensure_ascii=False, indent=2)
+        if output:
+            with open(output, 'w', encoding='utf-8') as stream:
+                stream.write(report + '\n')
+        else:
+            self.stdout.write(report)
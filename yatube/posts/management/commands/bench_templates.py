@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет отрисовку страницы ленты без кеша шаблонов '
+        'и с кешированным загрузчиком'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument('--output', help='Файл для JSON с результатами')
+
+    def handle(self, *args, requests, warmup, output, **options):
+        results = benchmark.run_render(requests, warmup)
+        for loader, result in results.items():
+            self.stderr.write(
+                f'{loader}: p50 {result["p50_ms"]} мс, '
+                f'p99 {result["p99_ms"]} мс на страницу',
+            )
+        report = json.dumps({
+            'environment': benchmark.environment(),
+            'options': {'requests': requests, 'warmup': warmup},
+            'results': results,
+        }, ensure_ascii=False, indent=2)
+        if output:
+            with open(output, 'w', encoding='utf-8') as stream:
+                stream.write(report + '\n')
+        else:
+            self.stdout.write(report)
@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает сообщества, посты, комментарии и подписки '
+        'в NDJSON или CSV'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл для выгрузки, "-" - стандартный вывод',
+        )
+        parser.add_argument(
+            '--format', choices=transfer.WRITERS, default=None,
+            help='По умолчанию - по расширению файла, иначе ndjson',
+        )
+
+    def handle(self, *args, path, format, **options):
+        format = format or (
+            'csv' if path.endswith('.csv') else 'ndjson'
+        )
+        write = transfer.WRITERS[format]
+        if path == '-':
+            count = write(transfer.export_records(), sys.stdout)
+        else:
+            with open(path, 'w', encoding='utf-8', newline='') as stream:
+                count = write(transfer.export_records(), stream)
+        self.stderr.write(f'Выгружено записей: {count}')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import comment_queue
+
+
+class Command(BaseCommand):
+    help = 'Переносит комментарии из очереди отложенной записи в базу'
+
+    def handle(self, *args, **options):
+        created = comment_queue.flush()
+        self.stdout.write(f'Записано комментариев: {created}')
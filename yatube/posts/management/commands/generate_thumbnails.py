@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Готовит миниатюры и варианты картинок для постов, '
+        'у которых их ещё нет'
+    )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').filter(
+            Q(image_card='') | Q(renditions__isnull=True),
+        ).distinct()
+        done = 0
+        for post_id in posts.values_list('pk', flat=True).iterator():
+            thumbnails.generate(post_id)
+            done += 1
+        self.stdout.write(f'Готово миниатюр: {done}')
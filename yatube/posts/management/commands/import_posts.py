@@ -0,0 +1,73 @@
+import os
+import sys
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from posts import search, transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает сообщества, посты, комментарии и подписки '
+        'из NDJSON или CSV пачками, с контрольными точками'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл с записями, "-" - стандартный ввод',
+        )
+        parser.add_argument(
+            '--format', choices=transfer.READERS, default=None,
+            help='По умолчанию - по расширению файла, иначе ndjson',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки, по умолчанию <path>.checkpoint',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать с начала, не глядя на контрольную точку',
+        )
+
+    def progress(self, done, counts):
+        parts = ', '.join(f'{key}: {value}' for key, value in counts.items())
+        self.stderr.write(f'Записей: {done} ({parts})')
+
+    def handle(self, *args, path, format, batch_size, checkpoint, restart,
+               **options):
+        format = format or ('csv' if path.endswith('.csv') else 'ndjson')
+        if checkpoint is None and path != '-':
+            checkpoint = path + '.checkpoint'
+        skip = 0 if restart else transfer.read_checkpoint(checkpoint)
+        if skip:
+            self.stderr.write(f'Продолжаем с записи {skip}')
+        importer = transfer.Importer(batch_size, self.progress)
+        transfer.prepare()
+        stream = sys.stdin if path == '-' else open(
+            path, encoding='utf-8', newline='',
+        )
+        try:
+            done = importer.import_records(
+                transfer.READERS[format](stream),
+                skip,
+                checkpoint and partial(transfer.write_checkpoint, checkpoint),
+            )
+        except Exception as error:
+            # Триггеры нужны сайту и до повторного запуска импорта
+            search.resume()
+            # IntegrityError - ссылка на отсутствующую запись
+            if isinstance(error, (ValueError, KeyError, IntegrityError)):
+                raise CommandError(f'Ошибка в данных: {error!r}')
+            raise
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        fixed = transfer.finish(importer)
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(f'Загружено записей: {done}')
+        for field, count in fixed.items():
+            self.stdout.write(f'{field}: исправлено строк {count}')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import group_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сводки сообществ для каталога'
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'Сводок пересчитано: {group_stats.rebuild()}',
+        )
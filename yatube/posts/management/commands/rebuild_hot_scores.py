@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает оценки постов для ленты популярного'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Оценок пересчитано: {trending.rebuild()}')
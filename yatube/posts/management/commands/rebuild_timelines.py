@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import Follow
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок всех читателей'
+
+    def handle(self, *args, **options):
+        readers = Follow.objects.order_by().values_list(
+            'user_id', flat=True,
+        ).distinct()
+        rebuilt = 0
+        for user_id in readers.iterator():
+            timeline.rebuild(user_id)
+            rebuilt += 1
+        self.stdout.write(f'Лент пересобрано: {rebuilt}')
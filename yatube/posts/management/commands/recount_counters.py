@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов и пользователей'
+
+    def handle(self, *args, **options):
+        for field, fixed in counters.recount().items():
+            self.stdout.write(f'{field}: исправлено строк {fixed}')
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from posts import seeding, transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу перекошенными синтетическими данными '
+        'для нагрузочных замеров'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель закона Ципфа: чем больше, тем сильнее перекос',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def progress(self, done, counts):
+        parts = ', '.join(f'{key}: {value}' for key, value in counts.items())
+        self.stderr.write(f'Записей: {done} ({parts})')
+
+    def handle(self, *args, users, groups, posts, comments, seed, skew,
+               batch_size, **options):
+        seeder = seeding.Seeder(
+            users, groups, posts, comments, seed=seed, skew=skew,
+        )
+        importer = transfer.Importer(batch_size, self.progress)
+        transfer.prepare()
+        try:
+            done = importer.import_records(seeder.records())
+        finally:
+            transfer.finish(importer)
+        self.stdout.write(f'Создано записей: {done}')
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_card',
+            field=models.ImageField(blank=True, editable=False, upload_to='posts/cards/', verbose_name='Миниатюра'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from posts import search
+    search.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    from posts import search
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_rendition'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
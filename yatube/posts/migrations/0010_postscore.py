@@ -0,0 +1,51 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_scores(apps, schema_editor):
+    from django.conf import settings
+    from posts.trending import event_score, logaddexp
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    PostScore = apps.get_model('posts', 'PostScore')
+    weights = settings.HOT_WEIGHTS
+    scores = {
+        post_id: event_score(created, weights['post'])
+        for post_id, created in Post.objects.values_list('pk', 'created')
+    }
+    for post_id, created in Comment.objects.values_list('post_id', 'created'):
+        scores[post_id] = logaddexp(
+            scores[post_id], event_score(created, weights['comment']),
+        )
+    PostScore.objects.bulk_create(
+        PostScore(post_id=post_id, score=score)
+        for post_id, score in scores.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostScore',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='posts.Post', verbose_name='Пост')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+            ],
+            options={
+                'verbose_name': 'Оценка поста',
+                'verbose_name_plural': 'Оценки постов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='postscore',
+            index=models.Index(fields=['-score'], name='post_score_idx'),
+        ),
+        migrations.RunPython(fill_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:42
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+import django.db.models.deletion
+import json
+
+TOP_AUTHORS = 3
+
+
+def fill_group_stats(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    GroupAuthor = apps.get_model('posts', 'GroupAuthor')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    GroupAuthor.objects.bulk_create(
+        GroupAuthor(group_id=group_id, author_id=author_id, post_count=count)
+        for group_id, author_id, count in Post.objects.filter(
+            group__isnull=False,
+        ).order_by().values_list('group', 'author').annotate(Count('pk'))
+    )
+    for group in Group.objects.annotate(
+        total=Count('posts'), last=Max('posts__created'),
+    ):
+        top = GroupAuthor.objects.filter(group_id=group.pk).order_by(
+            '-post_count', 'author_id',
+        ).values_list('author__username', 'post_count')[:TOP_AUTHORS]
+        GroupStats.objects.create(
+            group_id=group.pk,
+            post_count=group.total,
+            last_post=group.last,
+            top_authors=json.dumps(list(top)),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0010_postscore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Group', verbose_name='Сообщество')),
+                ('post_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('last_post', models.DateTimeField(blank=True, null=True, verbose_name='Последний пост')),
+                ('top_authors', models.TextField(default='[]', verbose_name='Активные авторы')),
+            ],
+            options={
+                'verbose_name': 'Сводка сообщества',
+                'verbose_name_plural': 'Сводки сообществ',
+            },
+        ),
+        migrations.CreateModel(
+            name='GroupAuthor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Group', verbose_name='Сообщество')),
+            ],
+            options={
+                'verbose_name': 'Автор сообщества',
+                'verbose_name_plural': 'Авторы сообществ',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['title', 'id'], name='group_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupauthor',
+            index=models.Index(fields=['group', '-post_count'], name='group_author_count_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='groupauthor',
+            unique_together={('group', 'author')},
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def fill_timelines(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    limit = settings.TIMELINE_MAX_LENGTH
+    readers = Follow.objects.order_by().values_list(
+        'user_id', flat=True,
+    ).distinct()
+    for user_id in readers.iterator():
+        posts = []
+        for author_id in Follow.objects.filter(user_id=user_id).values_list(
+            'author_id', flat=True,
+        ):
+            posts.extend(
+                Post.objects.filter(author_id=author_id).order_by(
+                    '-created', '-pk',
+                ).values_list('pk', 'created', 'author_id')[:limit],
+            )
+        posts.sort(key=lambda post: (post[1], post[0]), reverse=True)
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(
+                    user_id=user_id,
+                    post_id=post_id,
+                    author_id=author_id,
+                    created=created,
+                )
+                for post_id, created, author_id in posts[:limit]
+            ),
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_group_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
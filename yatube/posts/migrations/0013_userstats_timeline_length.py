@@ -0,0 +1,34 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:18
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_lengths(apps, schema_editor):
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.update(timeline_length=Coalesce(
+        Subquery(
+            TimelineEntry.objects.filter(user=OuterRef('pk')).order_by()
+            .values('user').annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_backfill_timelines'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='timeline_length',
+            field=models.PositiveIntegerField(default=0, verbose_name='Записей в ленте'),
+        ),
+        migrations.RunPython(fill_lengths, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,5 @@
+import json
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
@@ -7,6 +9,18 @@ from core.models import CreatedModel
 
 User = get_user_model()
 
+# Колонки, которые карточка поста в ленте не показывает
+FEED_DEFERRED_FIELDS = (
+    'author__password',
+    'author__last_login',
+    'author__is_superuser',
+    'author__email',
+    'author__is_staff',
+    'author__is_active',
+    'author__date_joined',
+    'group__description',
+)
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200, verbose_name='Сообщество')
@@ -20,10 +34,29 @@ class Group(models.Model):
         verbose_name='Описание сообщества',
     )
 
+    class Meta:
+        indexes = [
+            # Каталог сообществ, см. posts.views.group_index
+            models.Index(fields=['title', 'id'], name='group_title_idx'),
+        ]
+
     def __str__(self) -> str:
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        '''
+        Выборка для лент: автор и сообщество одним JOIN,
+        без колонок, которые карточка поста не показывает,
+        и варианты картинок одним запросом на страницу.
+        Число комментариев уже лежит в колонке comment_count.
+        '''
+        return self.select_related('author', 'group').defer(
+            *FEED_DEFERRED_FIELDS,
+        ).prefetch_related('renditions')
+
+
 class Post(CreatedModel):
     text = models.TextField(
         verbose_name='Текст поста',
@@ -49,15 +82,60 @@ class Post(CreatedModel):
         upload_to='posts/',
         blank=True,
     )
+    # Готовая миниатюра для карточки, см. posts.thumbnails
+    image_card = models.ImageField(
+        verbose_name='Миниатюра',
+        upload_to='posts/cards/',
+        blank=True,
+        editable=False,
+    )
+    # Счётчик поддерживается сигналами, см. posts.counters
+    comment_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
         ordering = ('-created',)
+        indexes = [
+            models.Index(fields=['-created', '-id'], name='post_created_idx'),
+            models.Index(
+                fields=['author', '-created', '-id'],
+                name='post_author_created_idx',
+            ),
+            models.Index(
+                fields=['group', '-created', '-id'],
+                name='post_group_created_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text[:settings.POST_TEXT_SHORT]
 
+    @property
+    def image_sources(self):
+        '''
+        [(mime-тип, srcset)] для <source> в порядке предпочтения
+        форматов. Берёт варианты из prefetch_related('renditions').
+        '''
+        srcsets = {}
+        # Сортировка в Python: prefetch без ORDER BY идёт по индексу
+        renditions = sorted(self.renditions.all(), key=lambda r: r.width)
+        for rendition in renditions:
+            srcsets.setdefault(rendition.format, []).append(
+                f'{rendition.file.url} {rendition.width}w',
+            )
+        return [
+            (f'image/{image_format}', ', '.join(srcsets[image_format]))
+            for image_format, _ in Rendition.FORMATS
+            if image_format in srcsets
+        ]
+
 
 class Comment(CreatedModel):
     post = models.ForeignKey(
@@ -83,6 +161,12 @@ class Comment(CreatedModel):
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         ordering = ('-created',)
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return f'{self.author}: {self.text[:settings.POST_TEXT_SHORT]}'
@@ -105,6 +189,12 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        indexes = [
+            models.Index(
+                fields=['user', 'author'],
+                name='follow_user_author_idx',
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['author', 'user'],
@@ -114,3 +204,207 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
+
+
+class Rendition(models.Model):
+    '''
+    Один из размеров картинки поста в одном из форматов.
+    Создаются вместе с миниатюрой (см. posts.thumbnails) и дают
+    шаблонам srcset для <picture>.
+    '''
+    FORMATS = (
+        ('avif', 'AVIF'),
+        ('webp', 'WebP'),
+        ('jpeg', 'JPEG'),
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        verbose_name='Пост',
+        related_name='renditions',
+    )
+    width = models.PositiveSmallIntegerField('Ширина')
+    format = models.CharField('Формат', max_length=4, choices=FORMATS)
+    file = models.ImageField('Файл', upload_to='posts/renditions/')
+
+    class Meta:
+        verbose_name = 'Вариант изображения'
+        verbose_name_plural = 'Варианты изображений'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'format', 'width'],
+                name='unique_rendition',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id}: {self.width}w {self.format}'
+
+
+class UserStats(models.Model):
+    '''
+    Денормализованные счётчики пользователя.
+    Поддерживаются сигналами (см. posts.counters), расхождения
+    исправляет команда recount_counters.
+    '''
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Пользователь',
+        related_name='stats',
+    )
+    post_count = models.PositiveIntegerField('Постов', default=0)
+    follower_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    # Строк TimelineEntry читателя: по нему раздача обрезает
+    # только заполненные ленты (см. posts.timeline)
+    timeline_length = models.PositiveIntegerField(
+        'Записей в ленте', default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_count} постов'
+
+
+class TimelineEntry(models.Model):
+    '''
+    Материализованная лента подписок: строка на каждый пост автора,
+    на которого подписан пользователь. Заполняется при публикации поста
+    и при подписке (см. posts.timeline), поэтому чтение ленты - один
+    проход по индексу (user, -created, -post).
+    '''
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Читатель',
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        verbose_name='Пост',
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Автор поста',
+        related_name='+',
+    )
+    # Копия post.created: ключ сортировки и курсора ленты
+    created = models.DateTimeField('Дата создания поста')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        ordering = ('-created', '-post')
+        indexes = [
+            models.Index(
+                fields=['user', '-created', '-post'],
+                name='timeline_user_created_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.post_id}'
+
+
+class PostScore(models.Model):
+    '''
+    Оценка поста для ленты популярного: логарифм суммы весов событий
+    (публикация, комментарии, подписки на автора), затухающих со
+    временем. Обновляется одним UPDATE на событие (см. posts.trending),
+    поэтому лента популярного - проход по индексу score.
+    '''
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Пост',
+        related_name='score',
+    )
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        verbose_name = 'Оценка поста'
+        verbose_name_plural = 'Оценки постов'
+        indexes = [
+            models.Index(fields=['-score'], name='post_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id}: {self.score:.3f}'
+
+
+class GroupStats(models.Model):
+    '''
+    Сводка сообщества для каталога: число постов, время последнего
+    поста и самые активные авторы. Поддерживается сигналами
+    (см. posts.group_stats), пересчитывается командой
+    rebuild_group_stats.
+    '''
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Сообщество',
+        related_name='stats',
+    )
+    post_count = models.PositiveIntegerField('Постов', default=0)
+    last_post = models.DateTimeField('Последний пост', null=True, blank=True)
+    # JSON [[имя, постов], ...]: имена нужны каталогу без JOIN
+    top_authors = models.TextField('Активные авторы', default='[]')
+
+    class Meta:
+        verbose_name = 'Сводка сообщества'
+        verbose_name_plural = 'Сводки сообществ'
+
+    def __str__(self):
+        return f'{self.group_id}: {self.post_count} постов'
+
+    @property
+    def top_author_list(self):
+        '''[(имя, постов)] активных авторов.'''
+        return [tuple(author) for author in json.loads(self.top_authors)]
+
+
+class GroupAuthor(models.Model):
+    '''Сколько постов автор написал в сообществе - для GroupStats.'''
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        verbose_name='Сообщество',
+        related_name='+',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Автор',
+        related_name='+',
+    )
+    post_count = models.PositiveIntegerField('Постов', default=0)
+
+    class Meta:
+        verbose_name = 'Автор сообщества'
+        verbose_name_plural = 'Авторы сообществ'
+        unique_together = ('group', 'author')
+        indexes = [
+            models.Index(
+                fields=['group', '-post_count'],
+                name='group_author_count_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.group_id}: {self.author_id}'
@@ -0,0 +1,293 @@
+'''
+Полнотекстовый поиск по Post.text.
+
+Инвертированный индекс - виртуальная таблица SQLite FTS5 posts_post_fts
+с внешним содержимым (content='posts_post'): текст хранится только
+в самой таблице постов, индекс держит лишь словарь и списки вхождений.
+Синхронизацию ведут триггеры на вставку, изменение и удаление поста,
+поэтому индекс не расходится с таблицей и при bulk_create, и при
+update(), которые не шлют сигналов.
+
+Результаты сортируются по bm25 (rank FTS5, меньше - лучше) и листаются
+курсором (rank, id) без OFFSET. Сниппеты с подсветкой строит snippet().
+'''
+import base64
+import json
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .utils import CURSOR_PARAM, NEXT, PREVIOUS, CursorPage, CursorPaginator
+
+FTS_TABLE = 'posts_post_fts'
+
+# Триггеры удаляются вместе с таблицей постов, а SQLite-бэкенд Django
+# пересоздаёт таблицу при многих изменениях схемы: install() вызывается
+# после каждой миграции и создаёт недостающее.
+SCHEMA = (
+    f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text,
+        content='posts_post',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, text) VALUES (new.id, new.text);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+    AFTER DELETE ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE} (rowid, text) VALUES (new.id, new.text);
+    END
+    ''',
+)
+
+# Маркеры подсветки не встречаются в тексте и переживают escape()
+MARK_START = '\x02'
+MARK_END = '\x03'
+SNIPPET_TOKENS = 24
+WORD = re.compile(r'\w+')
+
+
+def available(using=None):
+    return (using or connection).vendor == 'sqlite'
+
+
+def install(using=None):
+    '''Создаёт индекс и триггеры, если их ещё нет.'''
+    using = using or connection
+    if not available(using):
+        return
+    with using.cursor() as cursor:
+        exists = FTS_TABLE in using.introspection.table_names(cursor)
+        for statement in SCHEMA:
+            cursor.execute(statement)
+    if not exists:
+        rebuild(using)
+
+
+def suspend(using=None):
+    '''
+    Снимает триггеры, оставляя индекс: поиск работает по прежнему
+    содержимому, пока resume() не догонит таблицу постов (импорт).
+    '''
+    using = using or connection
+    if not available(using):
+        return
+    with using.cursor() as cursor:
+        # Триггеры привязаны к posts_post, а не к индексу
+        for action in ('insert', 'delete', 'update'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{action}')
+
+
+def resume(using=None):
+    '''Возвращает триггеры после suspend() и перестраивает индекс.'''
+    using = using or connection
+    if not available(using):
+        return
+    with using.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+    rebuild(using)
+
+
+def uninstall(using=None):
+    using = using or connection
+    if not available(using):
+        return
+    suspend(using)
+    with using.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def rebuild(using=None):
+    '''Перестраивает индекс по текущему содержимому posts_post.'''
+    with (using or connection).cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')",
+        )
+
+
+def match_expression(query):
+    '''
+    Запрос пользователя в выражение MATCH: все слова обязательны,
+    последнее ищется по префиксу (поиск по мере набора).
+    Операторы FTS5 во вводе не интерпретируются. None - искать нечего.
+    '''
+    words = WORD.findall(query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def highlight(snippet):
+    '''Экранирует сниппет и превращает маркеры в <mark>.'''
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>'),
+    )
+
+
+def matching(queryset, query):
+    '''
+    Фильтр queryset постов по полнотекстовому индексу,
+    без ранжирования (например, для поиска в админке).
+    '''
+    expression = match_expression(query)
+    if expression is None:
+        return queryset.none()
+    # pk__in=RawSQL(...) Django 2.2 оборачивает в лишние скобки,
+    # и SQLite читает подзапрос как скалярный - только первая строка
+    return queryset.extra(
+        where=[
+            f'{Post._meta.db_table}.id IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)',
+        ],
+        params=[expression],
+    )
+
+
+def encode_cursor(post, direction):
+    payload = json.dumps(
+        [post.search_rank, post.pk, direction], separators=(',', ':'),
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    '''(rank, id, direction) или None для битого токена.'''
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        rank, pk, direction = json.loads(
+            base64.urlsafe_b64decode(padded.encode()).decode(),
+        )
+        rank, pk = float(rank), int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if direction not in (NEXT, PREVIOUS):
+        return None
+    return rank, pk, direction
+
+
+class SearchPage(CursorPage):
+    '''Страница результатов; курсор - (rank, id) крайнего поста.'''
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return encode_cursor(self.object_list[-1], NEXT)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return encode_cursor(self.object_list[0], PREVIOUS)
+
+
+class SearchPaginator(CursorPaginator):
+    '''
+    Keyset-пагинатор по (rank, id) поверх FTS5.
+    FTS5 всё равно оценивает все совпадения запроса, но посты
+    загружаются только для строк страницы, и глубокие страницы
+    не перечитывают предыдущие через OFFSET.
+    '''
+
+    def __init__(self, query, per_page, **kwargs):
+        self.expression = match_expression(query)
+        # Сниппет вместо картинки: варианты изображений не нужны
+        super().__init__(
+            Post.objects.for_feed().prefetch_related(None),
+            per_page,
+            **kwargs,
+        )
+
+    @property
+    def count(self):
+        if self.expression is None:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s',
+                [self.expression],
+            )
+            return cursor.fetchone()[0]
+
+    def page(self, cursor):
+        if self.expression is None:
+            return SearchPage([], self, False, False)
+        key = decode_cursor(cursor)
+        if key is None:
+            rows = self._rows(limit=self.per_page + 1)
+            return self._forward_page(rows, has_previous=False)
+        rank, pk, direction = key
+        if direction == NEXT:
+            rows = self._rows((rank, pk), '>', self.per_page + 1)
+            return self._forward_page(rows, has_previous=True)
+        rows = self._rows((rank, pk), '<', self.per_page + 1)
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return self._make_page(rows, True, has_previous)
+
+    def _rows(self, after=None, lookup='>', limit=None):
+        '''[(id, rank, сниппет)] в порядке выдачи после курсора after.'''
+        sql = (
+            f'SELECT rowid, rank, snippet({FTS_TABLE}, 0, %s, %s, %s, %s) '
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        )
+        params = [
+            MARK_START, MARK_END, '…', SNIPPET_TOKENS, self.expression,
+        ]
+        if after is not None:
+            sql += f' AND (rank, rowid) {lookup} (%s, %s)'
+            params.extend(after)
+        order = 'ASC' if lookup == '>' else 'DESC'
+        sql += f' ORDER BY rank {order}, rowid {order} LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def _make_page(self, rows, has_next, has_previous):
+        posts = self.object_list.in_bulk([pk for pk, _, _ in rows])
+        page = []
+        for pk, rank, snippet in rows:
+            # Пост могли удалить между запросами
+            post = posts.get(pk)
+            if post is None:
+                continue
+            post.search_rank = rank
+            post.search_snippet = highlight(snippet)
+            page.append(post)
+        return SearchPage(page, self, has_next, has_previous)
+
+
+def search(request, query):
+    '''Страница постов, найденных по запросу, лучшие первыми.'''
+    paginator = SearchPaginator(query, settings.POSTS_PER_PAGE)
+    return paginator.get_page(request.GET.get(CURSOR_PARAM))
@@ -0,0 +1,142 @@
+'''
+Синтетические данные для нагрузочных замеров (см. posts.benchmark).
+
+Распределения перекошены, как в живых соцсетях: авторов выбирают
+по закону Ципфа, поэтому немногие плодовитые авторы пишут большую
+часть постов и собирают большую часть подписчиков; комментарии так же
+сосредоточены на немногих "вирусных" постах. Число подписок
+у читателя - степенное (Парето).
+
+Записи генерируются лениво и загружаются тем же путём, что и
+import_posts (posts.transfer): bulk_create пачками и отложенное
+обслуживание счётчиков, лент и индексов в конце. При одном и том же
+seed получается один и тот же набор данных.
+'''
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Comment, Post
+
+WORDS = (
+    'кот собака утро город река поезд книга музыка кофе дождь снег '
+    'море лес дорога окно друг работа отпуск фото рецепт горы закат '
+    'велосипед концерт выставка парк вечер проект код релиз тест'
+).split()
+
+
+class Seeder:
+    def __init__(self, users, groups, posts, comments, seed=0,
+                 skew=1.1, days=365):
+        self.users = users
+        self.groups = groups
+        self.posts = posts
+        self.comments = comments
+        self.skew = skew
+        self.random = random.Random(seed)
+        # Имена не пересекаются с уже существующими наборами
+        self.prefix = f'bench{seed}_'
+        self.first_post = (
+            Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        ) + 1
+        self.first_comment = (
+            Comment.objects.aggregate(last=Max('pk'))['last'] or 0
+        ) + 1
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=days)
+        self.step = timedelta(days=days) / max(posts, 1)
+
+    def zipf(self, count):
+        '''Накопленные веса Ципфа для random.choices(cum_weights=...).'''
+        return list(accumulate(
+            1 / rank ** self.skew for rank in range(1, count + 1)
+        ))
+
+    def post_created(self, index):
+        return self.start + self.step * index
+
+    def username(self, index):
+        return f'{self.prefix}user{index}'
+
+    def text(self, low, high):
+        return ' '.join(
+            self.random.choices(WORDS, k=self.random.randint(low, high)),
+        ).capitalize()
+
+    def records(self):
+        '''Записи в формате posts.transfer, в порядке зависимостей.'''
+        for index in range(self.groups):
+            yield {
+                'type': 'group',
+                'slug': f'{self.prefix}group{index}',
+                'title': f'Сообщество {index}',
+                'description': self.text(5, 20),
+            }
+        yield from self.post_records()
+        yield from self.comment_records()
+        yield from self.follow_records()
+
+    def post_records(self):
+        authors = self.zipf(self.users)
+        groups = self.zipf(self.groups) if self.groups else None
+        for index in range(self.posts):
+            author = self.random.choices(
+                range(self.users), cum_weights=authors,
+            )[0]
+            group = None
+            # Примерно треть постов без сообщества
+            if groups and self.random.random() > 0.3:
+                group = f'{self.prefix}group' + str(self.random.choices(
+                    range(self.groups), cum_weights=groups,
+                )[0])
+            yield {
+                'type': 'post',
+                'id': self.first_post + index,
+                'created': self.post_created(index).isoformat(),
+                'author': self.username(author),
+                'group': group,
+                'text': self.text(10, 120),
+            }
+
+    def comment_records(self):
+        # Последние посты обсуждают активнее: ранги Ципфа с конца
+        posts = self.zipf(self.posts)
+        users = self.zipf(self.users)
+        for index in range(self.comments):
+            post = self.posts - 1 - self.random.choices(
+                range(self.posts), cum_weights=posts,
+            )[0]
+            author = self.random.choices(
+                range(self.users), cum_weights=users,
+            )[0]
+            created = self.post_created(post)
+            created += (self.now - created) * self.random.random()
+            yield {
+                'type': 'comment',
+                'id': self.first_comment + index,
+                'created': created.isoformat(),
+                'post': self.first_post + post,
+                'author': self.username(author),
+                'text': self.text(3, 30),
+            }
+
+    def follow_records(self):
+        authors = self.zipf(self.users)
+        for reader in range(self.users):
+            # Степенное число подписок: у большинства единицы, у немногих
+            # сотни
+            count = min(
+                int(self.random.paretovariate(1.2)) - 1, self.users - 1,
+            )
+            for author in set(self.random.choices(
+                range(self.users), cum_weights=authors, k=count,
+            )):
+                if author != reader:
+                    yield {
+                        'type': 'follow',
+                        'user': self.username(reader),
+                        'author': self.username(author),
+                    }
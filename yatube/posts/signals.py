@@ -0,0 +1,237 @@
+from django.conf import settings
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import (
+    cards, counters, generations, group_stats, timeline, trending,
+)
+from .models import (
+    Comment, Follow, Group, GroupAuthor, GroupStats, Post, User, UserStats,
+)
+
+# Поля пользователя, которые видны в карточке поста
+CARD_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=User)
+def user_stats_create(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+def post_namespaces(post, group_slugs):
+    '''Страницы, на которых виден пост (см. posts.decorators).'''
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True,
+    )
+    author = User.objects.filter(pk=post.author_id).values_list(
+        'username', flat=True,
+    ).first()
+    return [
+        'index',
+        f'post:{post.pk}',
+        f'author:{author}',
+        *(f'group:{slug}' for slug in group_slugs if slug),
+        *(f'timeline:{user_id}' for user_id in followers),
+    ]
+
+
+def posts_namespaces(posts):
+    '''
+    Страницы, на которых видны посты из выборки. Нужна при
+    переименовании автора или сообщества - это редкие записи.
+    '''
+    authors = User.objects.filter(posts__in=posts).values_list(
+        'username', flat=True,
+    ).distinct()
+    groups = Group.objects.filter(posts__in=posts).values_list(
+        'slug', flat=True,
+    ).distinct()
+    followers = Follow.objects.filter(author__posts__in=posts).values_list(
+        'user_id', flat=True,
+    ).distinct()
+    return [
+        'index',
+        *(f'author:{username}' for username in authors),
+        *(f'group:{slug}' for slug in groups),
+        *(f'timeline:{user_id}' for user_id in followers),
+    ]
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_bump(sender, instance, created=False, update_fields=None, **kwargs):
+    # У нового пользователя нет постов, а вход сохраняет только last_login
+    if created or update_fields and not set(update_fields) & CARD_USER_FIELDS:
+        return
+    cards.bump('user', instance.pk)
+    generations.bump(
+        f'author:{instance.username}',
+        *posts_namespaces(Post.objects.filter(author_id=instance.pk)),
+    )
+    # Имя автора хранится в сводках сообществ
+    group_stats.refresh(*GroupAuthor.objects.filter(
+        author_id=instance.pk,
+    ).values_list('group_id', flat=True))
+
+
+@receiver(post_save, sender=Group)
+def group_stats_create(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        GroupStats.objects.get_or_create(group=instance)
+
+
+@receiver(pre_save, sender=Group)
+def group_remember_slug(sender, instance, raw=False, **kwargs):
+    # После смены адреса страница по старому тоже устаревает
+    instance._previous_slug = None
+    if instance.pk and not raw:
+        instance._previous_slug = Group.objects.filter(
+            pk=instance.pk,
+        ).values_list('slug', flat=True).first()
+
+
+@receiver(pre_delete, sender=Group)
+def group_remember_posts(sender, instance, **kwargs):
+    # После удаления у постов уже нет сообщества (SET_NULL)
+    instance._post_namespaces = posts_namespaces(
+        Post.objects.filter(group_id=instance.pk),
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_bump(sender, instance, **kwargs):
+    cards.bump('group', instance.pk)
+    previous_slug = getattr(instance, '_previous_slug', None)
+    namespaces = getattr(instance, '_post_namespaces', None)
+    if namespaces is None:
+        namespaces = posts_namespaces(
+            Post.objects.filter(group_id=instance.pk),
+        )
+    generations.bump(
+        group_stats.NAMESPACE,
+        f'group:{instance.slug}',
+        *([f'group:{previous_slug}'] if previous_slug else []),
+        *namespaces,
+    )
+
+
+@receiver(pre_save, sender=Post)
+def post_remember_group(sender, instance, raw=False, **kwargs):
+    # При смене сообщества старая страница группы тоже устаревает,
+    # а пост переходит в сводку нового
+    instance._previous_group_id = instance._previous_group_slug = None
+    if instance.pk and not raw:
+        previous = Group.objects.filter(
+            posts__pk=instance.pk,
+        ).values_list('pk', 'slug').first()
+        if previous:
+            instance._previous_group_id, instance._previous_group_slug = (
+                previous
+            )
+
+
+@receiver(post_save, sender=Post)
+def post_bump(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cards.bump('post', instance.pk)
+    group_slug = instance.group.slug if instance.group_id else None
+    generations.bump(*post_namespaces(
+        instance,
+        {group_slug, getattr(instance, '_previous_group_slug', None)},
+    ))
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_user(instance.author_id, post_count=1)
+        timeline.fan_out(instance)
+        trending.add(
+            instance.pk, instance.created, settings.HOT_WEIGHTS['post'],
+        )
+
+
+@receiver(post_save, sender=Post)
+def post_group_stats(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_group_id', None)
+    if created:
+        group_stats.bump(instance.group_id, instance.author_id, 1)
+    elif previous != instance.group_id:
+        group_stats.bump(previous, instance.author_id, -1)
+        group_stats.bump(instance.group_id, instance.author_id, 1)
+
+
+@receiver(pre_delete, sender=Post)
+def post_leave_timelines(sender, instance, **kwargs):
+    # Записи лент удалит каскад, а их число в UserStats - нет
+    timeline.forget(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, post_count=-1)
+    group_stats.bump(instance.group_id, instance.author_id, -1)
+    cards.bump('post', instance.pk)
+    group_slug = Group.objects.filter(pk=instance.group_id).values_list(
+        'slug', flat=True,
+    ).first()
+    generations.bump(*post_namespaces(instance, {group_slug}))
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_post(instance.post_id, 1)
+        generations.bump(f'post:{instance.post_id}')
+        trending.add(
+            instance.post_id,
+            instance.created,
+            settings.HOT_WEIGHTS['comment'],
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, -1)
+    generations.bump(f'post:{instance.post_id}')
+
+
+def follow_bump(follow):
+    # Лента подписчика и счётчики с кнопкой подписки в профиле автора
+    author = User.objects.filter(pk=follow.author_id).values_list(
+        'username', flat=True,
+    ).first()
+    generations.bump(f'timeline:{follow.user_id}', f'author:{author}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_user(instance.author_id, follower_count=1)
+        counters.bump_user(instance.user_id, following_count=1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        follow_bump(instance)
+        # У подписки нет своей страницы: её засчитываем свежему посту
+        newest = Post.objects.filter(author_id=instance.author_id).order_by(
+            '-created', '-pk',
+        ).values_list('pk', flat=True).first()
+        if newest:
+            trending.add(
+                newest, timezone.now(), settings.HOT_WEIGHTS['follow'],
+            )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, follower_count=-1)
+    counters.bump_user(instance.user_id, following_count=-1)
+    timeline.prune(instance.user_id, instance.author_id)
+    follow_bump(instance)
@@ -0,0 +1,12 @@
+from django import template
+
+from posts.utils import page_window as build_page_window
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_window(page_obj, on_each_side=2, on_ends=1):
+    '''{% page_window page_obj as pages %}: см. posts.utils.page_window.'''
+    return build_page_window(page_obj, on_each_side, on_ends)
@@ -0,0 +1,25 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts import cards
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_card(post, without_profile_link=False, without_group_link=False):
+    return mark_safe(
+        cards.render_card(post, without_profile_link, without_group_link),
+    )
+
+
+@register.simple_tag
+def prefetch_cards(
+        posts,
+        without_profile_link=False,
+        without_group_link=False,
+):
+    '''Карточки всей страницы одним запросом к кешу, см. cards.prefetch.'''
+    cards.prefetch(posts, without_profile_link, without_group_link)
+    return ''
@@ -0,0 +1,98 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class FeedApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Сообщество', slug='group', description='-',
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.author, group=cls.group)
+            for i in range(settings.POSTS_PER_PAGE + 3)
+        )
+        cls.urls = (
+            reverse('posts:api_index'),
+            reverse('posts:api_group_list', kwargs={'slug': 'group'}),
+            reverse('posts:api_profile', kwargs={'username': 'author'}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_pages(self):
+        '''Минимальные поля и переход по курсору'''
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url).json()
+                self.assertEqual(
+                    len(first['results']), settings.POSTS_PER_PAGE,
+                )
+                self.assertEqual(set(first['results'][0]), {
+                    'id', 'text', 'created', 'author', 'group',
+                    'comment_count', 'image',
+                })
+                self.assertEqual(first['results'][0]['author'], 'author')
+                self.assertEqual(first['results'][0]['group'], 'group')
+                self.assertIsNone(first['previous_cursor'])
+                second = self.client.get(
+                    url, {'cursor': first['next_cursor']},
+                ).json()
+                self.assertEqual(len(second['results']), 3)
+                self.assertIsNone(second['next_cursor'])
+                self.assertEqual(
+                    len({post['id'] for post in
+                         first['results'] + second['results']}),
+                    settings.POSTS_PER_PAGE + 3,
+                )
+
+    def test_not_modified(self):
+        '''Неизменная страница - 304 одним запросом ключей'''
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                etag = response['ETag']
+                self.assertTrue(etag.startswith('"'))
+                self.assertIn('no-cache', response['Cache-Control'])
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertEqual(response.content, b'')
+
+    def test_etag_changes(self):
+        '''ETag меняется с новым постом, правкой и комментарием'''
+        url = self.urls[0]
+        etag = self.client.get(url)['ETag']
+        post = Post.objects.create(text='Новый', author=self.author)
+        changes = (
+            lambda: None,
+            lambda: Post.objects.filter(pk=post.pk).first().save(),
+            lambda: Comment.objects.create(
+                post=post, author=self.author, text='Комментарий',
+            ),
+        )
+        for change in changes:
+            change()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            etag = response['ETag']
+
+    def test_unknown_owner(self):
+        for url in (
+            reverse('posts:api_group_list', kwargs={'slug': 'missing'}),
+            reverse('posts:api_profile', kwargs={'username': 'missing'}),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
@@ -0,0 +1,67 @@
+import json
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import benchmark
+from posts.models import Comment, Post, User
+
+
+class SeedBenchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_bench', users=40, groups=5, posts=200, comments=300,
+            seed=1, stdout=StringIO(), stderr=StringIO(),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_skewed_dataset(self):
+        '''Посты и комментарии сосредоточены у немногих'''
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        post_counts = sorted(
+            User.objects.values_list('stats__post_count', flat=True),
+            reverse=True,
+        )
+        median = post_counts[len(post_counts) // 2]
+        self.assertGreater(post_counts[0], 5 * median)
+        top_post = Post.objects.order_by('-comment_count').first()
+        self.assertGreater(top_post.comment_count, 300 / 200 * 10)
+
+    def test_bench_report(self):
+        '''Отчёт содержит все сценарии и сравнимые ключи'''
+        output = StringIO()
+        call_command(
+            'bench', requests=5, warmup=1, stdout=output, stderr=StringIO(),
+        )
+        report = json.loads(output.getvalue())
+        self.assertEqual(
+            set(report['results']),
+            {scenario.name for scenario in benchmark.default_scenarios()},
+        )
+        self.assertIn('follow_index', report['results'])
+        for result in report['results'].values():
+            self.assertEqual(
+                set(result),
+                {'requests', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms',
+                 'throughput_rps', 'queries_per_request'},
+            )
+        self.assertEqual(report['environment']['dataset']['posts'], 200)
+
+    def test_render_report(self):
+        '''Отрисовка ленты замеряется с кешем шаблонов и без'''
+        results = benchmark.run_render(requests=3)
+        self.assertEqual(set(results), {'uncached', 'cached'})
+        for result in results.values():
+            self.assertEqual(result['requests'], 3)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile([7], 95), 7)
@@ -0,0 +1,208 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings,
+)
+from django.urls import reverse
+
+from posts import comment_queue, generations
+from posts.models import Comment, Post, PostScore
+
+User = get_user_model()
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+# Свой каталог: соединения с файлом очереди живут в потоках,
+# и удалённый соседним классом файл они бы продолжали читать
+FLUSH_TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(
+    COMMENT_QUEUE_PATH=f'{TEMP_DIR}/queue.sqlite3',
+    COMMENT_THROTTLE_USER=(3, 0.01),
+    COMMENT_THROTTLE_POST=(5, 0.01),
+)
+class CommentQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        comment_queue._db().execute('DELETE FROM comments')
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id},
+        )
+
+    def test_flush_in_batches(self):
+        '''Очередь уходит в базу пачками, счётчик и поколение - разом'''
+        generation = generations.current(f'post:{self.post.pk}')
+        for i in range(5):
+            comment_queue.enqueue(
+                self.post.pk, self.reader, f'Комментарий {i}',
+            )
+        self.assertEqual(comment_queue.size(), 5)
+        with override_settings(COMMENT_QUEUE_BATCH=2):
+            self.assertEqual(comment_queue.flush(), 5)
+        self.assertEqual(comment_queue.size(), 0)
+        self.assertEqual(
+            list(Comment.objects.filter(post=self.post).values_list(
+                'text', flat=True,
+            )),
+            [f'Комментарий {i}' for i in range(4, -1, -1)],
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 5)
+        self.assertNotEqual(
+            generations.current(f'post:{self.post.pk}'), generation,
+        )
+
+    def test_redelivery_is_skipped(self):
+        '''Строка, сброшенная повторно, не даёт второго комментария'''
+        comment_queue.enqueue(self.post.pk, self.reader, 'Один раз')
+        row = comment_queue._db().execute(
+            'SELECT post_id, author_id, text, created FROM comments',
+        ).fetchone()
+        comment_queue.flush()
+        comment_queue._db().execute(
+            'INSERT INTO comments (post_id, author_id, text, created) '
+            'VALUES (?, ?, ?, ?)',
+            row,
+        )
+        self.assertEqual(comment_queue.flush(), 0)
+        self.assertEqual(Comment.objects.filter(text='Один раз').count(), 1)
+
+    def test_deleted_post_is_dropped(self):
+        post = Post.objects.create(text='Удалённый', author=self.author)
+        comment_queue.enqueue(post.pk, self.reader, 'Осиротевший')
+        Post.objects.filter(pk=post.pk).delete()
+        self.assertEqual(comment_queue.flush(), 0)
+        self.assertEqual(comment_queue.size(), 0)
+
+    def test_pending_visible_to_author_only(self):
+        '''Автор видит свой комментарий до сброса, другие - нет'''
+        comment_queue.enqueue(self.post.pk, self.reader, 'Ещё в очереди')
+        self.assertContains(self.reader_client.get(self.url), 'Ещё в очереди')
+        author_client = Client()
+        author_client.force_login(self.author)
+        self.assertNotContains(author_client.get(self.url), 'Ещё в очереди')
+        comment_queue.flush()
+        response = self.reader_client.get(self.url)
+        self.assertEqual(response.context['pending_comments'], [])
+        self.assertContains(response, 'Ещё в очереди', count=1)
+
+    def test_user_throttled(self):
+        '''Сверх корзины пользователя - 429 с Retry-After'''
+        add_url = reverse(
+            'posts:add_comment', kwargs={'post_id': self.post.id},
+        )
+        for i in range(3):
+            response = self.reader_client.post(add_url, {'text': f'Текст {i}'})
+            self.assertRedirects(response, self.url)
+        response = self.reader_client.post(add_url, {'text': 'Лишний'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertContains(
+            response, 'Слишком много комментариев', status_code=429,
+        )
+        self.assertFalse(Comment.objects.filter(text='Лишний').exists())
+
+    def test_post_throttled(self):
+        '''Корзина поста общая для всех комментаторов'''
+        add_url = reverse(
+            'posts:add_comment', kwargs={'post_id': self.post.id},
+        )
+        clients = []
+        for i in range(3):
+            client = Client()
+            client.force_login(User.objects.create_user(username=f'user{i}'))
+            clients.append(client)
+        statuses = [
+            client.post(add_url, {'text': 'Шторм'}).status_code
+            for client in clients for _ in range(2)
+        ]
+        self.assertEqual(statuses, [302] * 5 + [429])
+
+
+@override_settings(
+    COMMENT_QUEUE_PATH=f'{FLUSH_TEMP_DIR}/queue.sqlite3',
+    COMMENT_QUEUE_INTERVAL=0,
+)
+class CommentQueueFlushTests(TransactionTestCase):
+    '''
+    Вне транзакции TestCase: комментарий из вида идёт через очередь
+    и фоновый сброс, как в работающем сайте.
+    '''
+
+    def setUp(self):
+        cache.clear()
+        comment_queue._db().execute('DELETE FROM comments')
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(text='Пост', author=self.author)
+        self.client.force_login(self.reader)
+        self.url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id},
+        )
+        self.add_url = reverse(
+            'posts:add_comment', kwargs={'post_id': self.post.id},
+        )
+
+    def tearDown(self):
+        self.wait_for_flush()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(FLUSH_TEMP_DIR, ignore_errors=True)
+
+    def wait_for_flush(self):
+        # У пула сброса один поток: пустая задача ждёт текущий сброс
+        comment_queue._executor.submit(lambda: None).result(timeout=10)
+
+    def assert_written_once(self, text, score):
+        self.assertEqual(Comment.objects.filter(text=text).count(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertGreater(PostScore.objects.get(post=self.post).score, score)
+        self.assertEqual(comment_queue.size(), 0)
+
+    def test_comment_goes_through_queue(self):
+        '''Комментарий ждёт в очереди, виден автору и пишется один раз'''
+        score = PostScore.objects.get(post=self.post).score
+        with mock.patch.object(comment_queue, 'schedule_flush') as schedule:
+            response = self.client.post(self.add_url, {'text': 'В очереди'})
+        self.assertRedirects(response, self.url)
+        schedule.assert_called_once_with()
+        self.assertFalse(Comment.objects.filter(text='В очереди').exists())
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.context['pending_comments']), 1)
+        self.assertContains(response, 'В очереди', count=1)
+        self.assertEqual(comment_queue.flush(), 1)
+        self.assert_written_once('В очереди', score)
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['pending_comments'], [])
+        self.assertContains(response, 'В очереди', count=1)
+        # Повторный сброс ничего не добавляет
+        self.assertEqual(comment_queue.flush(), 0)
+        self.assert_written_once('В очереди', score)
+
+    def test_background_flush(self):
+        '''Фоновый поток сам переносит очередь в базу'''
+        score = PostScore.objects.get(post=self.post).score
+        self.client.post(self.add_url, {'text': 'Сам доедет'})
+        self.wait_for_flush()
+        self.assert_written_once('Сам доедет', score)
@@ -1,6 +1,7 @@
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -8,7 +9,9 @@ from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
+from posts import thumbnails
 from posts.models import Comment, Group, Post
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -92,6 +95,76 @@ class PostCreateFormTest(TestCase):
             f'image={form_data["image"]}',
         )
 
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_create_post_prepares_card_image(self):
+        '''Миниатюра готовится при загрузке и показывается в ленте'''
+        uploaded = SimpleUploadedFile(
+            name='card.gif',
+            content=(
+                b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                b'\x0A\x00\x3B'
+            ),
+            content_type='image/gif',
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Card image', 'image': uploaded},
+        )
+        post = Post.objects.get(text='Card image')
+        self.assertEqual(
+            (post.image_card.width, post.image_card.height),
+            settings.POST_CARD_IMAGE_SIZE,
+        )
+        response = self.guest_client.get(
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        self.assertContains(response, post.image_card.url)
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_create_post_prepares_renditions(self):
+        '''Варианты картинки не шире исходной попадают в srcset'''
+        buffer = BytesIO()
+        Image.new('RGB', (1000, 500), 'red').save(buffer, 'PNG')
+        uploaded = SimpleUploadedFile(
+            name='wide.png',
+            content=buffer.getvalue(),
+            content_type='image/png',
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Renditions', 'image': uploaded},
+        )
+        post = Post.objects.get(text='Renditions')
+        formats = thumbnails.supported_formats()
+        self.assertIn('webp', formats)
+        self.assertEqual(
+            sorted(post.renditions.values_list('width', 'format')),
+            sorted(
+                (width, image_format)
+                for width in (320, 640, 960)
+                for image_format in formats
+            ),
+        )
+        rendition = post.renditions.get(width=640, format='webp')
+        self.assertEqual(
+            (rendition.file.width, rendition.file.height), (640, 226),
+        )
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, f'{rendition.file.url} 640w')
+
+    def test_card_image_placeholder(self):
+        '''Пока миниатюры нет, в ленте заглушка'''
+        Post.objects.filter(pk=self.post.pk).update(image='posts/pending.gif')
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        self.assertContains(response, 'img/placeholder.svg')
+
     def test_edit_post_form(self):
         '''Проверка формы редактирования поста'''
         post_count = Post.objects.count()
@@ -0,0 +1,128 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import group_stats
+from posts.models import Group, GroupStats, Post
+
+User = get_user_model()
+
+
+class GroupStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Сообщество', slug='group', description='Описание',
+        )
+        cls.second = Group.objects.create(
+            title='Второе', slug='second', description='Описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def stats(self, group):
+        return GroupStats.objects.get(group=group)
+
+    def test_new_group_has_empty_stats(self):
+        '''У нового сообщества сразу есть пустая сводка'''
+        stats = self.stats(self.group)
+        self.assertEqual(stats.post_count, 0)
+        self.assertIsNone(stats.last_post)
+        self.assertEqual(stats.top_author_list, [])
+
+    def test_posts_update_stats(self):
+        '''Публикация и удаление поста меняют сводку сообщества'''
+        Post.objects.create(text='1', author=self.other, group=self.group)
+        first = Post.objects.create(
+            text='2', author=self.author, group=self.group,
+        )
+        last = Post.objects.create(
+            text='3', author=self.author, group=self.group,
+        )
+        stats = self.stats(self.group)
+        self.assertEqual(stats.post_count, 3)
+        self.assertEqual(stats.last_post, last.created)
+        self.assertEqual(
+            stats.top_author_list, [('author', 2), ('other', 1)],
+        )
+        last.delete()
+        stats = self.stats(self.group)
+        self.assertEqual(stats.post_count, 2)
+        self.assertEqual(stats.last_post, first.created)
+        self.assertEqual(
+            stats.top_author_list, [('author', 1), ('other', 1)],
+        )
+
+    def test_moving_post_between_groups(self):
+        '''Пост, перенесённый в другое сообщество, уходит в его сводку'''
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group,
+        )
+        post.group = self.second
+        post.save()
+        self.assertEqual(self.stats(self.group).post_count, 0)
+        self.assertEqual(self.stats(self.group).top_author_list, [])
+        self.assertEqual(self.stats(self.second).post_count, 1)
+        self.assertEqual(
+            self.stats(self.second).top_author_list, [('author', 1)],
+        )
+
+    def test_rename_updates_top_authors(self):
+        '''Новое имя автора попадает в сводки его сообществ'''
+        Post.objects.create(text='Пост', author=self.author, group=self.group)
+        self.author.username = 'renamed'
+        self.author.save()
+        self.assertEqual(
+            self.stats(self.group).top_author_list, [('renamed', 1)],
+        )
+
+    def test_rebuild(self):
+        '''rebuild() восстанавливает разошедшиеся сводки'''
+        posts = Post.objects.bulk_create(
+            Post(text=str(i), author=self.author, group=self.group)
+            for i in range(3)
+        )
+        self.assertEqual(self.stats(self.group).post_count, 0)
+        self.assertEqual(group_stats.rebuild(), 2)
+        stats = self.stats(self.group)
+        self.assertEqual(stats.post_count, 3)
+        self.assertEqual(
+            stats.last_post, max(post.created for post in posts),
+        )
+        self.assertEqual(stats.top_author_list, [('author', 3)])
+
+    def test_deleting_bulk_created_post(self):
+        '''Удаление неучтённого поста не уводит сводку ниже нуля'''
+        Post.objects.bulk_create([
+            Post(text='Пост', author=self.author, group=self.group),
+        ])
+        Post.objects.get(text='Пост').delete()
+        self.assertEqual(self.stats(self.group).post_count, 0)
+
+    def test_directory_page(self):
+        '''Каталог - один запрос по сводкам, сколько бы ни было постов'''
+        for i in range(5):
+            Post.objects.create(
+                text=str(i), author=self.author, group=self.group,
+            )
+        url = reverse('posts:group_index')
+        # Число сообществ для пагинатора и сами сообщества со сводками
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        groups = list(response.context['page_obj'])
+        self.assertEqual(groups, [self.second, self.group])
+        self.assertContains(response, 'Постов: 5')
+        self.assertContains(response, reverse(
+            'posts:profile', kwargs={'username': 'author'},
+        ))
+
+    def test_directory_page_follows_posts(self):
+        '''Кеш каталога сбрасывается новым постом'''
+        url = reverse('posts:group_index')
+        self.assertContains(self.client.get(url), 'Постов: 0', count=2)
+        Post.objects.create(text='Пост', author=self.author, group=self.group)
+        self.assertContains(self.client.get(url), 'Постов: 1')
@@ -6,12 +6,15 @@ TODO:
 и help_text; протестируйте их.
 '''
 
+from io import StringIO
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -39,3 +42,66 @@ class PostModelTest(TestCase):
     def test_group_model_have_correct_object_names(self):
         group = PostModelTest.group
         self.assertEqual(str(group), 'Test group, please ignore')
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        '''Счётчики меняются при создании и удалении записей'''
+        post = Post.objects.create(author=self.author, text='Post')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Comment',
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(self.stats(self.author).post_count, 1)
+        self.assertEqual(self.stats(self.author).follower_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+        self.assertEqual(self.stats(self.author).follower_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).post_count, 0)
+
+    def test_counters_do_not_go_negative(self):
+        '''Удаление записей из bulk_create не уводит счётчики ниже нуля'''
+        Post.objects.bulk_create([Post(author=self.author, text='Post')])
+        post = Post.objects.get(text='Post')
+        Comment.objects.bulk_create([
+            Comment(post=post, author=self.reader, text='Comment'),
+        ])
+        Comment.objects.get(text='Comment').delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).post_count, 0)
+
+    def test_recount_counters_command(self):
+        '''recount_counters исправляет разошедшиеся счётчики'''
+        post = Post.objects.create(author=self.author, text='Post')
+        Comment.objects.create(post=post, author=self.reader, text='1')
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserStats.objects.update(
+            post_count=7, follower_count=7, following_count=7,
+        )
+        UserStats.objects.filter(user=self.reader).delete()
+        Post.objects.update(comment_count=7)
+        call_command('recount_counters', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(self.stats(self.author).post_count, 1)
+        self.assertEqual(self.stats(self.author).follower_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertEqual(self.stats(self.reader).post_count, 0)
@@ -0,0 +1,44 @@
+from django.core.paginator import Paginator
+from django.template.loader import render_to_string
+from django.test import SimpleTestCase
+
+from posts.utils import page_window
+
+
+def window(number, num_pages, **kwargs):
+    return page_window(
+        Paginator(range(num_pages), 1).page(number), **kwargs,
+    )
+
+
+class PageWindowTests(SimpleTestCase):
+    def test_few_pages_all_shown(self):
+        self.assertEqual(window(1, 1), [1])
+        self.assertEqual(window(3, 7), [1, 2, 3, 4, 5, 6, 7])
+
+    def test_elided(self):
+        '''Первая, последняя и по две вокруг текущей'''
+        self.assertEqual(window(1, 100), [1, 2, 3, None, 100])
+        self.assertEqual(
+            window(50, 100), [1, None, 48, 49, 50, 51, 52, None, 100],
+        )
+        self.assertEqual(window(100, 100), [1, None, 98, 99, 100])
+        # Пропуск в одну страницу - номер, а не "..."
+        self.assertEqual(window(5, 100), [1, 2, 3, 4, 5, 6, 7, None, 100])
+
+    def test_options(self):
+        self.assertEqual(
+            window(50, 100, on_each_side=1, on_ends=2),
+            [1, 2, None, 49, 50, 51, None, 99, 100],
+        )
+
+    def test_template_renders_constant_links(self):
+        '''Число ссылок не зависит от числа страниц'''
+        page = Paginator(range(50_000), 1).page(25_000)
+        html = render_to_string(
+            'posts/includes/paginator.html', {'page_obj': page},
+        )
+        # Первая, Предыдущая, окно из 9 элементов, Следующая, Последняя
+        self.assertEqual(html.count('<li'), 13)
+        self.assertIn('?page=24999', html)
+        self.assertIn('?page=50000', html)
@@ -0,0 +1,163 @@
+import re
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import timeline
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Полный проход по таблице: "SCAN posts_post" без "USING ... INDEX"
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+$')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class QueryPlanTests(TestCase):
+    '''
+    Горячие запросы лент не должны проходить таблицу целиком
+    и сортировать результат во временном B-дереве.
+    '''
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Test title, please ignore',
+            slug='test_slug',
+            description='Test description, please ignore',
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Post {i}', author=cls.author, group=cls.group)
+            for i in range(15)
+        )
+        cls.post = Post.objects.create(
+            text='Test text, please ignore',
+            author=cls.author,
+            group=cls.group,
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Comment',
+        )
+        # bulk_create не шлёт сигналы: ленту заполнит подписка
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        # При TIMELINE_FANOUT_LIMIT=1 у автора prolific два подписчика
+        cls.prolific = User.objects.create_user(username='prolific')
+        Post.objects.bulk_create(
+            Post(text=f'Prolific post {i}', author=cls.prolific)
+            for i in range(15)
+        )
+        Follow.objects.create(user=cls.reader, author=cls.prolific)
+        Follow.objects.create(user=cls.author, author=cls.prolific)
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def clear_page_cache(self):
+        # Список плодовитых авторов кешируется надолго и не входит
+        # в запросы страницы: прогреваем его заранее.
+        cache.clear()
+        timeline.prolific_authors()
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_plans_use_indexes(self, url, params=None, search_only=False):
+        # Параметры нужны отдельно от SQL: с подставленными литералами
+        # SQLite строит другой план, чем для реального запроса.
+        queries = []
+
+        def capture(execute, sql, sql_params, many, context):
+            queries.append((sql, sql_params))
+            return execute(sql, sql_params, many, context)
+
+        with connection.execute_wrapper(capture):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        for sql, sql_params in queries:
+            if not sql.startswith('SELECT') or '"posts_' not in sql:
+                continue
+            for step in self.explain(sql, sql_params):
+                with self.subTest(url=url, sql=sql, step=step):
+                    self.assertIsNone(FULL_SCAN.match(step))
+                    self.assertNotIn(TEMP_SORT, step)
+                    if search_only:
+                        # Проход индекса с начала до курсора - O(глубины)
+                        self.assertTrue(step.startswith('SEARCH'))
+
+    def test_feed_plans(self):
+        '''Первые страницы лент идут по составным индексам'''
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+            reverse('posts:hot'),
+            reverse('posts:group_index'),
+            reverse('posts:api_index'),
+            reverse('posts:api_group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:api_profile', kwargs={'username': self.author}),
+        )
+        for url in urls:
+            self.assert_plans_use_indexes(url)
+
+    def test_next_page_plans(self):
+        '''Страницы по курсору - диапазон того же индекса'''
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            first_page = self.client.get(url).context['page_obj']
+            cache.clear()
+            second_page = self.client.get(
+                url, {'cursor': first_page.next_cursor},
+            ).context['page_obj']
+            self.clear_page_cache()
+            self.assert_plans_use_indexes(
+                url, {'cursor': first_page.next_cursor}, search_only=True,
+            )
+            self.clear_page_cache()
+            self.assert_plans_use_indexes(
+                url, {'cursor': second_page.previous_cursor}, search_only=True,
+            )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_prolific_reader_plans(self):
+        '''
+        Лента читателя плодовитого автора - диапазоны индекса ленты
+        и индекса (author, -created) автора, без OR по двум индексам
+        '''
+        url = reverse('posts:follow_index')
+        self.clear_page_cache()
+        self.assertIn(self.prolific.pk, timeline.prolific_authors())
+        self.assert_plans_use_indexes(url)
+        self.clear_page_cache()
+        first_page = self.client.get(url).context['page_obj']
+        self.clear_page_cache()
+        second_page = self.client.get(
+            url, {'cursor': first_page.next_cursor},
+        ).context['page_obj']
+        self.clear_page_cache()
+        self.assert_plans_use_indexes(
+            url, {'cursor': first_page.next_cursor}, search_only=True,
+        )
+        self.clear_page_cache()
+        self.assert_plans_use_indexes(
+            url, {'cursor': second_page.previous_cursor}, search_only=True,
+        )
@@ -0,0 +1,106 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post
+
+User = get_user_model()
+
+
+@skipUnless(search.available(), 'FTS5 есть только в SQLite')
+class PostSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.best = Post.objects.create(
+            text='Котики и ещё раз котики: котики <b>повсюду</b>',
+            author=cls.author,
+        )
+        cls.other = Post.objects.create(
+            text='Длинный пост про собак, в конце которого упомянуты котики '
+                 'и ещё много разных слов про прогулки и поводки',
+            author=cls.author,
+        )
+        # bulk_create не шлёт сигналы: индекс ведут триггеры
+        Post.objects.bulk_create(
+            Post(text=f'Попугай номер {i}, parrot', author=cls.author)
+            for i in range(15)
+        )
+
+    def setUp(self):
+        self.client = Client()
+
+    def get(self, query, cursor=None):
+        params = {'q': query}
+        if cursor:
+            params['cursor'] = cursor
+        return self.client.get(reverse('posts:post_search'), params)
+
+    def test_ranked_results_with_highlight(self):
+        '''Лучшее совпадение первым, найденные слова подсвечены'''
+        response = self.get('котики')
+        posts = list(response.context['page_obj'])
+        self.assertEqual(posts, [self.best, self.other])
+        self.assertContains(response, '<mark>Котики</mark>')
+        # Текст поста экранируется, подсветка - нет
+        self.assertContains(response, '&lt;b&gt;повсюду&lt;/b&gt;')
+
+    def test_prefix_and_operators(self):
+        '''Последнее слово ищется по префиксу, операторы FTS5 - просто слова'''
+        self.assertEqual(
+            list(self.get('котик').context['page_obj']),
+            [self.best, self.other],
+        )
+        self.assertEqual(len(self.get('NOT "котики" OR *').context[
+            'page_obj'
+        ]), 0)
+        self.assertEqual(len(self.get('').context['page_obj']), 0)
+
+    def test_index_follows_changes(self):
+        '''Правка и удаление поста сразу видны в поиске'''
+        Post.objects.filter(pk=self.other.pk).update(text='Только собаки')
+        Post.objects.filter(pk=self.best.pk).delete()
+        self.assertEqual(len(self.get('котики').context['page_obj']), 0)
+        self.assertEqual(
+            list(self.get('собаки').context['page_obj']), [self.other],
+        )
+
+    @override_settings(POSTS_PER_PAGE=4)
+    def test_cursor_pagination(self):
+        '''Страницы по курсору (rank, id) без пропусков и повторов'''
+        seen = []
+        page = self.get('попугай').context['page_obj']
+        seen.extend(page)
+        while page.has_next():
+            next_cursor = page.next_cursor
+            page = self.get('попугай', next_cursor).context['page_obj']
+            seen.extend(page)
+        self.assertEqual(len(seen), 15)
+        self.assertEqual(len(set(seen)), 15)
+        previous = self.get('попугай', page.previous_cursor).context[
+            'page_obj'
+        ]
+        self.assertEqual(list(previous), seen[-len(page) - 4:-len(page)])
+        # Ссылки на страницы сохраняют запрос
+        self.assertContains(self.get('parrot'), 'href="?q=parrot&amp;cursor=')
+
+    def test_admin_search_uses_index(self):
+        '''Поиск в админке идёт по индексу, а не LIKE'''
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password',
+        )
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse('admin:posts_post_changelist'), {'q': 'котики'},
+            )
+        self.assertEqual(
+            set(response.context['cl'].result_list), {self.best, self.other},
+        )
+        for query in context.captured_queries:
+            self.assertNotIn('LIKE', query['sql'])
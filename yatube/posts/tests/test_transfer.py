@@ -0,0 +1,224 @@
+import json
+import os
+import shutil
+import tempfile
+from functools import partial
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from posts import search, transfer
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TransferCommandsTests(TestCase):
+    '''Выгрузка и загрузка данных командами export_posts/import_posts'''
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание',
+        )
+        for i in range(5):
+            post = Post.objects.create(
+                text=f'Пост номер {i}, "кавычки", запятые',
+                author=author,
+                group=group if i % 2 else None,
+            )
+            Comment.objects.create(
+                post=post, author=reader, text=f'Комментарий {i}',
+            )
+        Follow.objects.create(user=reader, author=author)
+        self.snapshot = self.dump()
+
+    def dump(self):
+        return {
+            'groups': list(Group.objects.values_list(
+                'slug', 'title', 'description',
+            )),
+            'posts': list(Post.objects.order_by('pk').values_list(
+                'pk', 'created', 'text', 'author__username', 'group__slug',
+            )),
+            'comments': list(Comment.objects.order_by('pk').values_list(
+                'pk', 'created', 'text', 'post_id', 'author__username',
+            )),
+            'follows': list(Follow.objects.values_list(
+                'user__username', 'author__username',
+            )),
+        }
+
+    def export(self, name):
+        path = os.path.join(self.directory, name)
+        call_command('export_posts', path, stderr=StringIO())
+        return path
+
+    def clear_database(self):
+        for model in (Group, User):
+            model.objects.all().delete()
+
+    def import_file(self, path, **options):
+        call_command(
+            'import_posts', path, stdout=StringIO(), stderr=StringIO(),
+            **options,
+        )
+
+    def test_round_trip(self):
+        '''Данные переживают выгрузку и загрузку в обоих форматах'''
+        for name in ('dump.ndjson', 'dump.csv'):
+            with self.subTest(name=name):
+                path = self.export(name)
+                self.clear_database()
+                self.import_file(path, batch_size=3)
+                self.assertEqual(self.dump(), self.snapshot)
+
+    def test_deferred_maintenance(self):
+        '''После загрузки верны счётчики, лента подписок и поиск'''
+        path = self.export('dump.ndjson')
+        self.clear_database()
+        self.import_file(path)
+        author = User.objects.get(username='author')
+        reader = User.objects.get(username='reader')
+        self.assertEqual(author.stats.post_count, 5)
+        self.assertEqual(author.stats.follower_count, 1)
+        self.assertEqual(
+            set(Post.objects.values_list('comment_count', flat=True)), {1},
+        )
+        self.assertEqual(TimelineEntry.objects.filter(user=reader).count(), 5)
+        response = Client().get(reverse('posts:post_search'), {'q': 'номер'})
+        self.assertEqual(len(response.context['page_obj']), 5)
+
+    def test_resume_from_checkpoint(self):
+        '''Загрузка продолжается с контрольной точки и удаляет её'''
+        path = self.export('dump.ndjson')
+        checkpoint = path + '.checkpoint'
+        # Сбой после первой пачки: сообщество и посты уже загружены
+        with open(checkpoint, 'w') as stream:
+            stream.write('6')
+        Comment.objects.all().delete()
+        Follow.objects.all().delete()
+        Group.objects.all().delete()
+        self.import_file(path)
+        # Записи до контрольной точки не читались заново
+        self.assertFalse(Group.objects.exists())
+        self.assertEqual(
+            self.dump()['comments'], self.snapshot['comments'],
+        )
+        self.assertEqual(self.dump()['follows'], self.snapshot['follows'])
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_resume_maintains_earlier_batches(self):
+        '''Продолжение обслуживает и авторов пачек до сбоя'''
+        path = os.path.join(self.directory, 'resume.ndjson')
+        records = [
+            {
+                'type': 'post', 'id': 1000, 'author': 'first',
+                'created': '2021-01-01T00:00:00+00:00',
+                'text': 'Из первой пачки',
+            },
+            {'type': 'follow', 'user': 'fan', 'author': 'first'},
+            {
+                'type': 'post', 'id': 1001, 'author': 'second',
+                'created': '2021-01-02T00:00:00+00:00',
+                'text': 'Из второй пачки',
+            },
+        ]
+        with open(path, 'w', encoding='utf-8') as stream:
+            transfer.write_ndjson(records, stream)
+        # Первая пачка записана, затем сбой: обслуживания не было
+        checkpoint = path + '.checkpoint'
+        transfer.Importer(batch_size=2).import_records(
+            records[:2],
+            checkpoint=partial(transfer.write_checkpoint, checkpoint),
+        )
+        self.import_file(path, batch_size=2)
+        fan = User.objects.get(username='fan')
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=fan).values_list(
+                'post_id', flat=True,
+            )),
+            [1000],
+        )
+        client = Client()
+        client.force_login(fan)
+        self.assertContains(
+            client.get(reverse('posts:follow_index')), 'Из первой пачки',
+        )
+
+    def test_conflicting_ids(self):
+        '''Чужой пост с тем же id останавливает импорт'''
+        path = self.export('dump.csv')
+        Comment.objects.all().delete()
+        post = Post.objects.order_by('pk').first()
+        post.text = 'Чужой пост'
+        post.save()
+        with self.assertRaisesMessage(CommandError, 'уже есть в базе'):
+            self.import_file(path)
+        self.assertFalse(Comment.objects.exists())
+        # Индекс поиска не пропадал и снова следит за постами
+        Post.objects.create(text='Свежий пост', author=post.author)
+        response = Client().get(reverse('posts:post_search'), {'q': 'свежий'})
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+    def test_reimport_counts_only_new_rows(self):
+        '''Повторная загрузка того же файла ничего не добавляет'''
+        path = self.export('dump.csv')
+        importer = transfer.Importer(batch_size=4)
+        with open(path, encoding='utf-8', newline='') as stream:
+            importer.import_records(transfer.read_csv(stream))
+        self.assertEqual(self.dump(), self.snapshot)
+        self.assertEqual(importer.counts, dict.fromkeys(transfer.TYPES, 0))
+
+    def test_search_works_during_import(self):
+        '''Во время загрузки поиск отвечает по старому индексу'''
+        transfer.prepare()
+        try:
+            response = Client().get(
+                reverse('posts:post_search'), {'q': 'номер'},
+            )
+        finally:
+            search.resume()
+        self.assertEqual(len(response.context['page_obj']), 5)
+
+
+class TransferErrorsTests(TransactionTestCase):
+    '''
+    Внешние ключи SQLite проверяются при фиксации транзакции,
+    а в TestCase она не фиксируется.
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_dangling_reference(self):
+        '''Комментарий к отсутствующему посту - ошибка в данных'''
+        path = os.path.join(self.directory, 'dangling.ndjson')
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write(json.dumps({
+                'type': 'comment', 'id': 1, 'post': 404, 'author': 'reader',
+                'created': '2021-01-01T00:00:00+00:00', 'text': 'Некуда',
+            }) + '\n')
+        with self.assertRaisesMessage(CommandError, 'Ошибка в данных'):
+            call_command(
+                'import_posts', path, stdout=StringIO(), stderr=StringIO(),
+            )
+        self.assertFalse(Comment.objects.exists())
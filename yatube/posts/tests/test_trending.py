@@ -0,0 +1,124 @@
+import math
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import trending
+from posts.models import Comment, Follow, Post, PostScore
+
+User = get_user_model()
+
+
+@override_settings(
+    HOT_HALF_LIFE=3600,
+    HOT_WEIGHTS={'post': 1, 'comment': 1, 'follow': 2},
+)
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        cache.clear()
+
+    def post_at(self, hours_ago, text='Пост'):
+        post = Post.objects.create(text=text, author=self.author)
+        post.created = timezone.now() - timedelta(hours=hours_ago)
+        post.save(update_fields=['created'])
+        trending.rebuild()
+        return post
+
+    def score(self, post):
+        return PostScore.objects.get(post=post).score
+
+    def test_event_decays_by_half_life(self):
+        '''Событие на период полураспада старше весит вдвое меньше'''
+        now = timezone.now()
+        self.assertAlmostEqual(
+            trending.event_score(now, 1)
+            - trending.event_score(now - timedelta(hours=1), 1),
+            math.log(2),
+        )
+
+    def test_new_post_gets_score(self):
+        '''Новый пост сразу получает оценку'''
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.assertAlmostEqual(
+            self.score(post), trending.event_score(post.created, 1),
+        )
+
+    def test_comment_adds_to_score(self):
+        '''Комментарий прибавляет вес к оценке одним обновлением'''
+        post = Post.objects.create(text='Пост', author=self.author)
+        before = self.score(post)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий',
+        )
+        self.assertAlmostEqual(
+            self.score(post),
+            trending.logaddexp(
+                before, trending.event_score(comment.created, 1),
+            ),
+        )
+        # Инкрементальная оценка совпадает с пересчётом
+        score = self.score(post)
+        trending.rebuild()
+        self.assertAlmostEqual(self.score(post), score)
+
+    def test_follow_boosts_newest_post(self):
+        '''Подписка засчитывается последнему посту автора'''
+        old = self.post_at(5)
+        new = self.post_at(1)
+        scores = self.score(old), self.score(new)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.score(old), scores[0])
+        self.assertGreater(self.score(new), scores[1])
+
+    def test_add_many_matches_single_adds(self):
+        '''Пачка событий даёт ту же оценку, что и события по одному'''
+        first = self.post_at(2)
+        second = self.post_at(2)
+        PostScore.objects.filter(post=second).update(score=self.score(first))
+        now = timezone.now()
+        events = [(first.pk, now, 1), (first.pk, now, 3)]
+        trending.add_many(events)
+        for post_id, created, weight in events:
+            trending.add(second.pk, created, weight)
+        self.assertAlmostEqual(self.score(first), self.score(second))
+
+    def test_busy_old_post_outranks_quiet_new(self):
+        '''Обсуждаемый пост выше нового, пока активность не затухла'''
+        busy = self.post_at(3, 'Обсуждаемый')
+        quiet = self.post_at(0, 'Новый')
+        now = timezone.now()
+        trending.add_many([(busy.pk, now, 1)] * 3)
+        self.assertEqual(trending.top_ids()[:2], [busy.pk, quiet.pk])
+
+    def test_hot_page(self):
+        '''Страница популярного - посты в порядке оценки, без агрегатов'''
+        old = self.post_at(10, 'Старый')
+        new = self.post_at(0, 'Новый')
+        url = reverse('posts:hot')
+        trending.top_ids()
+        with self.assertNumQueries(2):
+            # Посты с авторами и сообществами и варианты картинок
+            response = self.client.get(url)
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [new.pk, old.pk],
+        )
+
+    @override_settings(HOT_TOP_K=3, POSTS_PER_PAGE=2)
+    def test_hot_page_is_limited(self):
+        '''В ленте не больше HOT_TOP_K постов'''
+        for hours in range(5):
+            self.post_at(hours)
+        response = self.client.get(reverse('posts:hot'), {'page': 2})
+        page = response.context['page_obj']
+        self.assertEqual(page.paginator.count, 3)
+        self.assertEqual(len(page), 1)
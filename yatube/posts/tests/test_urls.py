@@ -47,6 +47,21 @@ class UrlTests(TestCase):
                 HTTPStatus.OK,
                 HTTPStatus.OK,
             ),
+            reverse('posts:post_search'): (
+                'posts/search.html',
+                HTTPStatus.OK,
+                HTTPStatus.OK,
+            ),
+            reverse('posts:hot'): (
+                'posts/hot.html',
+                HTTPStatus.OK,
+                HTTPStatus.OK,
+            ),
+            reverse('posts:group_index'): (
+                'posts/group_index.html',
+                HTTPStatus.OK,
+                HTTPStatus.OK,
+            ),
             '/unexisting_page/': (
                 'core/404.html',
                 HTTPStatus.NOT_FOUND,
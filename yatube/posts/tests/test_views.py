@@ -1,15 +1,21 @@
 import shutil
 import tempfile
+from io import StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
-from posts.models import Group, Post
+from posts import generations, timeline
+from posts.models import (
+    Comment, Follow, Group, Post, TimelineEntry, UserStats,
+)
 
 IMAGE = (
     b"\x47\x49\x46\x38\x39\x61\x02\x00"
@@ -204,25 +210,39 @@ class PostViewsTest(TestCase):
         '''Проверка кэширования главной страницы.'''
         response = self.authorized_client.get(reverse('posts:index'))
         content_1 = response.content
-        post_count1 = Post.objects.count()
-        # Добавляем новый пост (должен попасть в кеш)
-        Post.objects.create(
-            text='Test cached text, please ignore',
-            author=self.user,
-            group=self.group,
+        # update() не шлёт сигналов: страница остаётся в кеше
+        Post.objects.filter(pk=self.post.pk).update(
+            text='Test silent edit, please ignore',
         )
         response_2 = self.authorized_client.get(reverse('posts:index'))
         content_2 = response_2.content
         self.assertEqual(content_1, content_2, 'Кеш не работает')
         cache.clear()
-        post_count3 = Post.objects.count()
         response_3 = self.authorized_client.get(reverse('posts:index'))
         content_3 = response_3.content
         self.assertNotEqual(content_1, content_3, 'Кеш не очистился')
-        self.assertNotEqual(
-            post_count1, post_count3,
-            'Количество постов не изменилось',
+        Post.objects.filter(pk=self.post.pk).update(text=self.post.text)
+
+    def test_new_post_invalidates_feed_cache(self):
+        '''Новый пост сразу виден в закешированных лентах'''
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        Post.objects.create(
+            text='Test cached text, please ignore',
+            author=self.user,
+            group=self.group,
         )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.guest_client.get(url),
+                    'Test cached text, please ignore',
+                )
 
 
 class PaginatorViewTests(TestCase):
@@ -247,33 +267,569 @@ class PaginatorViewTests(TestCase):
         )
         Post.objects.bulk_create(posts)
 
-        cls.URLS = {
-            reverse('posts:index'): settings.POSTS_PER_PAGE,
-            reverse('posts:index') + '?page=2': cls.POSTS_ON_SECOND_PAGE,
+        cls.URLS = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.user}),
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_paginator_all(self):
+        '''Проверка пагинатора: первая и следующая по курсору страницы'''
+        for url in self.URLS:
+            with self.subTest(url=url):
+                page_obj = self.guest_client.get(url).context.get('page_obj')
+                self.assertEqual(len(page_obj), settings.POSTS_PER_PAGE)
+                self.assertTrue(page_obj.has_next())
+                self.assertFalse(page_obj.has_previous())
+                response = self.guest_client.get(
+                    url, {'cursor': page_obj.next_cursor},
+                )
+                second_page = response.context.get('page_obj')
+                self.assertEqual(len(second_page), self.POSTS_ON_SECOND_PAGE)
+                self.assertFalse(second_page.has_next())
+                self.assertTrue(second_page.has_previous())
+                self.assertFalse(
+                    set(page_obj) & set(second_page),
+                    'Страницы пересекаются',
+                )
+
+    def test_paginator_previous_cursor(self):
+        '''Курсор "назад" возвращает исходную страницу'''
+        url = reverse('posts:index')
+        first_page = self.guest_client.get(url).context['page_obj']
+        second_page = self.guest_client.get(
+            url, {'cursor': first_page.next_cursor},
+        ).context['page_obj']
+        previous_page = self.guest_client.get(
+            url, {'cursor': second_page.previous_cursor},
+        ).context['page_obj']
+        self.assertEqual(list(previous_page), list(first_page))
+        self.assertFalse(previous_page.has_previous())
+
+    def test_paginator_broken_cursor(self):
+        '''Битый курсор отдаёт первую страницу'''
+        response = self.guest_client.get(
+            reverse('posts:index'), {'cursor': 'not-a-cursor'},
+        )
+        self.assertEqual(
+            len(response.context['page_obj']), settings.POSTS_PER_PAGE,
+        )
+
+
+class FollowTimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.old_post = Post.objects.create(
+            text='Old post, please ignore',
+            author=cls.author,
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def follow_page(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        '''Подписка дозаполняет ленту, отписка очищает её'''
+        self.assertEqual(self.follow_page(), [])
+        self.reader_client.get(
+            reverse('posts:profile_follow', kwargs={'username': self.author}),
+        )
+        self.assertEqual(self.follow_page(), [self.old_post])
+        self.reader_client.get(
+            reverse(
+                'posts:profile_unfollow', kwargs={'username': self.author},
+            ),
+        )
+        self.assertEqual(self.follow_page(), [])
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+
+    def test_new_post_fans_out_to_followers(self):
+        '''Новый пост попадает в ленту подписчика, но не чужую'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(text='New post', author=self.author)
+        self.assertEqual(self.follow_page(), [new_post, self.old_post])
+        self.assertFalse(TimelineEntry.objects.filter(user=self.author))
+
+    @override_settings(TIMELINE_MAX_LENGTH=2)
+    def test_timeline_is_capped(self):
+        '''Лента обрезается до TIMELINE_MAX_LENGTH записей'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [
+            Post.objects.create(text=f'Post {i}', author=self.author)
+            for i in range(3)
+        ]
+        self.assertEqual(self.follow_page(), posts[::-1][:2])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_prolific_author_is_merged_on_read(self):
+        '''Посты плодовитого автора не раздаются, а читаются напрямую'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        cache.clear()
+        new_post = Post.objects.create(text='New post', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=new_post))
+        self.assertEqual(self.follow_page(), [new_post, self.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1, POSTS_PER_PAGE=2)
+    def test_prolific_pages_are_merged(self):
+        '''Лента и плодовитый автор листаются общими страницами'''
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        cache.clear()
+        Follow.objects.create(user=self.reader, author=other)
+        posts = [self.old_post] + [
+            Post.objects.create(
+                text=f'Post {i}', author=(self.author, other)[i % 2],
+            )
+            for i in range(4)
+        ]
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 3,
+        )
+        expected = posts[::-1]
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        pages = [list(response.context['page_obj'])]
+        while response.context['page_obj'].has_next():
+            response = self.reader_client.get(
+                reverse('posts:follow_index'),
+                {'cursor': response.context['page_obj'].next_cursor},
+            )
+            pages.append(list(response.context['page_obj']))
+        self.assertEqual(pages, [expected[:2], expected[2:4], expected[4:]])
+        response = self.reader_client.get(
+            reverse('posts:follow_index'),
+            {'cursor': response.context['page_obj'].previous_cursor},
+        )
+        self.assertEqual(list(response.context['page_obj']), expected[2:4])
+
+    @override_settings(TIMELINE_MAX_LENGTH=2)
+    def test_fan_out_trims_all_followers_at_once(self):
+        '''Заполненные ленты всех подписчиков обрезаются одним запросом'''
+        readers = [self.reader] + [
+            User.objects.create_user(username=f'reader{i}') for i in range(3)
+        ]
+        for reader in readers:
+            Follow.objects.create(user=reader, author=self.author)
+        posts = [
+            Post.objects.create(text=f'Post {i}', author=self.author)
+            for i in range(3)
+        ]
+        for reader in readers:
+            self.assertEqual(
+                list(TimelineEntry.objects.filter(user=reader).values_list(
+                    'post', flat=True,
+                )),
+                [posts[2].pk, posts[1].pk],
+            )
+        self.assertEqual(
+            set(UserStats.objects.filter(user__in=readers).values_list(
+                'timeline_length', flat=True,
+            )),
+            {2},
+        )
+        # Подписчики, раздача, одна обрезка заполненных лент на всех
+        # и длины лент
+        with self.assertNumQueries(4):
+            timeline.fan_out(posts[2])
+
+    @override_settings(TIMELINE_MAX_LENGTH=2)
+    def test_timeline_length_follows_deletes(self):
+        '''Длина ленты уменьшается при удалении поста и отписке'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(text='New post', author=self.author)
+        stats = UserStats.objects.get(user=self.reader)
+        self.assertEqual(stats.timeline_length, 2)
+        new_post.delete()
+        stats.refresh_from_db()
+        self.assertEqual(stats.timeline_length, 1)
+        # Неполная лента не обрезается: старый пост остаётся
+        Post.objects.create(text='Newer post', author=self.author)
+        self.assertEqual(len(self.follow_page()), 2)
+        Follow.objects.filter(user=self.reader).delete()
+        stats.refresh_from_db()
+        self.assertEqual(stats.timeline_length, 0)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_demoted_author_is_fanned_out(self):
+        '''Автор, переставший быть плодовитым, раздаёт пропущенные посты'''
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        cache.clear()
+        new_post = Post.objects.create(text='New post', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=new_post))
+        Follow.objects.filter(user=other).delete()
+        self.assertNotIn(self.author.pk, timeline.prolific_authors())
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=new_post),
+        )
+        self.assertEqual(self.follow_page(), [new_post, self.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_unfollow_without_skipped_posts_is_cheap(self):
+        '''Отписка до порога не раздаёт посты, если их не пропускали'''
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        self.assertNotIn(self.author.pk, timeline.prolific_authors())
+        # Удаление записей ленты, длина ленты, число подписчиков
+        with self.assertNumQueries(3):
+            timeline.prune(other.pk, self.author.pk)
+
+    def test_rebuild_timelines_command(self):
+        '''Команда заполняет ленты по существующим подпискам'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.follow_page(), [self.old_post])
+
+
+class FeedQueryCountTests(TestCase):
+    '''Число запросов на страницу ленты не зависит от числа постов'''
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(
+            username='author', first_name='Author',
+        )
+        cls.group = Group.objects.create(
+            title='Test title, please ignore',
+            slug='test_slug',
+            description='Test description, please ignore',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(settings.POSTS_PER_PAGE):
+            group = Group.objects.create(
+                title=f'Group {i}', slug=f'slug_{i}', description='-',
+            )
+            Post.objects.create(
+                text=f'Post {i}', author=cls.author, group=group,
+            )
+            Post.objects.create(
+                text=f'Group post {i}',
+                author=User.objects.create_user(username=f'user_{i}'),
+                group=cls.group,
+            )
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_post_detail_query_count(self):
+        '''Счётчики автора и авторы комментариев - без лишних запросов'''
+        post = Post.objects.filter(author=self.author).first()
+        for i in range(3):
+            Comment.objects.create(
+                post=post,
+                author=User.objects.create_user(username=f'commenter_{i}'),
+                text=f'Comment {i}',
+            )
+        # Автор и сообщество для ключа кеша, пост с автором
+        # и счётчиками, варианты картинки, комментарии
+        with self.assertNumQueries(4):
+            response = self.guest_client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.id}),
+            )
+        self.assertContains(response, settings.POSTS_PER_PAGE)
+
+    def test_feed_query_count(self):
+        '''
+        Автор и сообщество каждой карточки берутся одним JOIN,
+        варианты картинок - одним запросом на страницу
+        '''
+        # url: (client, количество запросов)
+        urls = {
+            reverse('posts:index'): (self.guest_client, 2),
             reverse(
-                'posts:group_list', kwargs={'slug': cls.group.slug},
-            ): settings.POSTS_PER_PAGE,
-            reverse('posts:group_list', kwargs={'slug': cls.group.slug})
-            + '?page=2': cls.POSTS_ON_SECOND_PAGE,
+                'posts:group_list', kwargs={'slug': self.group.slug},
+            ): (self.guest_client, 3),
             reverse(
-                'posts:profile', kwargs={'username': cls.user},
-            ): settings.POSTS_PER_PAGE,
-            reverse('posts:profile', kwargs={'username': cls.user})
-            + '?page=2': cls.POSTS_ON_SECOND_PAGE,
+                'posts:profile', kwargs={'username': self.author},
+            ): (self.guest_client, 3),
+            # Сессия, пользователь, плодовитые авторы, лента, варианты
+            reverse('posts:follow_index'): (self.reader_client, 5),
         }
+        for url, (client, num_queries) in urls.items():
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertNumQueries(num_queries):
+                    response = client.get(url)
+                self.assertEqual(
+                    len(response.context['page_obj']),
+                    settings.POSTS_PER_PAGE,
+                )
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.group = Group.objects.create(
+            title='Test title, please ignore',
+            slug='test_slug',
+            description='Test description, please ignore',
+        )
+        cls.post = Post.objects.create(
+            text='Test text, please ignore',
+            author=cls.user,
+            group=cls.group,
+        )
+        cls.URL = reverse('posts:profile', kwargs={'username': cls.user})
 
     def setUp(self) -> None:
         cache.clear()
         self.guest_client = Client()
+
+    def test_card_is_reused(self):
+        '''Карточка берётся из кеша, пока объекты не менялись'''
+        self.guest_client.get(self.URL)
+        # update() не шлёт сигналов, версия карточки прежняя
+        Post.objects.filter(pk=self.post.pk).update(text='Silent edit')
+        response = self.guest_client.get(self.URL)
+        self.assertContains(response, self.post.text)
+        self.assertNotContains(response, 'Silent edit')
+
+    def test_card_is_invalidated(self):
+        '''Правка поста, автора или сообщества сразу видна в ленте'''
+        self.guest_client.get(self.URL)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Edited text'
+        post.save()
+        self.assertContains(self.guest_client.get(self.URL), 'Edited text')
+        self.group.title = 'Renamed group'
+        self.group.save()
+        self.assertContains(self.guest_client.get(self.URL), 'Renamed group')
+        group_url = reverse(
+            'posts:group_list', kwargs={'slug': self.group.slug},
+        )
+        self.guest_client.get(group_url)
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        self.assertContains(self.guest_client.get(group_url), 'Renamed')
+
+    def test_cards_are_fetched_per_page(self):
+        '''Карточки страницы берутся из кеша одним запросом на страницу'''
+        for i in range(settings.POSTS_PER_PAGE):
+            Post.objects.create(text=f'Post {i}', author=self.user)
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        # Страница из кеша лент отдалась бы без отрисовки карточек
+        generations.bump('index')
+        with mock.patch('posts.cards.cache', wraps=cache) as card_cache:
+            response = self.guest_client.get(url)
+        self.assertContains(response, 'Post 0')
+        card_cache.get.assert_not_called()
+        card_cache.set.assert_not_called()
+        self.assertEqual(card_cache.get_many.call_count, 1)
+
+    def test_group_slug_change_and_delete(self):
+        '''Старый адрес и удалённое сообщество пропадают из кеша'''
+        group = Group.objects.create(
+            title='Doomed group', slug='doomed', description='-',
+        )
+        Post.objects.create(text='Post', author=self.user, group=group)
+        old_url = reverse('posts:group_list', kwargs={'slug': 'doomed'})
+        self.assertEqual(self.guest_client.get(old_url).status_code, 200)
+        group.slug = 'moved'
+        group.save()
+        self.assertEqual(self.guest_client.get(old_url).status_code, 404)
+        self.assertContains(self.guest_client.get(self.URL), 'Doomed group')
+        group.delete()
+        self.assertNotContains(self.guest_client.get(self.URL), 'Doomed group')
+
+    def test_post_detail_follows_author_and_group(self):
+        '''Страница поста устаревает при правке автора и сообщества'''
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.assertContains(
+            self.guest_client.get(url), '<span>1</span>', html=True,
+        )
+        Post.objects.create(text='Another post', author=self.user)
+        self.assertContains(
+            self.guest_client.get(url), '<span>2</span>', html=True,
+        )
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Renamed group'
+        group.save()
+        self.assertContains(self.guest_client.get(url), 'Renamed group')
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Firstname'
+        user.save()
+        self.assertContains(self.guest_client.get(url), 'Firstname')
+
+
+@override_settings(COMMENTS_PER_PAGE=4)
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.post = Post.objects.create(
+            text='Test text, please ignore', author=cls.user,
+        )
+        for i in range(10):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Comment {i}',
+            )
+        cls.URL = reverse('posts:post_detail', kwargs={'post_id': cls.post.id})
+        cls.MORE_URL = reverse(
+            'posts:post_comments', kwargs={'post_id': cls.post.id},
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_first_page_newest_first(self):
+        '''На странице поста только первые комментарии, новые первыми'''
+        comments = self.guest_client.get(self.URL).context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            [f'Comment {i}' for i in (9, 8, 7, 6)],
+        )
+        self.assertTrue(comments.has_next())
+
+    def test_more_comments_fragment(self):
+        '''Остальные комментарии подгружаются HTML-фрагментами'''
+        texts = []
+        cursor = self.guest_client.get(self.URL).context[
+            'comments'
+        ].next_cursor
+        while cursor:
+            response = self.guest_client.get(self.MORE_URL, {'cursor': cursor})
+            self.assertTemplateUsed(
+                response, 'posts/includes/comment_list.html',
+            )
+            comments = response.context['comments']
+            texts.extend(comment.text for comment in comments)
+            cursor = comments.next_cursor
+        self.assertEqual(texts, [f'Comment {i}' for i in range(5, -1, -1)])
+
+    def test_more_comments_json(self):
+        '''?format=json отдаёт комментарии и курсор следующей страницы'''
+        data = self.guest_client.get(
+            self.MORE_URL, {'format': 'json'},
+        ).json()
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            [f'Comment {i}' for i in (9, 8, 7, 6)],
+        )
+        self.assertEqual(data['comments'][0]['author'], self.user.username)
+        data = self.guest_client.get(
+            self.MORE_URL, {'format': 'json', 'cursor': data['next_cursor']},
+        ).json()
+        self.assertEqual(data['comments'][0]['text'], 'Comment 5')
+        # Ответ из кеша остаётся JSON
+        response = self.guest_client.get(self.MORE_URL, {'format': 'json'})
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_more_comments_unknown_post(self):
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0}),
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.group = Group.objects.create(
+            title='Test title, please ignore',
+            slug='test_slug',
+            description='Test description, please ignore',
+        )
+        cls.post = Post.objects.create(
+            text='Test text, please ignore', author=cls.user, group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
 
-    def test_paginator_all(self):
-        '''Проверка пагинатора'''
-        for url, posts_count in self.URLS.items():
+    def test_not_modified_before_rendering(self):
+        '''Неизменная страница - 304 без отрисовки и почти без запросов'''
+        detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id},
+        )
+        for url in self.urls:
+            # Странице поста нужны имя автора и адрес сообщества
+            num_queries = 1 if url == detail_url else 0
             with self.subTest(url=url):
                 response = self.guest_client.get(url)
-                self.assertEqual(
-                    len(response.context.get('page_obj')),
-                    posts_count,
+                self.assertTrue(response['ETag'].startswith('W/"'))
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn(
+                    f'max-age={settings.FEED_BROWSER_MAX_AGE}',
+                    response['Cache-Control'],
+                )
+                self.assertIn('Cookie', response['Vary'])
+                with self.assertNumQueries(num_queries):
+                    by_etag = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'],
+                    )
+                self.assertEqual(by_etag.status_code, 304)
+                self.assertEqual(by_etag['ETag'], response['ETag'])
+                self.assertEqual(by_etag.templates, [])
+                by_date = self.guest_client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
                 )
+                self.assertEqual(by_date.status_code, 304)
+
+    def test_changes_are_modified(self):
+        '''Правка поста и новый комментарий меняют ETag'''
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        etag = self.guest_client.get(url)['ETag']
+        changes = (
+            lambda: Post.objects.get(pk=self.post.pk).save(),
+            lambda: Comment.objects.create(
+                post=self.post, author=self.user, text='Comment',
+            ),
+        )
+        for change in changes:
+            change()
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            etag = response['ETag']
+
+    def test_private_for_users(self):
+        '''Вошедшим - своя страница, хранить только с проверкой'''
+        url = reverse('posts:index')
+        guest_etag = self.guest_client.get(url)['ETag']
+        response = self.authorized_client.get(url)
+        self.assertNotEqual(response['ETag'], guest_etag)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertEqual(
+            self.authorized_client.get(
+                url, HTTP_IF_NONE_MATCH=guest_etag,
+            ).status_code,
+            200,
+        )
@@ -0,0 +1,171 @@
+'''
+Заранее подготовленные миниатюры Post.image.
+
+После загрузки картинки через PostForm вид ставит задачу в пул потоков,
+задача режет картинку под карточку (POST_CARD_IMAGE_SIZE, по центру,
+с увеличением) и сохраняет её в Post.image_card. Шаблоны берут готовый
+файл и не обращаются к движку миниатюр; пока файла нет, показывается
+заглушка.
+
+Вместе с миниатюрой готовятся варианты Rendition: та же обрезка
+шириной POST_IMAGE_WIDTHS в форматах POST_IMAGE_FORMATS. Из них
+шаблон собирает <picture> с srcset, и браузер сам берёт подходящий
+размер и самый компактный из поддерживаемых форматов.
+'''
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .models import Post, Rendition
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.THUMBNAIL_WORKERS,
+    thread_name_prefix='thumbnails',
+)
+
+
+# Параметры кодировщиков Pillow для каждого формата
+SAVE_OPTIONS = {
+    'jpeg': {'quality': 85, 'optimize': True, 'progressive': True},
+    'webp': {'quality': 80, 'method': 6},
+    'avif': {'quality': 60},
+}
+EXTENSIONS = {'jpeg': 'jpg', 'webp': 'webp', 'avif': 'avif'}
+
+
+def supported_formats():
+    '''Форматы из POST_IMAGE_FORMATS, которые Pillow умеет сохранять.'''
+    Image.init()
+    return [
+        image_format for image_format in settings.POST_IMAGE_FORMATS
+        if image_format.upper() in Image.SAVE
+    ]
+
+
+def _encode(image, image_format):
+    buffer = BytesIO()
+    image.save(buffer, image_format.upper(), **SAVE_OPTIONS[image_format])
+    return buffer.getvalue()
+
+
+def rendition_widths(source_width):
+    '''
+    Ширины вариантов не больше исходной картинки:
+    увеличение только утяжелит файл. Самый узкий вариант есть всегда.
+    '''
+    widths = sorted(settings.POST_IMAGE_WIDTHS)
+    return [
+        width for width in widths if width <= source_width
+    ] or widths[:1]
+
+
+def _crop(source):
+    '''Картинка, обрезанная под пропорции карточки без масштабирования.'''
+    card_width, card_height = settings.POST_CARD_IMAGE_SIZE
+    with Image.open(source) as image:
+        image = image.convert('RGB')
+    width = min(image.width, image.height * card_width // card_height)
+    cropped = ImageOps.fit(
+        image,
+        (width, max(width * card_height // card_width, 1)),
+        Image.LANCZOS,
+    )
+    return cropped
+
+
+def render_card_image(source):
+    '''Байты JPEG с картинкой, обрезанной под карточку.'''
+    with Image.open(source) as image:
+        image = ImageOps.fit(
+            image.convert('RGB'),
+            settings.POST_CARD_IMAGE_SIZE,
+            Image.LANCZOS,
+        )
+    return _encode(image, 'jpeg')
+
+
+def render_renditions(source):
+    '''[(ширина, формат, байты)] для всех вариантов картинки.'''
+    cropped = _crop(source)
+    card_width, card_height = settings.POST_CARD_IMAGE_SIZE
+    formats = supported_formats()
+    renditions = []
+    for width in rendition_widths(cropped.width):
+        resized = cropped.resize(
+            (width, max(width * card_height // card_width, 1)),
+            Image.LANCZOS,
+        )
+        for image_format in formats:
+            renditions.append(
+                (width, image_format, _encode(resized, image_format)),
+            )
+    return renditions
+
+
+def _save_renditions(post, renditions):
+    base = os.path.splitext(os.path.basename(post.image.name))[0]
+    post.renditions.all().delete()
+    objects = []
+    for width, image_format, content in renditions:
+        rendition = Rendition(post=post, width=width, format=image_format)
+        rendition.file.save(
+            f'{base}_{width}.{EXTENSIONS[image_format]}',
+            ContentFile(content),
+            save=False,
+        )
+        objects.append(rendition)
+    Rendition.objects.bulk_create(objects)
+
+
+def generate(post_id):
+    '''
+    Готовит миниатюру и варианты картинки поста;
+    картинка могла смениться - тогда выходим.
+    '''
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    image_name = post.image.name
+    with post.image.open('rb') as source:
+        content = render_card_image(source)
+        source.seek(0)
+        renditions = render_renditions(source)
+    # Картинку могли заменить, пока мы работали
+    if not Post.objects.filter(pk=post_id, image=image_name).exists():
+        return
+    name = os.path.splitext(os.path.basename(image_name))[0] + '.jpg'
+    with transaction.atomic():
+        _save_renditions(post, renditions)
+        post.image_card.save(name, ContentFile(content), save=False)
+        # save() вызывает сигналы и сбрасывает закешированные карточки
+        post.save(update_fields=['image_card'])
+
+
+def _run(post_id):
+    try:
+        generate(post_id)
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюру поста %s', post_id)
+    finally:
+        close_old_connections()
+
+
+def schedule(post):
+    '''
+    Ставит подготовку миниатюры в очередь после фиксации транзакции.
+    При THUMBNAIL_ASYNC = False миниатюра готовится сразу.
+    '''
+    if not post.image:
+        return
+    if not settings.THUMBNAIL_ASYNC:
+        generate(post.pk)
+        return
+    transaction.on_commit(lambda: _executor.submit(_run, post.pk))
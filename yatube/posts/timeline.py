@@ -0,0 +1,320 @@
+'''
+Лента подписок с раздачей при записи (fan-out-on-write).
+
+Каждый новый пост копируется в TimelineEntry всех подписчиков автора,
+при подписке лента дозаполняется последними постами автора, при отписке
+они удаляются. Длина ленты ограничена TIMELINE_MAX_LENGTH и хранится
+в UserStats.timeline_length: раздача удаляет самую старую запись только
+у лент, которые уже заполнены.
+
+Посты "плодовитых" авторов, у которых больше TIMELINE_FANOUT_LIMIT
+подписчиков, не раздаются: такие авторы подмешиваются в ленту
+при чтении (гибридная схема) - лента и каждый такой автор читаются
+своим диапазоном индекса, а страницы сливаются. Когда после отписки
+автор перестаёт быть плодовитым, недостающие посты раздаются
+подписчикам задним числом одним INSERT ... SELECT.
+
+Ленты, существовавшие до раздачи, заполняет миграция 0012, а после
+сбоя их пересобирает команда rebuild_timelines.
+'''
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Greatest, Least
+
+from . import counters
+from .models import (
+    FEED_DEFERRED_FIELDS, Follow, Post, TimelineEntry, UserStats,
+)
+from .utils import CURSOR_PARAM, CursorPaginator, MergedCursorPaginator
+
+PROLIFIC_AUTHORS_KEY = 'timeline:prolific_authors'
+TIMELINE_KEY = ('created', 'post_id')
+
+
+def prolific_authors():
+    '''Множество id авторов, чьи посты не раздаются по лентам.'''
+    authors = cache.get(PROLIFIC_AUTHORS_KEY)
+    if authors is None:
+        authors = set(
+            Follow.objects.values('author').annotate(
+                followers=Count('user'),
+            ).filter(
+                followers__gt=settings.TIMELINE_FANOUT_LIMIT,
+            ).values_list('author', flat=True),
+        )
+        cache.set(
+            PROLIFIC_AUTHORS_KEY,
+            authors,
+            settings.TIMELINE_PROLIFIC_TIMEOUT,
+        )
+    return authors
+
+
+def _followers(author_id):
+    return Follow.objects.filter(author_id=author_id).values('user_id')
+
+
+def trim(user_id):
+    '''Обрезает ленту пользователя до TIMELINE_MAX_LENGTH записей.'''
+    boundary = TimelineEntry.objects.filter(user_id=user_id).order_by(
+        '-created', '-post',
+    ).values_list('created', 'post_id')[
+        settings.TIMELINE_MAX_LENGTH:settings.TIMELINE_MAX_LENGTH + 1
+    ]
+    if boundary:
+        created, post_id = boundary[0]
+        TimelineEntry.objects.filter(
+            Q(created__lt=created) | Q(created=created, post_id__lte=post_id),
+            user_id=user_id,
+        ).delete()
+    counters.recount_timelines([user_id])
+
+
+def _trim_followers_sql():
+    meta, quote = TimelineEntry._meta, connection.ops.quote_name
+    follow = Follow._meta
+    table = quote(meta.db_table)
+    column = {
+        name: quote(meta.get_field(name).column)
+        for name in ('user', 'post', 'created')
+    }
+    # Оконная функция нумерует записи каждой ленты по индексу
+    # (user, -created, -post) без сортировки
+    return (
+        f'DELETE FROM {table} WHERE {quote(meta.pk.column)} IN ('
+        f'SELECT {quote(meta.pk.column)} FROM ('
+        f'SELECT {quote(meta.pk.column)}, ROW_NUMBER() OVER ('
+        f'PARTITION BY {column["user"]} '
+        f'ORDER BY {column["created"]} DESC, {column["post"]} DESC'
+        f') AS position FROM {table} '
+        f'WHERE {column["user"]} IN ('
+        f'SELECT {quote(follow.get_field("user").column)} '
+        f'FROM {quote(follow.db_table)} '
+        f'WHERE {quote(follow.get_field("author").column)} = %s'
+        f')) WHERE position > %s)'
+    )
+
+
+def trim_followers(author_id):
+    '''
+    Обрезает ленты всех подписчиков автора до TIMELINE_MAX_LENGTH
+    записей одним DELETE. Нумерует все записи этих лент, поэтому
+    вызывается только при редкой раздаче задним числом (demote).
+    '''
+    with connection.cursor() as cursor:
+        cursor.execute(
+            _trim_followers_sql(),
+            [author_id, settings.TIMELINE_MAX_LENGTH],
+        )
+
+
+def _drop_oldest(author_id):
+    '''
+    Раздача удлинила ленты подписчиков автора на одну запись:
+    у заполненных удаляется самая старая (одна строка с конца индекса
+    ленты), длины остальных растут на единицу.
+    '''
+    limit = settings.TIMELINE_MAX_LENGTH
+    readers = UserStats.objects.filter(pk__in=_followers(author_id))
+    oldest = TimelineEntry.objects.filter(
+        user_id=OuterRef('pk'),
+    ).order_by('created', 'post_id').values('pk')[:1]
+    TimelineEntry.objects.filter(
+        pk__in=readers.filter(timeline_length__gte=limit).annotate(
+            oldest=Subquery(oldest),
+        ).values('oldest'),
+    ).delete()
+    readers.update(timeline_length=Least(F('timeline_length') + 1, limit))
+
+
+def fan_out(post):
+    '''Раздаёт новый пост по лентам подписчиков автора.'''
+    if post.author_id in prolific_authors():
+        return
+    followers = list(
+        Follow.objects.filter(author_id=post.author_id).values_list(
+            'user_id', flat=True,
+        ),
+    )
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post=post,
+                author_id=post.author_id,
+                created=post.created,
+            )
+            for user_id in followers
+        ),
+        ignore_conflicts=True,
+    )
+    if followers:
+        _drop_oldest(post.author_id)
+
+
+def backfill(user_id, author_id):
+    '''Дозаполняет ленту последними постами автора после подписки.'''
+    if author_id in prolific_authors():
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-created', '-pk',
+    ).values_list('pk', 'created')[:settings.TIMELINE_MAX_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                created=created,
+            )
+            for post_id, created in posts
+        ),
+        ignore_conflicts=True,
+    )
+    trim(user_id)
+
+
+def prune(user_id, author_id):
+    '''Убирает из ленты посты автора после отписки.'''
+    deleted, _ = TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id,
+    ).delete()
+    if deleted:
+        counters.bump_user(user_id, timeline_length=-deleted)
+    demote(author_id)
+
+
+def forget(post_id):
+    '''
+    Уменьшает длину лент, в которые раздан удаляемый пост: сами записи
+    удалит каскад.
+    '''
+    UserStats.objects.filter(
+        pk__in=TimelineEntry.objects.filter(
+            post_id=post_id,
+        ).values('user_id'),
+    ).update(timeline_length=Greatest(F('timeline_length') - 1, 0))
+
+
+def _backfill_followers_sql():
+    meta, quote = TimelineEntry._meta, connection.ops.quote_name
+    follow, post = Follow._meta, Post._meta
+    table = quote(meta.db_table)
+    column = {
+        name: quote(meta.get_field(name).column)
+        for name in ('user', 'post', 'author', 'created')
+    }
+    follower = quote(follow.get_field('user').column)
+    post_author = quote(post.get_field('author').column)
+    post_created = quote(post.get_field('created').column)
+    post_id = quote(post.pk.column)
+    # Последние посты автора (индекс author, -created) для каждого
+    # подписчика, кроме уже лежащих в ленте (уникальный индекс user, post)
+    return (
+        f'INSERT INTO {table} ({column["user"]}, {column["post"]}, '
+        f'{column["author"]}, {column["created"]}) '
+        f'SELECT f.{follower}, p.{post_id}, p.{post_author}, '
+        f'p.{post_created} FROM {quote(follow.db_table)} f, ('
+        f'SELECT {post_id}, {post_author}, {post_created} '
+        f'FROM {quote(post.db_table)} WHERE {post_author} = %s '
+        f'ORDER BY {post_created} DESC, {post_id} DESC LIMIT %s) p '
+        f'WHERE f.{quote(follow.get_field("author").column)} = %s '
+        f'AND NOT EXISTS (SELECT 1 FROM {table} t '
+        f'WHERE t.{column["user"]} = f.{follower} '
+        f'AND t.{column["post"]} = p.{post_id})'
+    )
+
+
+def demote(author_id):
+    '''
+    Раздаёт посты автора, который после отписки перестал быть
+    плодовитым: их не раздавали, а при чтении их больше не подмешают.
+    Раздача идёт, только если посты автора действительно пропускались:
+    он есть в кешированном множестве плодовитых (или, если кеш истёк,
+    подписчиков осталось ровно TIMELINE_FANOUT_LIMIT - порог только что
+    пересечён). Недостающие записи вставляет один INSERT ... SELECT.
+    '''
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    followers = Follow.objects.filter(author_id=author_id).count()
+    if followers > limit:
+        return
+    authors = cache.get(PROLIFIC_AUTHORS_KEY)
+    if authors is None:
+        if followers != limit:
+            return
+    elif author_id in authors:
+        authors.discard(author_id)
+        cache.set(
+            PROLIFIC_AUTHORS_KEY, authors, settings.TIMELINE_PROLIFIC_TIMEOUT,
+        )
+    else:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            _backfill_followers_sql(),
+            [author_id, settings.TIMELINE_MAX_LENGTH, author_id],
+        )
+    trim_followers(author_id)
+    counters.recount_timelines(_followers(author_id))
+
+
+def rebuild(user_id):
+    '''Пересобирает ленту пользователя с нуля по текущим подпискам.'''
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    for author_id in Follow.objects.filter(user_id=user_id).values_list(
+        'author_id', flat=True,
+    ):
+        backfill(user_id, author_id)
+    counters.recount_timelines([user_id])
+
+
+def _entries_to_posts(entries):
+    return [entry.post for entry in entries]
+
+
+def _timeline(user):
+    return TimelineEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group',
+    ).defer(
+        *(f'post__{field}' for field in FEED_DEFERRED_FIELDS),
+    ).prefetch_related('post__renditions')
+
+
+def feed(request, user):
+    '''
+    Страница ленты подписок пользователя.
+    Обычно это чтение TimelineEntry по индексу пользователя;
+    если пользователь подписан на плодовитых авторов, то же окно
+    курсора читается по индексу (author, -created) каждого из них,
+    и страницы сливаются (MergedCursorPaginator).
+    '''
+    per_page = settings.POSTS_PER_PAGE
+    timeline = CursorPaginator(
+        _timeline(user),
+        per_page,
+        key=TIMELINE_KEY,
+        transform=_entries_to_posts,
+    )
+    prolific = prolific_authors()
+    followed_prolific = prolific and list(
+        Follow.objects.filter(
+            user=user, author_id__in=prolific,
+        ).values_list('author_id', flat=True),
+    )
+    if followed_prolific:
+        timeline = MergedCursorPaginator(
+            [
+                timeline,
+                *(
+                    CursorPaginator(
+                        Post.objects.filter(author_id=author_id).for_feed(),
+                        per_page,
+                    )
+                    for author_id in followed_prolific
+                ),
+            ],
+            per_page,
+        )
+    return timeline.get_page(request.GET.get(CURSOR_PARAM))
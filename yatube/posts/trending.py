@@ -0,0 +1,121 @@
+'''
+Лента популярного: посты по оценке с затуханием во времени.
+
+Событие с весом w в момент t добавляет к оценке поста w * 2^(-возраст /
+HOT_HALF_LIFE). Общий множитель "сейчас" одинаков для всех постов
+и на порядок не влияет, поэтому в PostScore.score хранится
+ln(сумма w * e^((t - EPOCH) / tau)), tau = HOT_HALF_LIFE / ln 2:
+новое событие прибавляется к оценке одним UPDATE (logaddexp),
+а старые оценки не нужно пересчитывать по мере старения.
+
+События и веса (HOT_WEIGHTS): публикация поста, комментарий, подписка
+на автора (засчитывается его последнему посту). Удаления оценку
+не уменьшают - старые события и так затухают. Пути, которые пишут
+bulk_create (import_posts, seed_bench), пересчитывают оценки через
+rebuild() (команда rebuild_hot_scores).
+
+Первые HOT_TOP_K постов кешируются на HOT_CACHE_TIMEOUT секунд,
+так что страница популярного не считает агрегатов по комментариям.
+'''
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+
+from .models import Comment, Post, PostScore
+
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+TOP_KEY = 'trending:top'
+BATCH_SIZE = 2000
+
+
+def event_score(created, weight):
+    '''Логарифм вклада события с весом weight в момент created.'''
+    tau = settings.HOT_HALF_LIFE / math.log(2)
+    return math.log(weight) + (created - EPOCH).total_seconds() / tau
+
+
+def logaddexp(first, second):
+    '''ln(e^first + e^second).'''
+    high, low = max(first, second), min(first, second)
+    return high + math.log1p(math.exp(low - high))
+
+
+def _merge(post_id, score):
+    value = Value(score, output_field=FloatField())
+    # ln(e^s + e^x) = max(s, x) + ln(1 + e^-|s - x|), без переполнения
+    updated = PostScore.objects.filter(post_id=post_id).update(
+        score=Greatest(F('score'), value) + Ln(
+            Value(1.0, output_field=FloatField())
+            + Exp(-Abs(F('score') - value)),
+        ),
+    )
+    if not updated:
+        # Строки нет у постов, записанных bulk_create
+        PostScore.objects.get_or_create(
+            post_id=post_id, defaults={'score': score},
+        )
+
+
+def add(post_id, created, weight):
+    '''Прибавляет событие к оценке поста.'''
+    _merge(post_id, event_score(created, weight))
+
+
+def add_many(events):
+    '''
+    Прибавляет события [(post_id, created, weight)] - по одному UPDATE
+    на пост: вклады одного поста складываются заранее.
+    '''
+    scores = {}
+    for post_id, created, weight in events:
+        score = event_score(created, weight)
+        if post_id in scores:
+            score = logaddexp(scores[post_id], score)
+        scores[post_id] = score
+    for post_id, score in scores.items():
+        _merge(post_id, score)
+
+
+def top_ids():
+    '''id первых HOT_TOP_K постов по оценке, из кеша.'''
+    ids = cache.get(TOP_KEY)
+    if ids is None:
+        ids = list(
+            PostScore.objects.order_by('-score').values_list(
+                'post_id', flat=True,
+            )[:settings.HOT_TOP_K],
+        )
+        cache.set(TOP_KEY, ids, settings.HOT_CACHE_TIMEOUT)
+    return ids
+
+
+def rebuild():
+    '''
+    Пересчитывает все оценки по постам и комментариям.
+    Подписки без даты в пересчёт не входят. Возвращает число оценок.
+    '''
+    weights = settings.HOT_WEIGHTS
+    scores = {}
+    for post_id, created in Post.objects.values_list(
+        'pk', 'created',
+    ).iterator(BATCH_SIZE):
+        scores[post_id] = event_score(created, weights['post'])
+    for post_id, created in Comment.objects.values_list(
+        'post_id', 'created',
+    ).iterator(BATCH_SIZE):
+        scores[post_id] = logaddexp(
+            scores[post_id], event_score(created, weights['comment']),
+        )
+    with transaction.atomic():
+        PostScore.objects.all().delete()
+        PostScore.objects.bulk_create(
+            PostScore(post_id=post_id, score=score)
+            for post_id, score in scores.items()
+        )
+    cache.delete(TOP_KEY)
+    return len(scores)
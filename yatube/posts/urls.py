@@ -1,17 +1,25 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 
 app_name = 'Posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('hot/', views.hot_posts, name='hot'),
+    path('group/', views.group_index, name='group_index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path('search/', views.post_search, name='post_search'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments',
+    ),
     path(
         'posts/<int:post_id>/comment/',
         views.add_comment,
@@ -28,4 +36,7 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow',
     ),
+    path('api/posts/', api.index, name='api_index'),
+    path('api/group/<slug:slug>/', api.group_posts, name='api_group_list'),
+    path('api/profile/<str:username>/', api.profile, name='api_profile'),
 ]
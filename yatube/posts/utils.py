@@ -1,8 +1,243 @@
+import base64
+import hashlib
+import json
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+CURSOR_PARAM = 'cursor'
+NEXT = 'n'
+PREVIOUS = 'p'
+DEFAULT_KEY = ('created', 'pk')
+
+
+def encode_cursor(obj, direction):
+    '''Упаковывает ключ (created, id) записи в непрозрачный токен.'''
+    payload = json.dumps(
+        [obj.created.isoformat(), obj.pk, direction],
+        separators=(',', ':'),
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    '''
+    Разбирает токен курсора.
+    Возвращает (created, id, direction) или None для битого токена.
+    '''
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        created, pk, direction = json.loads(
+            base64.urlsafe_b64decode(padded.encode()).decode(),
+        )
+        created = parse_datetime(created)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if created is None or direction not in (NEXT, PREVIOUS):
+        return None
+    return created, pk, direction
+
+
+class CursorPage(Page):
+    '''Страница ленты, выбранная по курсору, а не по номеру.'''
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, 1, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} objects>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return encode_cursor(self.object_list[-1], NEXT)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return encode_cursor(self.object_list[0], PREVIOUS)
+
+    def next_page_number(self):
+        return self.next_cursor
+
+    def previous_page_number(self):
+        return self.previous_cursor
+
+    def start_index(self):
+        return 1 if self.object_list else 0
+
+    def end_index(self):
+        return len(self.object_list)
+
+
+class CursorPaginator(Paginator):
+    '''
+    Keyset-пагинатор по ключу (created, id) в порядке убывания.
+    Не выполняет ни COUNT(*), ни OFFSET: каждая страница выбирается
+    условием "строго старше/новее курсора" и LIMIT per_page + 1.
+    Общее количество (count) приблизительное: считается лениво,
+    только если к нему обратились, и кешируется на
+    PAGINATOR_COUNT_TIMEOUT секунд.
+    key - пара полей, по которым фильтруется и сортируется выборка;
+    transform - функция, превращающая строки выборки в объекты страницы.
+    После transform у объектов created и pk должны совпадать с key
+    (например, строки ленты подписок хранят копии post.created и post.id).
+    '''
+
+    def __init__(
+            self,
+            object_list,
+            per_page,
+            key=DEFAULT_KEY,
+            transform=None,
+            **kwargs,
+    ):
+        self.created_field, self.pk_field = key
+        self.transform = transform
+        super().__init__(
+            object_list.order_by(*('-' + field for field in key)),
+            per_page,
+            **kwargs,
+        )
+
+    @cached_property
+    def count(self):
+        query = str(self.object_list.query).encode()
+        key = 'paginator_count:' + hashlib.md5(query).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count, settings.PAGINATOR_COUNT_TIMEOUT)
+        return count
+
+    def get_page(self, cursor):
+        return self.page(cursor)
+
+    def page(self, cursor):
+        key = decode_cursor(cursor)
+        if key is None:
+            rows = list(self.object_list[:self.per_page + 1])
+            return self._forward_page(rows, has_previous=False)
+        created, pk, direction = key
+        if direction == NEXT:
+            rows = list(
+                self.object_list.filter(self._after(created, pk, 'lt'))[
+                    :self.per_page + 1
+                ],
+            )
+            return self._forward_page(rows, has_previous=True)
+        rows = list(
+            self.object_list.filter(
+                self._after(created, pk, 'gt'),
+            ).reverse()[:self.per_page + 1],
+        )
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return self._make_page(rows, True, has_previous)
+
+    def _after(self, created, pk, lookup):
+        # Эквивалент (created, pk) < (курсор) без OR: так SQLite
+        # остаётся в одном диапазоне индекса и не сортирует заново.
+        return Q(**{f'{self.created_field}__{lookup}e': created}) & ~Q(**{
+            self.created_field: created,
+            f'{self.pk_field}__{"gte" if lookup == "lt" else "lte"}': pk,
+        })
+
+    def _forward_page(self, rows, has_previous):
+        has_next = len(rows) > self.per_page
+        return self._make_page(rows[:self.per_page], has_next, has_previous)
+
+    def _make_page(self, rows, has_next, has_previous):
+        if self.transform is not None:
+            rows = self.transform(rows)
+        return CursorPage(rows, self, has_next, has_previous)
+
+
+class MergedCursorPaginator:
+    '''
+    Лента из нескольких keyset-выборок с общим ключом (created, id).
+    Каждую читает свой CursorPaginator - диапазоном своего индекса
+    с LIMIT per_page + 1, - а страницы сливаются в Python: первые
+    per_page объектов объединения целиком лежат среди первых per_page
+    каждой выборки. Объекты с одинаковым id берутся один раз.
+    '''
+
+    def __init__(self, paginators, per_page):
+        self.paginators = paginators
+        self.per_page = per_page
+
+    @property
+    def count(self):
+        return sum(paginator.count for paginator in self.paginators)
+
+    def get_page(self, cursor):
+        return self.page(cursor)
+
+    def page(self, cursor):
+        key = decode_cursor(cursor)
+        pages = [paginator.page(cursor) for paginator in self.paginators]
+        unique = {}
+        for page in pages:
+            for obj in page.object_list:
+                unique.setdefault(obj.pk, obj)
+        rows = sorted(
+            unique.values(), key=lambda obj: (obj.created, obj.pk),
+            reverse=True,
+        )
+        more = len(rows) > self.per_page
+        if key is None or key[2] == NEXT:
+            has_next = more or any(page.has_next() for page in pages)
+            return CursorPage(
+                rows[:self.per_page], self, has_next, key is not None,
+            )
+        has_previous = more or any(page.has_previous() for page in pages)
+        return CursorPage(rows[-self.per_page:], self, True, has_previous)
+
+
+def create_pages(request, object_list, per_page=None, **kwargs):
+    paginator = CursorPaginator(
+        object_list, per_page or settings.POSTS_PER_PAGE, **kwargs,
+    )
+    return paginator.get_page(request.GET.get(CURSOR_PARAM))
 
 
-def create_pages(request, object_list):
-    paginator = Paginator(object_list, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+def page_window(page, on_each_side=2, on_ends=1):
+    '''
+    Номера страниц для пагинатора по номерам (Paginator): первые
+    и последние on_ends страниц и по on_each_side с каждой стороны
+    от текущей; пропуск - None. Номеров не больше
+    2 * (on_each_side + on_ends) + 3 при любом числе страниц.
+    '''
+    number, last = page.number, page.paginator.num_pages
+    start = max(number - on_each_side, 1)
+    end = min(number + on_each_side, last)
+    # Пропуск ровно в одну страницу показываем номером, а не "..."
+    if start > on_ends + 2:
+        window = [*range(1, on_ends + 1), None]
+    else:
+        window = list(range(1, start))
+    window.extend(range(start, end + 1))
+    if end < last - on_ends - 1:
+        window.extend([None, *range(last - on_ends + 1, last + 1)])
+    else:
+        window.extend(range(end + 1, last + 1))
+    return window
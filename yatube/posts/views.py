@@ -1,17 +1,28 @@
+import math
+from urllib.parse import urlencode
+
 from django.conf import settings
-from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
+from core.concurrency import gather
+from core.replicas import read_from_replica
+
+from . import (
+    comment_queue, group_stats, search, thumbnails, timeline, trending,
+)
+from .decorators import cache_feed
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Comment, Follow, Group, Post, User
 from .utils import create_pages
 
 
-@cache_page(20, key_prefix='index_page')
+@read_from_replica
+@cache_feed(lambda request: ['index'])
 def index(request):
-    post_list = Post.objects.all()
+    post_list = Post.objects.for_feed()
     return render(
         request,
         'posts/index.html',
@@ -19,9 +30,40 @@ def index(request):
     )
 
 
+@read_from_replica
+def hot_posts(request):
+    '''
+    Популярное: первые HOT_TOP_K постов по оценке (posts.trending).
+    Список id берётся из кеша, поэтому страница - один запрос по ключам.
+    '''
+    page_obj = Paginator(
+        trending.top_ids(), settings.POSTS_PER_PAGE,
+    ).get_page(request.GET.get('page'))
+    posts = Post.objects.for_feed().in_bulk(page_obj.object_list)
+    # Пост мог быть удалён, пока список лежал в кеше
+    page_obj.object_list = [
+        posts[pk] for pk in page_obj.object_list if pk in posts
+    ]
+    return render(request, 'posts/hot.html', {'page_obj': page_obj})
+
+
+@read_from_replica
+@cache_feed(lambda request: [group_stats.NAMESPACE])
+def group_index(request):
+    '''Каталог сообществ со сводками (см. posts.group_stats).'''
+    groups = Group.objects.select_related('stats').order_by('title', 'pk')
+    return render(request, 'posts/group_index.html', {
+        'page_obj': Paginator(
+            groups, settings.GROUPS_PER_PAGE,
+        ).get_page(request.GET.get('page')),
+    })
+
+
+@read_from_replica
+@cache_feed(lambda request, slug: [f'group:{slug}'])
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('group')
+    posts = group.posts.for_feed()
     return render(
         request,
         'posts/group_list.html',
@@ -29,28 +71,126 @@ def group_posts(request, slug):
     )
 
 
+@read_from_replica
+@cache_feed(lambda request, username: [f'author:{username}'])
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    author_posts = author.posts.select_related('author')
-    following = request.user.is_authenticated and author.following.filter(
-        user=request.user,
-    ).exists()
+    user = request.user if request.user.is_authenticated else None
+    # Сначала автор: для несуществующего имени 404 без других запросов.
+    # Страница постов и статус подписки друг от друга не зависят
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username,
+    )
+    page_obj, following = gather(
+        lambda: create_pages(
+            request, Post.objects.filter(author=author).for_feed(),
+        ),
+        lambda: user is not None and Follow.objects.filter(
+            user=user, author=author,
+        ).exists(),
+    )
     return render(
         request,
         'posts/profile.html',
         {
             'author': author,
-            'page_obj': create_pages(request, author_posts),
+            'page_obj': page_obj,
             'following': following,
         },
     )
 
 
-def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+def comment_pages(request, post_id):
+    '''Страница комментариев поста, новые первыми, с авторами.'''
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author',
+    ).only('created', 'text', 'post', 'author__username')
+    return create_pages(
+        request, comments, per_page=settings.COMMENTS_PER_PAGE,
+    )
+
+
+def post_page(request, post_id, form, status=200):
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group')
+        .prefetch_related('renditions'),
+        id=post_id,
+    )
+    comments = comment_pages(request, post_id)
+    pending = []
+    if request.user.is_authenticated and not comments.has_previous():
+        # Свои комментарии из очереди видны сразу (read-your-own-write)
+        shown = {comment.created for comment in comments}
+        pending = [
+            comment
+            for comment in comment_queue.pending(post_id, request.user)
+            if comment.created not in shown
+        ]
     return render(request, 'posts/post_detail.html', {
         'post': post,
-        'form': CommentForm(request.POST or None),
+        'comments': comments,
+        'pending_comments': pending,
+        'form': form,
+    }, status=status)
+
+
+def post_detail_namespaces(request, post_id):
+    '''
+    Страница поста показывает и автора (имя, число постов),
+    и сообщество: их изменения тоже делают её устаревшей.
+    '''
+    author, group = Post.objects.filter(pk=post_id).order_by().values_list(
+        'author__username', 'group__slug',
+    ).first() or (None, None)
+    namespaces = [f'post:{post_id}']
+    if author is not None:
+        namespaces.append(f'author:{author}')
+    if group is not None:
+        namespaces.append(f'group:{group}')
+    return namespaces
+
+
+@read_from_replica
+@cache_feed(post_detail_namespaces, anonymous_only=True)
+def post_detail(request, post_id):
+    return post_page(request, post_id, CommentForm())
+
+
+@read_from_replica
+@cache_feed(lambda request, post_id: [f'post:{post_id}'])
+def post_comments(request, post_id):
+    '''
+    Следующие страницы комментариев для подгрузки без перезагрузки:
+    HTML-фрагмент или JSON при ?format=json.
+    '''
+    comments = comment_pages(request, post_id)
+    if not comments and not Post.objects.filter(id=post_id).exists():
+        raise Http404
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in comments
+            ],
+            'next_cursor': comments.next_cursor,
+        })
+    return render(request, 'posts/includes/comment_list.html', {
+        'post_id': post_id,
+        'comments': comments,
+    })
+
+
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    return render(request, 'posts/search.html', {
+        'query': query,
+        'page_obj': search.search(request, query),
+        # Курсорные ссылки должны сохранять запрос
+        'cursor_query': urlencode({'q': query}) + '&',
     })
 
 
@@ -65,6 +205,7 @@ def post_create(request):
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            thumbnails.schedule(post)
             return redirect('posts:profile', request.user)
         return render(request, 'posts/create_post.html', {'form': form})
     return render(request, 'posts/create_post.html', {'form': form})
@@ -83,6 +224,8 @@ def post_edit(request, post_id):
     if form.is_valid():
         post = form.save(commit=False)
         post.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('posts:post_detail', post_id)
     return render(
         request,
@@ -97,28 +240,30 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    get_object_or_404(Post.objects.only('pk'), id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
-        comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post = post
-        comment.save()
+        try:
+            comment_queue.submit(
+                post_id, request.user, form.cleaned_data['text'],
+            )
+        except comment_queue.Throttled as throttled:
+            retry_after = math.ceil(throttled.retry_after)
+            form.add_error(
+                None,
+                f'Слишком много комментариев, попробуйте через '
+                f'{retry_after} с.',
+            )
+            response = post_page(request, post_id, form, status=429)
+            response['Retry-After'] = retry_after
+            return response
     return redirect('posts:post_detail', post_id=post_id)
 
-# Paginator для подписок
-def paginator_page(
-        queryset,
-        request,
-        posts_on_page=settings.POSTS_PER_PAGE,
-):
-    return Paginator(queryset, posts_on_page).get_page(
-        request.GET.get('page'))
 
 @login_required
+@cache_feed(lambda request: [f'timeline:{request.user.pk}'])
 def follow_index(request):
-    post = Post.objects.filter(author__following__user=request.user)
-    context = {'page_obj': paginator_page(post, request)}
+    context = {'page_obj': timeline.feed(request, request.user)}
     return render(request, 'posts/follow.html', context)
 
 
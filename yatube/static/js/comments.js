@@ -0,0 +1,12 @@
+// Подгружает следующую страницу комментариев вместо перехода по ссылке
+document.addEventListener('click', (event) => {
+  const link = event.target.closest('[data-comments-more]');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  fetch(link.dataset.fragment)
+    .then((response) => response.text())
+    .then((html) => link.insertAdjacentHTML('afterend', html))
+    .then(() => link.remove());
+});
@@ -0,0 +1,24 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Django 2.2 has no ASGI handler of its own, so the WSGI application is
+wrapped by core.asgi.ASGIHandler. Run it with any ASGI server, e.g.:
+
+    uvicorn yatube.asgi:application
+"""
+
+import os
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+from core.asgi import ASGIHandler
+from core.template_backends import warm_up
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+application = ASGIHandler(get_wsgi_application())
+
+if settings.TEMPLATE_CACHE:
+    warm_up()
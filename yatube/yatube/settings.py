@@ -2,7 +2,30 @@ import os
 
 
 POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+PAGINATOR_COUNT_TIMEOUT = 60
+TIMELINE_MAX_LENGTH = 800
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_PROLIFIC_TIMEOUT = 300
+POST_CARD_TIMEOUT = 60 * 60 * 24
+FEED_CACHE_TIMEOUT = 60 * 15
+# Сколько секунд браузер и прокси хранят ленты для гостей без проверки
+FEED_BROWSER_MAX_AGE = 60
+POST_CARD_IMAGE_SIZE = (960, 339)
+# Ширины и форматы вариантов картинки для srcset; форматы, которые
+# не умеет сохранять установленный Pillow, пропускаются
+POST_IMAGE_WIDTHS = (320, 640, 960, 1920)
+POST_IMAGE_FORMATS = ('avif', 'webp', 'jpeg')
+THUMBNAIL_ASYNC = True
+THUMBNAIL_WORKERS = 2
+# Потоки для параллельных запросов видов (core.concurrency, 0 - по
+# очереди) и для обработки запросов под ASGI (core.asgi)
+CONCURRENT_LOOKUP_THREADS = 4
+ASGI_THREADS = 8
 POST_TEXT_SHORT = 15
+# Каталог сообществ: сообществ на странице и активных авторов в сводке
+GROUPS_PER_PAGE = 20
+GROUP_TOP_AUTHORS = 3
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -10,6 +33,12 @@ SECRET_KEY = '$gha&g+d0a!@78-xz^sn5dszf$n^m7az(%*lij*%zjypo(pa&s'
 
 DEBUG = True
 
+# Заголовок Server-Timing (число и время SQL-запросов видно любому
+# клиенту, поэтому только при DEBUG) и порог в секундах для лога
+# медленных запросов yatube.slow_requests, см. core.middleware
+SERVER_TIMING = DEBUG
+SLOW_REQUEST_THRESHOLD = 0.5
+
 ALLOWED_HOSTS = [
     'localhost',
     '127.0.0.1',
@@ -32,6 +61,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым: замер охватывает остальные middleware
+    'core.middleware.RequestMetricsMiddleware',
+    'core.replicas.ReplicaStickinessMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -45,12 +77,26 @@ ROOT_URLCONF = 'yatube.urls'
 
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+# Кешированный загрузчик разбирает каждый шаблон один раз на процесс,
+# а wsgi.py и asgi.py разбирают все шаблоны TEMPLATES_DIR при старте
+# (core.template_backends.warm_up). С DEBUG кеш выключен, чтобы правки
+# шаблонов были видны сразу; YATUBE_TEMPLATE_CACHE=1 включает его всегда
+TEMPLATE_CACHE = os.environ.get(
+    'YATUBE_TEMPLATE_CACHE', '0' if DEBUG else '1',
+) == '1'
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': (
+                [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+                if TEMPLATE_CACHE else TEMPLATE_LOADERS
+            ),
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -68,9 +114,36 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение переживает запрос: PRAGMA и открытие файла
+        # не повторяются каждый раз
+        'CONN_MAX_AGE': 60,
     },
 }
 
+# Рабочий режим SQLite, см. core.sqlite; пустой словарь отключает
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+}
+
+# Реплики для чтения лент (см. core.replicas). Для проверки на одной
+# машине хватит копии файла базы: YATUBE_REPLICA_DB=/path/replica.sqlite3
+DATABASE_REPLICAS = []
+if os.environ.get('YATUBE_REPLICA_DB'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['YATUBE_REPLICA_DB'],
+        'CONN_MAX_AGE': 60,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = ['replica']
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Сколько секунд после записи пользователь читает только с default
+REPLICA_STICKY_SECONDS = 10
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -96,12 +169,40 @@ USE_L10N = True
 
 USE_TZ = True
 
+# Общий для всех воркеров кеш в файле SQLite. На нескольких машинах
+# сюда подставляется Memcached/Redis: код обращается только к cache.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'COMPRESS_MIN_LENGTH': 1024,
+            'HASH_KEYS': True,
+        },
     },
 }
 
+# Очередь отложенной записи комментариев (posts.comment_queue): файл,
+# общий для воркеров машины, размер пачки и задержка сброса в секундах
+COMMENT_QUEUE_PATH = os.path.join(BASE_DIR, 'comment_queue.sqlite3')
+COMMENT_QUEUE_BATCH = 500
+COMMENT_QUEUE_INTERVAL = 0.2
+# Корзины токенов: (ёмкость, токенов в секунду)
+COMMENT_THROTTLE_USER = (5, 0.5)
+COMMENT_THROTTLE_POST = (100, 20)
+
+# Тесты не трогают кеш и очередь сайта: на время прогона они
+# во временном каталоге (core.testing)
+TEST_RUNNER = 'core.testing.TestRunner'
+
+# Лента популярного (posts.trending): период полураспада веса события
+# в секундах, веса событий, длина ленты и время жизни её кеша
+HOT_HALF_LIFE = 60 * 60 * 12
+HOT_WEIGHTS = {'post': 1, 'comment': 1, 'follow': 2}
+HOT_TOP_K = 100
+HOT_CACHE_TIMEOUT = 60
+
 STATIC_URL = '/static/'
 
 LOGIN_URL = 'users:login'